@@ -0,0 +1,32 @@
+"""single-use auth tokens
+
+Revision ID: 1e7c4a9b3d52
+Revises: f0c6b2e9d471
+Create Date: 2026-10-19 18:31:09.447213
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1e7c4a9b3d52'
+down_revision = 'f0c6b2e9d471'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'auth_tokens',
+        sa.Column('token_hash', sa.String(64), primary_key=True),
+        sa.Column('usage', sa.String(50), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('expire_le', sa.DateTime(), nullable=False),
+        sa.Column('date_creation', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index('ix_auth_tokens_expire_le', 'auth_tokens', ['expire_le'])
+
+
+def downgrade() -> None:
+    op.drop_table('auth_tokens')
@@ -0,0 +1,48 @@
+"""indicator latest values
+
+Revision ID: 3f1c9a2b7d40
+Revises: 
+Create Date: 2026-10-19 09:12:44.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a2b7d40'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_indicators_projet_nom_date', 'indicators', ['projet_id', 'nom', 'date_saisie'])
+    op.create_table(
+        'indicator_latest',
+        sa.Column('projet_id', sa.Integer(), sa.ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('nom', sa.String(255), primary_key=True),
+        sa.Column('indicator_id', sa.Integer(), sa.ForeignKey('indicators.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('valeur', sa.Numeric(14, 4), nullable=False),
+        sa.Column('valeur_cible', sa.Numeric(14, 4)),
+        sa.Column('unite', sa.Text()),
+        sa.Column('date_saisie', sa.Date(), nullable=False),
+        sa.Column('date_modification', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+    # Backfill from the existing history
+    op.execute("""
+        INSERT INTO indicator_latest (projet_id, nom, indicator_id, valeur, valeur_cible, unite, date_saisie)
+        SELECT projet_id, nom, id, valeur, valeur_cible, unite, date_saisie
+        FROM (
+            SELECT i.*, ROW_NUMBER() OVER (
+                PARTITION BY projet_id, nom ORDER BY date_saisie DESC, id DESC
+            ) AS rang
+            FROM indicators i
+        ) ranked
+        WHERE rang = 1
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('indicator_latest')
+    op.drop_index('ix_indicators_projet_nom_date', table_name='indicators')
@@ -0,0 +1,26 @@
+"""thumbnail and preview urls on stored objects
+
+Revision ID: 5b9d3e7a2f18
+Revises: e4b8f1a3c692
+Create Date: 2026-10-19 15:48:12.604275
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b9d3e7a2f18'
+down_revision = 'e4b8f1a3c692'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('stored_objects', sa.Column('url_miniature', sa.Text(), nullable=True))
+    op.add_column('stored_objects', sa.Column('url_apercu', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('stored_objects', 'url_apercu')
+    op.drop_column('stored_objects', 'url_miniature')
@@ -0,0 +1,152 @@
+"""indicator definitions catalog
+
+Revision ID: 8a4e2d6c1b95
+Revises: 3f1c9a2b7d40
+Create Date: 2026-10-19 11:03:27.904611
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import re
+import unicodedata
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4e2d6c1b95'
+down_revision = '3f1c9a2b7d40'
+branch_labels = None
+depends_on = None
+
+
+def definition_key(nom: str) -> str:
+    """Frozen copy of indicator_definitions.definition_key as of this revision"""
+    text = unicodedata.normalize("NFKD", nom)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def _most_common(counts: dict):
+    return max(counts, key=counts.get) if counts else None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    op.create_table(
+        'indicator_definitions',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('cle', sa.String(255), nullable=False, unique=True),
+        sa.Column('nom', sa.String(255), nullable=False),
+        sa.Column('unite', sa.String(50)),
+        sa.Column('date_creation', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index('ix_indicator_definitions_id', 'indicator_definitions', ['id'])
+
+    # Deduplicate existing names: spelling variants share one normalized key
+    groups = {}
+    for nom, unite, total in bind.execute(
+        sa.text("SELECT nom, unite, COUNT(*) FROM indicators GROUP BY nom, unite")
+    ):
+        group = groups.setdefault(definition_key(nom), {"noms": {}, "unites": {}})
+        group["noms"][nom] = group["noms"].get(nom, 0) + total
+        if unite:
+            unite = unite.strip()[:50]
+            group["unites"][unite] = group["unites"].get(unite, 0) + total
+
+    definitions = sa.table(
+        'indicator_definitions',
+        sa.column('id', sa.Integer), sa.column('cle', sa.String), sa.column('nom', sa.String), sa.column('unite', sa.String)
+    )
+    for cle, group in groups.items():
+        bind.execute(definitions.insert().values(
+            cle=cle,
+            nom=_most_common(group["noms"]).strip(),
+            unite=_most_common(group["unites"])
+        ))
+
+    op.add_column('indicators', sa.Column('definition_id', sa.Integer(), nullable=True))
+    definition_ids = dict(bind.execute(sa.text("SELECT cle, id FROM indicator_definitions")).fetchall())
+    assign = sa.text(
+        "UPDATE indicators SET definition_id = :definition_id WHERE nom IN :noms"
+    ).bindparams(sa.bindparam('noms', expanding=True))
+    for cle, group in groups.items():
+        bind.execute(assign, {"definition_id": definition_ids[cle], "noms": list(group["noms"])})
+
+    op.alter_column('indicators', 'definition_id', existing_type=sa.Integer(), nullable=False)
+    op.create_index('ix_indicators_definition_id', 'indicators', ['definition_id'])
+    op.create_index('ix_indicators_projet_definition_date', 'indicators', ['projet_id', 'definition_id', 'date_saisie'])
+    op.create_foreign_key('fk_indicators_definition', 'indicators', 'indicator_definitions', ['definition_id'], ['id'])
+
+    # indicator_latest is rebuilt on the (projet_id, definition_id) key
+    op.drop_table('indicator_latest')
+    for index in sa.inspect(bind).get_indexes('indicators'):
+        if 'nom' in index['column_names']:
+            op.drop_index(index['name'], table_name='indicators')
+    op.drop_column('indicators', 'nom')
+    op.drop_column('indicators', 'unite')
+
+    op.create_table(
+        'indicator_latest',
+        sa.Column('projet_id', sa.Integer(), sa.ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('definition_id', sa.Integer(), sa.ForeignKey('indicator_definitions.id'), primary_key=True),
+        sa.Column('indicator_id', sa.Integer(), sa.ForeignKey('indicators.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('valeur', sa.Numeric(14, 4), nullable=False),
+        sa.Column('valeur_cible', sa.Numeric(14, 4)),
+        sa.Column('date_saisie', sa.Date(), nullable=False),
+        sa.Column('date_modification', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+    op.execute("""
+        INSERT INTO indicator_latest (projet_id, definition_id, indicator_id, valeur, valeur_cible, date_saisie)
+        SELECT projet_id, definition_id, id, valeur, valeur_cible, date_saisie
+        FROM (
+            SELECT i.*, ROW_NUMBER() OVER (
+                PARTITION BY projet_id, definition_id ORDER BY date_saisie DESC, id DESC
+            ) AS rang
+            FROM indicators i
+        ) ranked
+        WHERE rang = 1
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('indicator_latest')
+
+    op.add_column('indicators', sa.Column('nom', sa.String(255), nullable=True))
+    op.add_column('indicators', sa.Column('unite', sa.Text()))
+    op.execute("""
+        UPDATE indicators SET
+            nom = (SELECT d.nom FROM indicator_definitions d WHERE d.id = indicators.definition_id),
+            unite = (SELECT d.unite FROM indicator_definitions d WHERE d.id = indicators.definition_id)
+    """)
+    op.alter_column('indicators', 'nom', existing_type=sa.String(255), nullable=False)
+    op.create_index('ix_indicators_nom', 'indicators', ['nom'])
+    op.create_index('ix_indicators_projet_nom_date', 'indicators', ['projet_id', 'nom', 'date_saisie'])
+
+    op.drop_constraint('fk_indicators_definition', 'indicators', type_='foreignkey')
+    op.drop_index('ix_indicators_projet_definition_date', table_name='indicators')
+    op.drop_index('ix_indicators_definition_id', table_name='indicators')
+    op.drop_column('indicators', 'definition_id')
+    op.drop_table('indicator_definitions')
+
+    op.create_table(
+        'indicator_latest',
+        sa.Column('projet_id', sa.Integer(), sa.ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('nom', sa.String(255), primary_key=True),
+        sa.Column('indicator_id', sa.Integer(), sa.ForeignKey('indicators.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('valeur', sa.Numeric(14, 4), nullable=False),
+        sa.Column('valeur_cible', sa.Numeric(14, 4)),
+        sa.Column('unite', sa.Text()),
+        sa.Column('date_saisie', sa.Date(), nullable=False),
+        sa.Column('date_modification', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+    op.execute("""
+        INSERT INTO indicator_latest (projet_id, nom, indicator_id, valeur, valeur_cible, unite, date_saisie)
+        SELECT projet_id, nom, id, valeur, valeur_cible, unite, date_saisie
+        FROM (
+            SELECT i.*, ROW_NUMBER() OVER (
+                PARTITION BY projet_id, nom ORDER BY date_saisie DESC, id DESC
+            ) AS rang
+            FROM indicators i
+        ) ranked
+        WHERE rang = 1
+    """)
@@ -0,0 +1,36 @@
+"""storage deletion queue
+
+Revision ID: a61f0c4d8e27
+Revises: 5b9d3e7a2f18
+Create Date: 2026-10-19 16:20:37.915402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a61f0c4d8e27'
+down_revision = '5b9d3e7a2f18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'storage_deletions',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('url_stockage', sa.Text(), nullable=False),
+        sa.Column('sha256', sa.String(64), nullable=True),
+        sa.Column('tentatives', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('prochain_essai', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('derniere_erreur', sa.Text(), nullable=True),
+        sa.Column('date_creation', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index('ix_storage_deletions_id', 'storage_deletions', ['id'])
+    op.create_index('ix_storage_deletions_sha256', 'storage_deletions', ['sha256'])
+    op.create_index('ix_storage_deletions_prochain_essai', 'storage_deletions', ['prochain_essai'])
+
+
+def downgrade() -> None:
+    op.drop_table('storage_deletions')
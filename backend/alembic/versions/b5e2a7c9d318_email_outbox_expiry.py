@@ -0,0 +1,57 @@
+"""email outbox expiry
+
+Revision ID: b5e2a7c9d318
+Revises: 1e7c4a9b3d52
+Create Date: 2026-10-19 21:04:37.512806
+
+"""
+from datetime import timedelta
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e2a7c9d318'
+down_revision = '1e7c4a9b3d52'
+branch_labels = None
+depends_on = None
+
+# Reset links queued before this revision were valid for one hour
+LEGACY_RESET_TTL = timedelta(hours=1)
+
+email_outbox = sa.table(
+    'email_outbox',
+    sa.column('id', sa.Integer()),
+    sa.column('template', sa.String()),
+    sa.column('statut', sa.String()),
+    sa.column('contexte', sa.JSON()),
+    sa.column('date_creation', sa.DateTime()),
+    sa.column('expire_le', sa.DateTime()),
+)
+
+
+def upgrade() -> None:
+    op.add_column('email_outbox', sa.Column('expire_le', sa.DateTime(), nullable=True))
+
+    connection = op.get_bind()
+    # Failed emails kept their context (reset tokens included) forever
+    connection.execute(
+        email_outbox.update().where(email_outbox.c.statut == 'ECHEC').values(contexte=sa.null())
+    )
+    pending_resets = connection.execute(
+        sa.select(email_outbox.c.id, email_outbox.c.date_creation).where(
+            email_outbox.c.template == 'password_reset',
+            email_outbox.c.statut == 'EN_ATTENTE'
+        )
+    ).all()
+    for email_id, date_creation in pending_resets:
+        connection.execute(
+            email_outbox.update().where(email_outbox.c.id == email_id).values(
+                expire_le=date_creation + LEGACY_RESET_TTL
+            )
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('email_outbox') as batch_op:
+        batch_op.drop_column('expire_le')
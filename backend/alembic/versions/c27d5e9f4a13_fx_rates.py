@@ -0,0 +1,72 @@
+"""fx rates and normalized financement currency
+
+Revision ID: c27d5e9f4a13
+Revises: 8a4e2d6c1b95
+Create Date: 2026-10-19 13:41:08.227316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import logging
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+
+# revision identifiers, used by Alembic.
+revision = 'c27d5e9f4a13'
+down_revision = '8a4e2d6c1b95'
+branch_labels = None
+depends_on = None
+
+# Free-text spellings seen in devise, mapped to their ISO 4217 code (frozen with this revision)
+LEGACY_CURRENCIES = {
+    'EURO': 'EUR', 'EUROS': 'EUR', '€': 'EUR',
+    '$': 'USD', 'US$': 'USD', 'USD$': 'USD', 'DOLLAR': 'USD', 'DOLLARS': 'USD',
+    '£': 'GBP', 'LIVRE': 'GBP', 'LIVRES': 'GBP',
+    'FCFA': 'XOF', 'F CFA': 'XOF', 'CFA': 'XOF',
+    'CHF.': 'CHF', 'FRANC SUISSE': 'CHF',
+}
+
+
+def normalize_legacy_currencies() -> None:
+    """Upper-case and map devise values; abort on any that would not fit String(10)"""
+    op.execute("UPDATE financements SET devise = UPPER(TRIM(devise))")
+    financements = sa.table('financements', sa.column('devise', sa.Text()))
+    for legacy, code in LEGACY_CURRENCIES.items():
+        op.execute(financements.update().where(financements.c.devise == legacy).values(devise=code))
+
+    values = [row[0] for row in op.get_bind().execute(sa.text("SELECT DISTINCT devise FROM financements"))]
+    invalid = sorted(value for value in values if len(value) != 3 or not value.isalpha())
+    too_long = [value for value in invalid if len(value) > 10]
+    if too_long:
+        raise RuntimeError(
+            "financements.devise values longer than 10 characters, fix them before upgrading: "
+            + ", ".join(repr(value) for value in too_long)
+        )
+    if invalid:
+        # Kept as is: financement totals report them as non convertible
+        logger.warning("financements.devise values that are not ISO 4217 codes: %s", ", ".join(map(repr, invalid)))
+
+
+def upgrade() -> None:
+    op.create_table(
+        'fx_rates',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('devise', sa.String(10), nullable=False),
+        sa.Column('date_debut', sa.Date(), nullable=False),
+        sa.Column('taux_eur', sa.Numeric(18, 8), nullable=False),
+        sa.UniqueConstraint('devise', 'date_debut', name='uq_fx_rates_devise_date'),
+    )
+    op.create_index('ix_fx_rates_id', 'fx_rates', ['id'])
+    op.create_index('ix_fx_rates_lookup', 'fx_rates', ['devise', 'date_debut', 'taux_eur'])
+
+    # devise was free text: normalize existing values so they join on the index
+    normalize_legacy_currencies()
+    op.alter_column('financements', 'devise', existing_type=sa.Text(), type_=sa.String(10), existing_nullable=False)
+    op.create_index('ix_financements_devise_date', 'financements', ['devise', 'date_financement'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_financements_devise_date', table_name='financements')
+    op.alter_column('financements', 'devise', existing_type=sa.String(10), type_=sa.Text(), existing_nullable=False)
+    op.drop_table('fx_rates')
@@ -0,0 +1,27 @@
+"""upload session write lease
+
+Revision ID: c8f3d1a6e905
+Revises: b5e2a7c9d318
+Create Date: 2026-10-19 21:42:18.093574
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8f3d1a6e905'
+down_revision = 'b5e2a7c9d318'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('upload_sessions', sa.Column('ecriture_jeton', sa.String(32), nullable=True))
+    op.add_column('upload_sessions', sa.Column('ecriture_jusqu_a', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('upload_sessions') as batch_op:
+        batch_op.drop_column('ecriture_jusqu_a')
+        batch_op.drop_column('ecriture_jeton')
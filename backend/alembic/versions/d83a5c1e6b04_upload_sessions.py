@@ -0,0 +1,38 @@
+"""resumable upload sessions
+
+Revision ID: d83a5c1e6b04
+Revises: a61f0c4d8e27
+Create Date: 2026-10-19 17:05:51.372640
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd83a5c1e6b04'
+down_revision = 'a61f0c4d8e27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'upload_sessions',
+        sa.Column('id', sa.String(36), primary_key=True),
+        sa.Column('projet_id', sa.Integer(), sa.ForeignKey('projects.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('nom_fichier', sa.String(255), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('taille', sa.BigInteger(), nullable=False),
+        sa.Column('recu', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('chemin_temp', sa.Text(), nullable=False),
+        sa.Column('date_creation', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('date_expiration', sa.DateTime(), nullable=False),
+    )
+    op.create_index('ix_upload_sessions_user_id', 'upload_sessions', ['user_id'])
+    op.create_index('ix_upload_sessions_date_expiration', 'upload_sessions', ['date_expiration'])
+
+
+def downgrade() -> None:
+    op.drop_table('upload_sessions')
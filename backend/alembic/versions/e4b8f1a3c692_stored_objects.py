@@ -0,0 +1,42 @@
+"""content-addressed stored objects for documents
+
+Revision ID: e4b8f1a3c692
+Revises: c27d5e9f4a13
+Create Date: 2026-10-19 15:02:44.518903
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b8f1a3c692'
+down_revision = 'c27d5e9f4a13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'stored_objects',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('sha256', sa.String(64), nullable=False),
+        sa.Column('url_stockage', sa.Text(), nullable=False),
+        sa.Column('taille', sa.BigInteger(), nullable=False),
+        sa.Column('ref_count', sa.Integer(), nullable=False),
+        sa.Column('date_creation', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.UniqueConstraint('sha256'),
+    )
+    op.create_index('ix_stored_objects_id', 'stored_objects', ['id'])
+
+    # Existing documents keep their own file (objet_id NULL): hashing them would mean downloading every object
+    op.add_column('documents', sa.Column('objet_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('fk_documents_objet_id', 'documents', 'stored_objects', ['objet_id'], ['id'])
+    op.create_index('ix_documents_objet_id', 'documents', ['objet_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_documents_objet_id', table_name='documents')
+    op.drop_constraint('fk_documents_objet_id', 'documents', type_='foreignkey')
+    op.drop_column('documents', 'objet_id')
+    op.drop_table('stored_objects')
@@ -0,0 +1,38 @@
+"""email outbox
+
+Revision ID: f0c6b2e9d471
+Revises: d83a5c1e6b04
+Create Date: 2026-10-19 17:52:26.180934
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f0c6b2e9d471'
+down_revision = 'd83a5c1e6b04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'email_outbox',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('destinataire', sa.String(255), nullable=False),
+        sa.Column('template', sa.String(100), nullable=False),
+        sa.Column('contexte', sa.JSON(), nullable=True),
+        sa.Column('statut', sa.Enum('EN_ATTENTE', 'ENVOYE', 'ECHEC', name='emailstatut'), nullable=False),
+        sa.Column('tentatives', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('prochain_essai', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('derniere_erreur', sa.Text(), nullable=True),
+        sa.Column('date_creation', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('date_envoi', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_email_outbox_id', 'email_outbox', ['id'])
+    op.create_index('ix_email_outbox_pending', 'email_outbox', ['statut', 'prochain_essai'])
+
+
+def downgrade() -> None:
+    op.drop_table('email_outbox')
@@ -0,0 +1,142 @@
+from concurrent.futures import ThreadPoolExecutor
+from config import settings
+from storage import storage_for_url
+from typing import Callable, Iterable, Iterator, List, Tuple
+from datetime import datetime
+import io
+import logging
+import os
+import queue
+import threading
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class _ZipOutput(io.RawIOBase):
+    """Unseekable sink collecting what zipfile writes, drained by the response generator"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> List[bytes]:
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+
+class _Prefetch:
+    """Chunks of one file read by a worker thread into a bounded queue"""
+
+    def __init__(self, open_chunks: Callable[[], Iterable[bytes]], max_chunks: int, stop: threading.Event):
+        self._open_chunks = open_chunks
+        self._queue = queue.Queue(maxsize=max_chunks)
+        self._stop = stop
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def pump(self):
+        try:
+            for chunk in self._open_chunks():
+                if not self._put(chunk):
+                    return
+            self._put(_DONE)
+        except Exception as e:
+            self._put(e)
+
+    def __iter__(self) -> Iterator[bytes]:
+        while True:
+            item = self._queue.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+
+def iter_prefetched(sources: List[Callable[[], Iterable[bytes]]], workers: int, max_chunks: int) -> Iterator[Iterator[bytes]]:
+    """Yield the chunk iterator of each source in order, reading up to `workers` sources ahead"""
+    stop = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=max(workers, 1))
+    pending = []
+    try:
+        next_source = 0
+        for _ in sources:
+            while next_source < len(sources) and len(pending) < max(workers, 1):
+                prefetch = _Prefetch(sources[next_source], max_chunks, stop)
+                executor.submit(prefetch.pump)
+                pending.append(prefetch)
+                next_source += 1
+            yield iter(pending.pop(0))
+    finally:
+        # Also reached when the client disconnects: release blocked workers
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def archive_name(filename: str, used: set) -> str:
+    """File name inside the archive: no directories, unique"""
+    name = os.path.basename(filename.replace('\\', '/')) or 'document'
+    stem, extension = os.path.splitext(name)
+    candidate, counter = name, 2
+    while candidate.lower() in used:
+        candidate = f"{stem} ({counter}){extension}"
+        counter += 1
+    used.add(candidate.lower())
+    return candidate
+
+
+def iter_documents_archive(files: List[Tuple[str, str, datetime]]) -> Iterator[bytes]:
+    """Stream a ZIP of stored files given as (name, url_stockage, date)
+
+    Entries are written with data descriptors, so neither files nor the archive
+    are held in memory; at most DOCUMENT_ARCHIVE_PREFETCH files are read ahead,
+    each buffering DOCUMENT_ARCHIVE_BUFFER_CHUNKS chunks.
+    """
+    chunk_size = settings.document_archive_chunk_kb * 1024
+
+    def source(url: str) -> Callable[[], Iterable[bytes]]:
+        def open_chunks():
+            storage, key = storage_for_url(url)
+            return storage.iter_chunks(key, chunk_size)
+        return open_chunks
+
+    output = _ZipOutput()
+    used_names = set()
+    chunk_iterators = iter_prefetched(
+        [source(url) for _, url, _ in files],
+        settings.document_archive_prefetch,
+        settings.document_archive_buffer_chunks
+    )
+    try:
+        # Stored files are already compressed formats (pdf, images, xlsx)
+        with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+            for (name, url, date_upload), chunks in zip(files, chunk_iterators):
+                info = zipfile.ZipInfo(archive_name(name, used_names), date_time=date_upload.timetuple()[:6])
+                info.compress_type = zipfile.ZIP_STORED
+                with archive.open(info, 'w', force_zip64=True) as entry:
+                    for chunk in chunks:
+                        entry.write(chunk)
+                        yield from output.drain()
+                yield from output.drain()
+        yield from output.drain()
+    except Exception:
+        logger.exception("Document archive aborted")
+        raise
+    finally:
+        chunk_iterators.close()
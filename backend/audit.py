@@ -42,6 +42,8 @@ class AuditAction:
     USER_LOGIN = "USER_LOGIN"
     USER_LOGIN_FAILED = "USER_LOGIN_FAILED"
     USER_LOGOUT = "USER_LOGOUT"
+    USER_LOGOUT_ALL = "USER_LOGOUT_ALL"
+    REFRESH_TOKEN_REUSED = "REFRESH_TOKEN_REUSED"
     USER_CREATED = "USER_CREATED"
     USER_UPDATED = "USER_UPDATED"
     USER_DELETED = "USER_DELETED"
@@ -53,9 +55,11 @@ class AuditAction:
     INDICATOR_CREATED = "INDICATOR_CREATED"
     INDICATOR_UPDATED = "INDICATOR_UPDATED"
     INDICATOR_DELETED = "INDICATOR_DELETED"
+    INDICATOR_IMPORTED = "INDICATOR_IMPORTED"
     FINANCEMENT_CREATED = "FINANCEMENT_CREATED"
     FINANCEMENT_UPDATED = "FINANCEMENT_UPDATED"
     FINANCEMENT_DELETED = "FINANCEMENT_DELETED"
+    FINANCEMENT_BULK_STATUS = "FINANCEMENT_BULK_STATUS"
     DOCUMENT_UPLOADED = "DOCUMENT_UPLOADED"
     DOCUMENT_DELETED = "DOCUMENT_DELETED"
     EXPORT_GENERATED = "EXPORT_GENERATED"
@@ -0,0 +1,233 @@
+from config import settings
+from cache import TTLCache
+from abc import ABC, abstractmethod
+from typing import Optional, Tuple
+import logging
+import threading
+import time
+import uuid
+import redis
+
+logger = logging.getLogger(__name__)
+
+REVOCATION_CHANNEL = "auth:revocations"
+
+# Rotation is atomic: the presented token id must still be the family's current one,
+# or the previous one within the grace window (concurrent refreshes of one client)
+_ROTATE_SCRIPT = """
+local family = redis.call('HMGET', KEYS[1], 'jti', 'prev', 'rotated_at')
+local current = family[1]
+if not current then
+    return {0, ''}
+end
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+if current == ARGV[1] then
+    redis.call('HSET', KEYS[1], 'jti', ARGV[2], 'prev', ARGV[1], 'rotated_at', tostring(now))
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+    return {1, ARGV[2]}
+end
+if family[2] == ARGV[1] and now - tonumber(family[3]) <= tonumber(ARGV[4]) then
+    return {1, current}
+end
+redis.call('DEL', KEYS[1])
+return {-1, ''}
+"""
+
+ROTATED, UNKNOWN, REUSED = "rotated", "unknown", "reused"
+
+# Per-user revocation epochs; refreshed from Redis at most once per TTL, or pushed by pub/sub
+epoch_cache = TTLCache(settings.revocation_cache_ttl_seconds, name="revocation_epochs")
+
+
+def new_token_id() -> str:
+    return uuid.uuid4().hex
+
+
+class AuthSessionStore(ABC):
+    """Refresh-token families and per-user revocation epochs.
+
+    A family is one login session: each refresh replaces its current token id,
+    and presenting an older id (a stolen, replayed token) revokes the family.
+    The id just replaced stays accepted for refresh_reuse_grace_seconds and
+    gets the current id back, so parallel refreshes of one client don't
+    look like a replay.
+    Tokens carry the user's epoch at issue time; bumping the epoch revokes
+    every access and refresh token issued before.
+    """
+
+    @abstractmethod
+    def create_family(self, family_id: str, user_id: int, jti: str, ttl_seconds: int):
+        ...
+
+    @abstractmethod
+    def rotate(self, family_id: str, jti: str, new_jti: str, ttl_seconds: int) -> Tuple[str, Optional[str]]:
+        """Outcome and, when ROTATED, the token id to issue (new_jti, or the current one within the grace window)"""
+
+    @abstractmethod
+    def revoke_family(self, family_id: str):
+        ...
+
+    @abstractmethod
+    def get_epoch(self, user_id: int) -> int:
+        ...
+
+    @abstractmethod
+    def bump_epoch(self, user_id: int) -> int:
+        ...
+
+    def start(self):
+        """Start listening for revocations from other workers"""
+
+    def stop(self):
+        pass
+
+
+class MemoryAuthSessionStore(AuthSessionStore):
+    """In-process store, for a single worker (development, tests)"""
+
+    def __init__(self):
+        self._families = {}
+        self._epochs = {}
+        self._lock = threading.Lock()
+
+    def create_family(self, family_id: str, user_id: int, jti: str, ttl_seconds: int):
+        with self._lock:
+            self._families[family_id] = (jti, time.monotonic() + ttl_seconds, None, 0.0)
+
+    def rotate(self, family_id: str, jti: str, new_jti: str, ttl_seconds: int) -> Tuple[str, Optional[str]]:
+        now = time.monotonic()
+        with self._lock:
+            family = self._families.get(family_id)
+            if family is None or family[1] <= now:
+                self._families.pop(family_id, None)
+                return UNKNOWN, None
+            current, expires, previous, rotated_at = family
+            if current == jti:
+                self._families[family_id] = (new_jti, now + ttl_seconds, jti, now)
+                return ROTATED, new_jti
+            if previous == jti and now - rotated_at <= settings.refresh_reuse_grace_seconds:
+                return ROTATED, current
+            del self._families[family_id]
+            return REUSED, None
+
+    def revoke_family(self, family_id: str):
+        with self._lock:
+            self._families.pop(family_id, None)
+
+    def get_epoch(self, user_id: int) -> int:
+        return self._epochs.get(user_id, 0)
+
+    def bump_epoch(self, user_id: int) -> int:
+        with self._lock:
+            self._epochs[user_id] = self._epochs.get(user_id, 0) + 1
+            return self._epochs[user_id]
+
+
+class RedisAuthSessionStore(AuthSessionStore):
+    """Families as Redis hashes with TTL; epochs as counters cached in-process and pushed by pub/sub"""
+
+    def __init__(self, client: redis.Redis):
+        self.client = client
+        self._rotate = client.register_script(_ROTATE_SCRIPT)
+        self._listener = None
+
+    def create_family(self, family_id: str, user_id: int, jti: str, ttl_seconds: int):
+        key = f"auth:family:{family_id}"
+        pipeline = self.client.pipeline()
+        pipeline.hset(key, mapping={"jti": jti, "user_id": user_id})
+        pipeline.expire(key, ttl_seconds)
+        pipeline.execute()
+
+    def rotate(self, family_id: str, jti: str, new_jti: str, ttl_seconds: int) -> Tuple[str, Optional[str]]:
+        result, issued_jti = self._rotate(
+            keys=[f"auth:family:{family_id}"], args=[jti, new_jti, ttl_seconds, settings.refresh_reuse_grace_seconds]
+        )
+        return {1: ROTATED, 0: UNKNOWN, -1: REUSED}[int(result)], issued_jti or None
+
+    def revoke_family(self, family_id: str):
+        self.client.delete(f"auth:family:{family_id}")
+
+    def get_epoch(self, user_id: int) -> int:
+        epoch = epoch_cache.get(user_id)
+        if epoch is not None:
+            return epoch
+        try:
+            epoch = int(self.client.get(f"auth:epoch:{user_id}") or 0)
+        except redis.RedisError:
+            # Fail open on a Redis outage: tokens stay valid until they expire
+            logger.warning("Could not read revocation epoch of user %s", user_id, exc_info=True)
+            return 0
+        epoch_cache.set(user_id, epoch)
+        return epoch
+
+    def bump_epoch(self, user_id: int) -> int:
+        try:
+            epoch = int(self.client.incr(f"auth:epoch:{user_id}"))
+        except redis.RedisError:
+            # Callers have already committed (password change, deactivation): don't fail the request,
+            # revoke in this worker at least, until the cached epoch expires
+            logger.error(
+                "Could not revoke the tokens of user %s, Redis unavailable: other workers accept them until they expire",
+                user_id, exc_info=True
+            )
+            epoch = (epoch_cache.get(user_id) or 0) + 1
+            epoch_cache.set(user_id, epoch)
+            return epoch
+        epoch_cache.set(user_id, epoch)
+        try:
+            self.client.publish(REVOCATION_CHANNEL, f"{user_id}:{epoch}")
+        except redis.RedisError:
+            logger.warning("Could not publish the revocation of user %s, workers see it after their cache TTL", user_id)
+        return epoch
+
+    def _on_revocation(self, message: dict):
+        try:
+            user_id, epoch = (int(part) for part in message["data"].split(":"))
+        except (ValueError, AttributeError):
+            return
+        cached = epoch_cache.get(user_id)
+        if cached is None or epoch > cached:
+            epoch_cache.set(user_id, epoch)
+
+    def start(self):
+        if self._listener is not None:
+            return
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{REVOCATION_CHANNEL: self._on_revocation})
+        self._listener = pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def stop(self):
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+
+_store: Optional[AuthSessionStore] = None
+
+
+def _memory_store() -> MemoryAuthSessionStore:
+    """In-memory store, refused when several workers would each keep their own sessions"""
+    if settings.web_concurrency > 1:
+        raise RuntimeError(
+            f"Auth sessions need Redis with WEB_CONCURRENCY={settings.web_concurrency}: "
+            "in-memory sessions are not shared between workers (refresh and revocation would break)"
+        )
+    return MemoryAuthSessionStore()
+
+
+def get_auth_session_store() -> AuthSessionStore:
+    """Redis store when Redis answers, in-memory store otherwise (single worker only)"""
+    global _store
+    if _store is None:
+        if settings.auth_session_backend == "redis":
+            try:
+                client = redis.from_url(settings.redis_url, decode_responses=True)
+                client.ping()
+                _store = RedisAuthSessionStore(client)
+            except redis.RedisError:
+                _store = _memory_store()
+                logger.error("Redis unavailable, auth sessions are kept in memory (single worker only)")
+        else:
+            _store = _memory_store()
+    return _store
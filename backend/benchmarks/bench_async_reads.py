@@ -0,0 +1,150 @@
+"""
+Benchmark des routes de lecture synchrones et asynchrones
+
+Lance l'API deux fois (ASYNC_DB_ENABLED=false puis true) et mesure le débit
+et la latence de 500 clients concurrents sur les listes de projets,
+d'indicateurs et de financements et sur les KPIs.
+
+Base SQLite temporaire par défaut ; définir DATABASE_URL pour viser MySQL
+(la base doit alors déjà contenir des données et l'utilisateur id=1 être admin).
+
+Usage : python benchmarks/bench_async_reads.py [clients] [durée_en_secondes]
+"""
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(tempfile.gettempdir(), "bench_async_reads.sqlite")
+SEED = "DATABASE_URL" not in os.environ
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{DB_PATH}")
+os.environ["DEBUG"] = "False"
+sys.path.insert(0, BACKEND_DIR)
+
+import httpx
+from sqlalchemy import insert
+from database import engine, SessionLocal, Base
+from models import User, Project, Indicator, IndicatorDefinition, Financement
+from models import UserRole, ProjectDomain, FinancementStatut
+from security import create_access_token
+
+CLIENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+DURATION = float(sys.argv[2]) if len(sys.argv) > 2 else 20
+PORT = 8765
+PATHS = ["/api/v1/projects", "/api/v1/indicators", "/api/v1/financements", "/api/v1/stats/kpis"]
+
+
+def seed():
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    rng = random.Random(42)
+    start = date(2023, 1, 1)
+
+    db.execute(insert(User), [
+        {"id": i, "email": f"user{i}@bench.org", "mot_de_passe_hash": "x", "nom": "Bench", "prenom": str(i),
+         "role": UserRole.ADMIN if i == 1 else UserRole.DONATEUR, "actif": True}
+        for i in range(1, 51)
+    ])
+    db.execute(insert(Project), [
+        {"id": i, "titre": f"Projet {i}", "description": "bench", "domaine": ProjectDomain.EAU,
+         "localisation": "x", "pays": "x", "date_debut": start, "budget": 100000, "chef_projet_id": 1}
+        for i in range(1, 201)
+    ])
+    db.execute(insert(IndicatorDefinition), [
+        {"id": i, "cle": f"indicateur {i}", "nom": f"Indicateur {i}"} for i in range(1, 21)
+    ])
+    db.execute(insert(Indicator), [
+        {"projet_id": rng.randint(1, 200), "definition_id": (i % 20) + 1, "nom": f"Indicateur {(i % 20) + 1}",
+         "valeur": Decimal(rng.randint(1, 1000)), "date_saisie": start + timedelta(days=rng.randrange(365)),
+         "saisi_par": 1}
+        for i in range(5000)
+    ])
+    db.execute(insert(Financement), [
+        {"projet_id": rng.randint(1, 200), "donateur_id": rng.randint(2, 50),
+         "montant": Decimal(rng.randint(100, 100_000)), "devise": "EUR",
+         "date_financement": start + timedelta(days=rng.randrange(365)), "statut": rng.choice(list(FinancementStatut))}
+        for _ in range(5000)
+    ])
+    db.commit()
+    db.close()
+
+
+def start_server(async_enabled: bool) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        ASYNC_DB_ENABLED=str(async_enabled).lower(),
+        BACKGROUND_WORKERS_ENABLED="false",
+        RATE_LIMIT_ENABLED="false",
+        AUTH_SESSION_BACKEND="memory",
+        SCHEMA_REVISION_CHECK="off"  # Seeded with create_all, not migrations
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(PORT), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{PORT}/health").status_code == 200:
+                return server
+        except httpx.TransportError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("Server did not start")
+
+
+async def client_loop(client: httpx.AsyncClient, headers: dict, stop_at: float, latencies: list, errors: list):
+    rng = random.Random()
+    while time.monotonic() < stop_at:
+        start = time.perf_counter()
+        try:
+            response = await client.get(rng.choice(PATHS), headers=headers)
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors.append(response.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+
+
+async def run_load(headers: dict) -> tuple[list, list]:
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=CLIENTS, max_keepalive_connections=CLIENTS)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", limits=limits, timeout=60) as client:
+        stop_at = time.monotonic() + DURATION
+        await asyncio.gather(*(client_loop(client, headers, stop_at, latencies, errors) for _ in range(CLIENTS)))
+    return latencies, errors
+
+
+def percentile(values: list, p: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000 if values else float("nan")
+
+
+if __name__ == "__main__":
+    if SEED:
+        print("Préparation de la base SQLite...")
+        seed()
+    headers = {"Authorization": "Bearer " + create_access_token({"sub": "1", "email": "user1@bench.org", "role": "admin"})}
+
+    for async_enabled in (False, True):
+        server = start_server(async_enabled)
+        try:
+            latencies, errors = asyncio.run(run_load(headers))
+        finally:
+            server.terminate()
+            server.wait()
+        latencies.sort()
+        mode = "async" if async_enabled else "sync"
+        print(
+            f"[{mode}] {CLIENTS} clients : {len(latencies) / DURATION:.0f} req/s, "
+            f"p50 {percentile(latencies, 0.5):.0f} ms, p99 {percentile(latencies, 0.99):.0f} ms, "
+            f"{len(errors)} erreurs"
+        )
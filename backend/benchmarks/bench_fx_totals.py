@@ -0,0 +1,120 @@
+"""
+Benchmark de la conversion des financements en devise de reporting
+
+Compare la conversion côté SQL (fx.financement_totals) à une conversion
+ligne par ligne en Python sur une base SQLite de 1M financements.
+
+Usage : python benchmarks/bench_fx_totals.py [nombre_de_lignes]
+"""
+import os
+import sys
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+DB_PATH = os.path.join(tempfile.gettempdir(), "bench_fx_totals.sqlite")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ["DEBUG"] = "False"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+from database import engine, SessionLocal, Base
+from models import User, Project, Financement, FxRate, UserRole, ProjectDomain, FinancementStatut
+from fx import financement_totals, convert_amount, fx_cache
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+CURRENCIES = ["EUR", "USD", "XOF", "GBP", "CHF"]
+START = date(2021, 1, 1)
+DAYS = 3 * 365
+
+
+def seed():
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    rng = random.Random(42)
+
+    db.execute(insert(User), [
+        {"id": i, "email": f"user{i}@bench.org", "mot_de_passe_hash": "x", "nom": "Bench", "prenom": str(i),
+         "role": UserRole.DONATEUR if i > 1 else UserRole.CHEF_PROJET, "actif": True}
+        for i in range(1, 201)
+    ])
+    db.execute(insert(Project), [
+        {"id": i, "titre": f"Projet {i}", "description": "bench", "domaine": ProjectDomain.EAU,
+         "localisation": "x", "pays": "x", "date_debut": START, "budget": 100000, "chef_projet_id": 1}
+        for i in range(1, 501)
+    ])
+
+    # Daily rates for every non-base currency
+    base_rates = {"USD": 0.92, "XOF": 0.0015, "GBP": 1.17, "CHF": 1.04}
+    rates = []
+    for devise, taux in base_rates.items():
+        for d in range(DAYS):
+            rates.append({
+                "devise": devise, "date_debut": START + timedelta(days=d),
+                "taux_eur": Decimal(str(round(taux * (1 + rng.uniform(-0.05, 0.05)), 8)))
+            })
+    db.execute(insert(FxRate), rates)
+
+    # Each donor funds a handful of projects, many times over
+    portfolios = {donateur_id: rng.sample(range(1, 501), 5) for donateur_id in range(2, 201)}
+    statuts = list(FinancementStatut)
+    batch = []
+    for i in range(ROWS):
+        donateur_id = rng.randint(2, 200)
+        batch.append({
+            "projet_id": rng.choice(portfolios[donateur_id]), "donateur_id": donateur_id,
+            "montant": Decimal(rng.randint(100, 1_000_000)) / 100, "devise": rng.choice(CURRENCIES),
+            "date_financement": START + timedelta(days=rng.randrange(DAYS)), "statut": rng.choice(statuts)
+        })
+        if len(batch) == 50_000:
+            db.execute(insert(Financement), batch)
+            batch = []
+    if batch:
+        db.execute(insert(Financement), batch)
+    db.commit()
+    db.close()
+
+
+def bench_sql(target: str):
+    db = SessionLocal()
+    start = time.perf_counter()
+    totals = financement_totals(db, target)
+    elapsed = time.perf_counter() - start
+    db.close()
+    return elapsed, totals["total"]
+
+
+def bench_python_rows(target: str):
+    db = SessionLocal()
+    start = time.perf_counter()
+    total = Decimal(0)
+    par_projet, par_donateur, par_statut = {}, {}, {}
+    rows = db.query(
+        Financement.projet_id, Financement.donateur_id, Financement.statut,
+        Financement.montant, Financement.devise, Financement.date_financement
+    ).yield_per(10_000)
+    for projet_id, donateur_id, statut, montant, devise, date_financement in rows:
+        converted = convert_amount(db, montant, devise, date_financement, target)
+        if converted is not None:
+            total += converted
+            par_projet[projet_id] = par_projet.get(projet_id, Decimal(0)) + converted
+            par_donateur[donateur_id] = par_donateur.get(donateur_id, Decimal(0)) + converted
+            par_statut[statut] = par_statut.get(statut, Decimal(0)) + converted
+    elapsed = time.perf_counter() - start
+    db.close()
+    return elapsed, total
+
+
+if __name__ == "__main__":
+    print(f"Préparation de {ROWS} financements...")
+    seed()
+    fx_cache.invalidate()
+    for target in ["EUR", "USD"]:
+        sql_time, sql_total = bench_sql(target)
+        py_time, py_total = bench_python_rows(target)
+        print(f"[{target}] SQL : {sql_time:.2f}s (total {sql_total:,.2f})")
+        print(f"[{target}] Python ligne par ligne : {py_time:.2f}s (total {py_total:,.2f})")
@@ -0,0 +1,98 @@
+"""
+Benchmark du démarrage à froid
+
+Mesure le temps entre le lancement d'uvicorn et la première réponse de
+/health, pour l'arbre courant et pour une révision git de référence
+(imports des routes, create_all, vérification de la révision Alembic).
+
+Base SQLite temporaire par défaut, créée puis marquée à la révision Alembic
+courante ; définir DATABASE_URL pour viser MySQL (la base doit alors être à
+jour : `alembic upgrade head`).
+
+Usage : python benchmarks/bench_startup.py [lancements] [révision_de_référence]
+        (révision par défaut : HEAD~1)
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(tempfile.gettempdir(), "bench_startup.sqlite")
+SEED = "DATABASE_URL" not in os.environ
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{DB_PATH}")
+os.environ["DEBUG"] = "False"
+sys.path.insert(0, BACKEND_DIR)
+
+import httpx
+from alembic.runtime.migration import MigrationContext
+from database import engine, Base
+from migrations import script_directory
+import models  # noqa: F401 (registers the tables)
+
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+BASELINE_REF = sys.argv[2] if len(sys.argv) > 2 else "HEAD~1"
+PORT = 8766
+
+
+def seed():
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    Base.metadata.create_all(bind=engine)
+    # Same result as `alembic stamp head`, without running env.py
+    with engine.begin() as connection:
+        MigrationContext.configure(connection).stamp(script_directory(), "head")
+
+
+def export_tree(ref: str) -> str:
+    """Backend directory as of a git revision, extracted to a temporary directory"""
+    root = subprocess.check_output(["git", "rev-parse", "--show-toplevel"], cwd=BACKEND_DIR, text=True).strip()
+    prefix = os.path.relpath(BACKEND_DIR, root)
+    target = tempfile.mkdtemp(prefix="bench_startup_")
+    archive = subprocess.Popen(["git", "archive", f"{ref}:{prefix}"], cwd=root, stdout=subprocess.PIPE)
+    subprocess.check_call(["tar", "-x", "-C", target], stdin=archive.stdout)
+    archive.wait()
+    return target
+
+
+def time_to_first_request(app_dir: str) -> float:
+    env = dict(
+        os.environ,
+        BACKGROUND_WORKERS_ENABLED="false",
+        RATE_LIMIT_ENABLED="false",
+        AUTH_SESSION_BACKEND="memory"
+    )
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(PORT), "--log-level", "warning"],
+        cwd=app_dir, env=env
+    )
+    try:
+        while time.perf_counter() - started < 60:
+            try:
+                if httpx.get(f"http://127.0.0.1:{PORT}/health").status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.TransportError:
+                pass
+            if server.poll() is not None:
+                raise RuntimeError(f"Server in {app_dir} exited with code {server.returncode}")
+            time.sleep(0.005)
+        raise RuntimeError("Server did not start")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    if SEED:
+        print("Préparation de la base SQLite...")
+        seed()
+    trees = {BASELINE_REF: export_tree(BASELINE_REF), "arbre courant": BACKEND_DIR}
+    for name, app_dir in trees.items():
+        durations = sorted(time_to_first_request(app_dir) for _ in range(RUNS))
+        print(
+            f"[{name}] première réponse après {statistics.median(durations) * 1000:.0f} ms "
+            f"(médiane de {RUNS}, min {durations[0] * 1000:.0f} ms, max {durations[-1] * 1000:.0f} ms)"
+        )
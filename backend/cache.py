@@ -0,0 +1,55 @@
+from typing import Any, Hashable, Optional
+from metrics import record_cache_lookup
+import threading
+import time
+
+
+class TTLCache:
+    """Thread-safe in-process cache with per-entry expiry"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 10000, name: Optional[str] = None):
+        self.ttl_seconds = ttl_seconds
+        self.name = name  # Label of the lookup metrics
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            hit = entry is not None and entry[0] > time.monotonic()
+            if hit:
+                self.hits += 1
+            else:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+        if self.name:
+            record_cache_lookup(self.name, hit)
+        return entry[1] if hit else None
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            if len(self._entries) >= self.max_entries and key not in self._entries:
+                self._evict()
+            self._entries[key] = (expires_at, value)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _evict(self):
+        now = time.monotonic()
+        expired = [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        if len(self._entries) >= self.max_entries:
+            # Drop the entry closest to expiry
+            del self._entries[min(self._entries, key=lambda k: self._entries[k][0])]
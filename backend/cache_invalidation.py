@@ -0,0 +1,80 @@
+from config import settings
+from cache import TTLCache
+from typing import Callable, Dict, Hashable, Optional, Tuple
+import logging
+import time
+import redis
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "cache:invalidations"
+
+
+class CacheInvalidator:
+    """Drops an entry of a per-process cache in every worker.
+
+    The entry is deleted locally, then published on Redis pub/sub for the
+    other workers; with a single worker (WEB_CONCURRENCY=1) Redis is not used.
+    If Redis is unreachable, other workers serve the entry until its TTL.
+    """
+
+    def __init__(self):
+        self._caches: Dict[str, Tuple[TTLCache, Callable[[str], Hashable]]] = {}
+        self._client: Optional[redis.Redis] = None
+        self._listener = None
+
+    @property
+    def shared(self) -> bool:
+        return settings.web_concurrency > 1
+
+    def register(self, name: str, cache: TTLCache, parse_key: Callable[[str], Hashable] = str):
+        self._caches[name] = (cache, parse_key)
+
+    def _redis(self) -> redis.Redis:
+        if self._client is None:
+            self._client = redis.from_url(settings.redis_url, decode_responses=True)
+        return self._client
+
+    def invalidate(self, name: str, key: Hashable):
+        self._caches[name][0].delete(key)
+        if not self.shared:
+            return
+        try:
+            self._redis().publish(INVALIDATION_CHANNEL, f"{name}:{key}")
+        except redis.RedisError:
+            logger.warning(
+                "Could not publish the invalidation of %s %s, other workers serve it until its TTL", name, key
+            )
+
+    def _on_invalidation(self, message: dict):
+        try:
+            name, key = message["data"].split(":", 1)
+            cache, parse_key = self._caches[name]
+            cache.delete(parse_key(key))
+        except (ValueError, KeyError, AttributeError):
+            return
+
+    def start(self):
+        if not self.shared or self._listener is not None:
+            return
+        try:
+            pubsub = self._redis().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{INVALIDATION_CHANNEL: self._on_invalidation})
+        except redis.RedisError:
+            logger.error("Redis unavailable, cache invalidations of other workers are not received", exc_info=True)
+            return
+        self._listener = pubsub.run_in_thread(sleep_time=1, daemon=True, exception_handler=self._on_listener_error)
+
+    @staticmethod
+    def _on_listener_error(error, pubsub, thread):
+        # The subscription is restored on the next read once Redis is back
+        logger.warning("Cache invalidation listener lost Redis: %s", error)
+        time.sleep(1)
+
+    def stop(self):
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+
+cache_invalidator = CacheInvalidator()
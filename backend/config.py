@@ -16,12 +16,37 @@ class Settings(BaseSettings):
     db_name: str = os.getenv("DB_NAME", "impacttracker")
     db_user: str = os.getenv("DB_USER", "root")
     db_password: str = os.getenv("DB_PASSWORD", "momo12")
+    schema_revision_check: str = os.getenv("SCHEMA_REVISION_CHECK", "error")  # error, warn or off: database behind the Alembic head at startup
+
+    # Optional read replica for GET requests (empty: everything uses DATABASE_URL)
+    database_replica_url: str = os.getenv("DATABASE_REPLICA_URL", "")
+    replica_max_lag_seconds: int = int(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))  # Also how long reads stick to the primary after a write
+    replica_check_interval_seconds: int = int(os.getenv("REPLICA_CHECK_INTERVAL_SECONDS", "10"))
+
+    # Per-request SQL instrumentation (Server-Timing header, N+1 warnings)
+    # Server-Timing exposes query counts and timings to clients: on by default only with DEBUG
+    query_stats_enabled: bool = os.getenv("QUERY_STATS_ENABLED", os.getenv("DEBUG", "True")).lower() == "true"
+    n_plus_one_threshold: int = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))  # Same statement this many times in a request
+    slow_query_threshold_ms: int = int(os.getenv("SLOW_QUERY_THRESHOLD_MS", "500"))  # 0 disables the slow-query log
+    slow_query_log_size: int = int(os.getenv("SLOW_QUERY_LOG_SIZE", "200"))
+    slow_query_explain: bool = os.getenv("SLOW_QUERY_EXPLAIN", "True").lower() == "true"
+    metrics_enabled: bool = os.getenv("METRICS_ENABLED", "False").lower() == "true"  # Prometheus /metrics
+    metrics_token: str = os.getenv("METRICS_TOKEN", "")  # Bearer token required by /metrics when set
+    metrics_queue_size_ttl_seconds: int = int(os.getenv("METRICS_QUEUE_SIZE_TTL_SECONDS", "30"))  # Queue counts reused between scrapes
+    raise_on_lazy_load: bool = os.getenv("RAISE_ON_LAZY_LOAD", "False").lower() == "true"  # Test mode
+
+    # Async engine for the read routes (aiomysql; aiosqlite for SQLite URLs)
+    async_db_enabled: bool = os.getenv("ASYNC_DB_ENABLED", "False").lower() == "true"
+    async_database_url: str = os.getenv("ASYNC_DATABASE_URL", "")  # Derived from DATABASE_URL when empty
+    async_db_pool_size: int = int(os.getenv("ASYNC_DB_POOL_SIZE", "20"))
+    async_db_max_overflow: int = int(os.getenv("ASYNC_DB_MAX_OVERFLOW", "20"))
 
     # JWT
     jwt_secret: str = os.getenv("JWT_SECRET", "your-super-secret-jwt-key-change-in-production-min-32-chars")
     refresh_token_secret: str = os.getenv("REFRESH_TOKEN_SECRET", "your-super-secret-refresh-token-key-change-in-production-min-32-chars")
     access_token_expire_minutes: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
     refresh_token_expire_days: int = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+    refresh_reuse_grace_seconds: int = int(os.getenv("REFRESH_REUSE_GRACE_SECONDS", "10"))  # Parallel refreshes with the token just rotated
     algorithm: str = "HS256"
 
     # Encryption (MySQL uses AES_ENCRYPT/AES_DECRYPT, not pgcrypto)
@@ -33,6 +58,46 @@ class Settings(BaseSettings):
     password_history_count: int = int(os.getenv("PASSWORD_HISTORY_COUNT", "5"))
     max_login_attempts: int = int(os.getenv("MAX_LOGIN_ATTEMPTS", "5"))
     lockout_duration_minutes: int = int(os.getenv("LOCKOUT_DURATION_MINUTES", "15"))
+    bcrypt_workers: int = int(os.getenv("BCRYPT_WORKERS", str(os.cpu_count() or 2)))  # Concurrent password hashes
+
+    # Storage backend: "s3" or "local"
+    storage_backend: str = os.getenv("STORAGE_BACKEND", "s3")
+    local_storage_path: str = os.getenv("LOCAL_STORAGE_PATH", "storage")
+    local_storage_base_url: str = os.getenv("LOCAL_STORAGE_BASE_URL", "")  # e.g. https://api.example.org
+
+    # Download URLs (cached until shortly before they expire)
+    presigned_url_expiration_seconds: int = int(os.getenv("PRESIGNED_URL_EXPIRATION_SECONDS", "3600"))
+    presigned_url_refresh_margin_seconds: int = int(os.getenv("PRESIGNED_URL_REFRESH_MARGIN_SECONDS", "300"))
+    presigned_url_batch_max: int = int(os.getenv("PRESIGNED_URL_BATCH_MAX", "500"))
+
+    # Document thumbnails and previews (rendered in a process pool after upload)
+    document_preview_workers: int = int(os.getenv("DOCUMENT_PREVIEW_WORKERS", "2"))
+    document_thumbnail_size: int = int(os.getenv("DOCUMENT_THUMBNAIL_SIZE", "256"))
+    document_preview_size: int = int(os.getenv("DOCUMENT_PREVIEW_SIZE", "1600"))
+    document_preview_quality: int = int(os.getenv("DOCUMENT_PREVIEW_QUALITY", "80"))
+    document_recompress_min_kb: int = int(os.getenv("DOCUMENT_RECOMPRESS_MIN_KB", "1024"))  # 0 disables image recompression
+
+    # Resumable uploads (chunks are written to temporary files until finalized)
+    upload_sessions_path: str = os.getenv("UPLOAD_SESSIONS_PATH", "upload_sessions")
+    upload_session_ttl_hours: int = int(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24"))
+    upload_session_sweep_interval_seconds: int = int(os.getenv("UPLOAD_SESSION_SWEEP_INTERVAL_SECONDS", "600"))
+    upload_chunk_lease_seconds: int = int(os.getenv("UPLOAD_CHUNK_LEASE_SECONDS", "300"))  # Longest single chunk transfer
+
+    # Project document archives (ZIP streamed from storage)
+    document_archive_prefetch: int = int(os.getenv("DOCUMENT_ARCHIVE_PREFETCH", "4"))  # Files read ahead concurrently
+    document_archive_chunk_kb: int = int(os.getenv("DOCUMENT_ARCHIVE_CHUNK_KB", "256"))
+    document_archive_buffer_chunks: int = int(os.getenv("DOCUMENT_ARCHIVE_BUFFER_CHUNKS", "4"))  # Per prefetched file
+
+    # Background workers (storage deletion queue, upload session expiry, email outbox, token sweep)
+    background_workers_enabled: bool = os.getenv("BACKGROUND_WORKERS_ENABLED", "True").lower() == "true"
+    storage_deletion_interval_seconds: int = int(os.getenv("STORAGE_DELETION_INTERVAL_SECONDS", "10"))
+    storage_deletion_batch_size: int = int(os.getenv("STORAGE_DELETION_BATCH_SIZE", "1000"))  # S3 DeleteObjects takes at most 1000 keys
+    storage_deletion_retry_base_seconds: int = int(os.getenv("STORAGE_DELETION_RETRY_BASE_SECONDS", "30"))
+    storage_deletion_retry_max_seconds: int = int(os.getenv("STORAGE_DELETION_RETRY_MAX_SECONDS", "3600"))
+
+    # Event loop stall detector (debugging): logs the loop thread's stack when it blocks
+    loop_monitor_enabled: bool = os.getenv("LOOP_MONITOR_ENABLED", "False").lower() == "true"
+    loop_stall_threshold_ms: int = int(os.getenv("LOOP_STALL_THRESHOLD_MS", "100"))
 
     # S3 Storage
     s3_endpoint_url: str = os.getenv("S3_ENDPOINT_URL", "https://s3.amazonaws.com")
@@ -40,6 +105,8 @@ class Settings(BaseSettings):
     s3_secret_access_key: str = os.getenv("S3_SECRET_ACCESS_KEY", "")
     s3_bucket_name: str = os.getenv("S3_BUCKET_NAME", "impacttracker-bucket")
     s3_region: str = os.getenv("S3_REGION", "us-east-1")
+    s3_multipart_chunk_mb: int = int(os.getenv("S3_MULTIPART_CHUNK_MB", "8"))  # S3 minimum part size is 5MB
+    s3_upload_concurrency: int = int(os.getenv("S3_UPLOAD_CONCURRENCY", "4"))
 
     # File Upload
     max_upload_size_mb: int = int(os.getenv("MAX_UPLOAD_SIZE_MB", "5"))
@@ -49,6 +116,17 @@ class Settings(BaseSettings):
     def allowed_file_types_list(self) -> List[str]:
         return [t.strip() for t in self.allowed_file_types.split(",")]
 
+    # Indicator bulk import
+    indicator_import_batch_size: int = int(os.getenv("INDICATOR_IMPORT_BATCH_SIZE", "5000"))
+    indicator_import_max_errors: int = int(os.getenv("INDICATOR_IMPORT_MAX_ERRORS", "1000"))
+
+    # Currency conversion
+    fx_rates_file: str = os.getenv("FX_RATES_FILE", "fx_rates.csv")
+    fx_cache_ttl_seconds: int = int(os.getenv("FX_CACHE_TTL_SECONDS", "300"))
+
+    # Donor portfolio cache
+    portfolio_cache_ttl_seconds: int = int(os.getenv("PORTFOLIO_CACHE_TTL_SECONDS", "300"))
+
     # SMTP
     smtp_host: str = os.getenv("SMTP_HOST", "smtp.gmail.com")
     smtp_port: int = int(os.getenv("SMTP_PORT", "587"))
@@ -57,6 +135,19 @@ class Settings(BaseSettings):
     smtp_from_email: str = os.getenv("SMTP_FROM_EMAIL", "noreply@impacttracker.org")
     smtp_from_name: str = os.getenv("SMTP_FROM_NAME", "ImpactTracker")
     smtp_use_tls: bool = os.getenv("SMTP_USE_TLS", "True").lower() == "true"
+    smtp_anonymous: bool = os.getenv("SMTP_ANONYMOUS", "False").lower() == "true"  # Send without login (local relay)
+    smtp_timeout_seconds: int = int(os.getenv("SMTP_TIMEOUT_SECONDS", "30"))
+    smtp_pool_size: int = int(os.getenv("SMTP_POOL_SIZE", "4"))
+    smtp_idle_timeout_seconds: int = int(os.getenv("SMTP_IDLE_TIMEOUT_SECONDS", "60"))
+
+    # Email outbox (sent in the background)
+    email_outbox_interval_seconds: int = int(os.getenv("EMAIL_OUTBOX_INTERVAL_SECONDS", "5"))
+    email_outbox_batch_size: int = int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE", "50"))
+    email_outbox_lease_seconds: int = int(os.getenv("EMAIL_OUTBOX_LEASE_SECONDS", "300"))
+    email_max_attempts: int = int(os.getenv("EMAIL_MAX_ATTEMPTS", "8"))
+    email_retry_base_seconds: int = int(os.getenv("EMAIL_RETRY_BASE_SECONDS", "60"))
+    email_retry_max_seconds: int = int(os.getenv("EMAIL_RETRY_MAX_SECONDS", "21600"))
+    email_outbox_retention_days: int = int(os.getenv("EMAIL_OUTBOX_RETENTION_DAYS", "30"))
 
     # Application
     app_name: str = os.getenv("APP_NAME", "ImpactTracker API")
@@ -69,10 +160,29 @@ class Settings(BaseSettings):
     rate_limit_per_hour: int = int(os.getenv("RATE_LIMIT_PER_HOUR", "100"))
     rate_limit_login_attempts: int = int(os.getenv("RATE_LIMIT_LOGIN_ATTEMPTS", "5"))
     rate_limit_login_window_minutes: int = int(os.getenv("RATE_LIMIT_LOGIN_WINDOW_MINUTES", "15"))
+    rate_limit_password_reset_attempts: int = int(os.getenv("RATE_LIMIT_PASSWORD_RESET_ATTEMPTS", "5"))
+    rate_limit_password_reset_window_minutes: int = int(os.getenv("RATE_LIMIT_PASSWORD_RESET_WINDOW_MINUTES", "15"))
+    rate_limit_refreshes_per_minute: int = int(os.getenv("RATE_LIMIT_REFRESHES_PER_MINUTE", "10"))  # Per token family
+    rate_limit_writes_per_minute: int = int(os.getenv("RATE_LIMIT_WRITES_PER_MINUTE", "120"))
+    rate_limit_exports_per_hour: int = int(os.getenv("RATE_LIMIT_EXPORTS_PER_HOUR", "30"))
+    rate_limit_redis_timeout_ms: int = int(os.getenv("RATE_LIMIT_REDIS_TIMEOUT_MS", "200"))
+    rate_limit_redis_retry_seconds: int = int(os.getenv("RATE_LIMIT_REDIS_RETRY_SECONDS", "30"))  # Local buckets until then
+    rate_limit_local_max_keys: int = int(os.getenv("RATE_LIMIT_LOCAL_MAX_KEYS", "10000"))
 
     # Redis
     redis_url: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
+    # Refresh-token families and revocation epochs: "redis" (in-memory if unreachable) or "memory"
+    auth_session_backend: str = os.getenv("AUTH_SESSION_BACKEND", "redis")
+    # Worker processes (uvicorn reads the same variable); in-memory sessions are refused with more than one
+    web_concurrency: int = int(os.getenv("WEB_CONCURRENCY", "1"))
+    revocation_cache_ttl_seconds: int = int(os.getenv("REVOCATION_CACHE_TTL_SECONDS", "30"))
+
+    # Single-use auth tokens (password reset): "sql" or "redis"
+    token_store_backend: str = os.getenv("TOKEN_STORE_BACKEND", "sql")
+    password_reset_token_ttl_minutes: int = int(os.getenv("PASSWORD_RESET_TOKEN_TTL_MINUTES", "60"))
+    token_sweep_interval_seconds: int = int(os.getenv("TOKEN_SWEEP_INTERVAL_SECONDS", "3600"))
+
     # CORS
     allowed_origins: str = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000,http://localhost:5173")
     cors_origins: str = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://localhost:5173")
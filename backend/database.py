@@ -1,29 +1,234 @@
-from sqlalchemy import create_engine
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.sql.dml import UpdateBase
 from config import settings
+from metrics import DB_POOL_WAIT
+from typing import Optional
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class TimedPoolMixin:
+    """Records how long callers wait for a connection (pool_logging_name labels the engine)"""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            DB_POOL_WAIT.labels(self.logging_name or "default").observe(time.perf_counter() - started)
+
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
 
 # Create database engine
 engine = create_engine(
     settings.database_url,
+    poolclass=TimedQueuePool,
+    pool_logging_name="primary",
     pool_pre_ping=True,
     pool_size=10,
     max_overflow=20,
     echo=settings.debug
 )
 
+# Optional read replica, used by GET requests (see RoutingSession)
+replica_engine = None
+if settings.database_replica_url:
+    replica_engine = create_engine(
+        settings.database_replica_url,
+        poolclass=TimedQueuePool,
+        pool_logging_name="replica",
+        pool_pre_ping=True,
+        pool_size=10,
+        max_overflow=20,
+        echo=settings.debug
+    )
+
+# Requests carrying this cookie wrote recently: their reads go to the primary
+PRIMARY_COOKIE = "db_primary"
+READ_METHODS = {"GET", "HEAD"}
+
+
+class ReplicaStatus:
+    """Whether the replica may serve reads: reachable and no more than replica_max_lag_seconds behind.
+
+    A replica marked down is tried again after replica_check_interval_seconds,
+    whether or not the background check runs.
+    """
+
+    def __init__(self):
+        self.lag_seconds: Optional[float] = None
+        self._down_until = 0.0
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    def mark_down(self, reason: str):
+        if self.available:
+            logger.warning("Read replica unavailable (%s), reads use the primary", reason)
+        self._down_until = time.monotonic() + settings.replica_check_interval_seconds
+
+    def update(self, lag_seconds: Optional[float]):
+        self.lag_seconds = lag_seconds
+        if lag_seconds is not None and lag_seconds > settings.replica_max_lag_seconds:
+            self.mark_down(f"{lag_seconds:.0f}s behind")
+        else:
+            self._down_until = 0.0
+
+
+replica_status = ReplicaStatus()
+
+
+def _replication_lag(conn) -> Optional[float]:
+    """Seconds the replica is behind, None when unknown (not MySQL, or no access to the replication status)"""
+    if conn.dialect.name != "mysql":
+        return None
+    for statement, column in (("SHOW REPLICA STATUS", "Seconds_Behind_Source"), ("SHOW SLAVE STATUS", "Seconds_Behind_Master")):
+        try:
+            row = conn.exec_driver_sql(statement).mappings().first()
+        except DBAPIError:
+            continue
+        if row is None:
+            return None
+        # NULL: replication is stopped
+        return float("inf") if row[column] is None else float(row[column])
+    return None
+
+
+def check_replica():
+    """Background job: probe the replica and measure its replication lag"""
+    if replica_engine is None:
+        return
+    try:
+        with replica_engine.connect() as conn:
+            conn.exec_driver_sql("SELECT 1")
+            lag = _replication_lag(conn)
+    except DBAPIError as e:
+        replica_status.mark_down(type(e.orig).__name__)
+        return
+    replica_status.update(lag)
+
+
+def _on_replica_error(context):
+    if context.is_disconnect or isinstance(context.sqlalchemy_exception, OperationalError):
+        replica_status.mark_down(type(context.original_exception).__name__)
+
+
+class RoutingSession(Session):
+    """Sends reads to the replica when the session allows it (info["use_replica"]) and the replica is available.
+
+    Flushes, INSERT/UPDATE/DELETE statements and every statement after the
+    session's first flush go to the primary, so a request reads its own writes.
+    """
+
+    primary = engine
+    replica = replica_engine
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if (
+            self.replica is not None
+            and self.info.get("use_replica")
+            and not self._flushing
+            and not self.info.get("wrote")
+            and not isinstance(clause, UpdateBase)
+            and replica_status.available
+        ):
+            return self.replica
+        return self.primary
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _mark_written(session, flush_context):
+    session.info["wrote"] = True
+
+
+if replica_engine is not None:
+    event.listen(replica_engine, "handle_error", _on_replica_error)
+
 # Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False)
 
 # Base class for models
 Base = declarative_base()
 
 
+def reads_from_replica(request: Request) -> bool:
+    """GET requests read from the replica, unless the client wrote within the lag tolerance"""
+    return request.method in READ_METHODS and PRIMARY_COOKIE not in request.cookies
+
+# Async drivers used in place of the sync ones
+ASYNC_DRIVERS = {"mysql": "aiomysql", "sqlite": "aiosqlite"}
+
+
+def async_database_url(url: str) -> str:
+    """Same database as url, through the async driver of its dialect"""
+    url = make_url(url)
+    return url.set(drivername=f"{url.get_backend_name()}+{ASYNC_DRIVERS[url.get_backend_name()]}").render_as_string(
+        hide_password=False
+    )
+
+
+# Async engines and session factory, created only when enabled (the drivers are optional)
+async_engine = None
+async_replica_engine = None
+AsyncSessionLocal = None
+
+if settings.async_db_enabled:
+    url = make_url(settings.async_database_url or async_database_url(settings.database_url))
+    # aiosqlite connections are not pooled (NullPool)
+    pool_options = {} if url.get_backend_name() == "sqlite" else {
+        "poolclass": TimedAsyncQueuePool,
+        "pool_size": settings.async_db_pool_size,
+        "max_overflow": settings.async_db_max_overflow
+    }
+    async_engine = create_async_engine(
+        url, pool_pre_ping=True, pool_logging_name="async_primary", echo=settings.debug, **pool_options
+    )
+
+    async_replica_engine = None
+    if settings.database_replica_url:
+        async_replica_engine = create_async_engine(
+            async_database_url(settings.database_replica_url), pool_pre_ping=True, pool_logging_name="async_replica",
+            echo=settings.debug, **pool_options
+        )
+        event.listen(async_replica_engine.sync_engine, "handle_error", _on_replica_error)
+
+    class AsyncRoutingSession(RoutingSession):
+        primary = async_engine.sync_engine
+        replica = async_replica_engine.sync_engine if async_replica_engine is not None else None
+
+    AsyncSessionLocal = async_sessionmaker(
+        class_=AsyncSession, sync_session_class=AsyncRoutingSession, autoflush=False, expire_on_commit=False
+    )
+
+
 # Dependency to get DB session
-def get_db():
+def get_db(request: Request):
     db = SessionLocal()
+    db.info["use_replica"] = reads_from_replica(request)
     try:
         yield db
     finally:
         db.close()
 
+
+# Dependency to get an async DB session
+async def get_async_db(request: Request):
+    async with AsyncSessionLocal() as db:
+        db.info["use_replica"] = reads_from_replica(request)
+        yield db
@@ -1,21 +1,20 @@
 from fastapi import Depends, HTTPException, status, Header, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import Optional
-from database import get_db
+from database import get_db, get_async_db
 from models import User
 from security import verify_token
+from auth_sessions import get_auth_session_store
 from config import settings
 
 security = HTTPBearer()
 
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get current authenticated user from JWT token"""
-    token = credentials.credentials
+def authenticated_user_id(token: str) -> int:
+    """Validate an access token and return its user id"""
     payload = verify_token(token, is_refresh=False)
     
     if payload is None:
@@ -38,7 +37,18 @@ def get_current_user(
             detail="Invalid token payload",
         )
     
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    # Revocation check against the cached per-user epoch (no DB query)
+    if payload.get("epo", 0) < get_auth_session_store().get_epoch(int(user_id)):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    return int(user_id)
+
+
+def check_active_user(user: Optional[User]) -> User:
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -54,6 +64,25 @@ def get_current_user(
     return user
 
 
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> User:
+    """Get current authenticated user from JWT token"""
+    user_id = authenticated_user_id(credentials.credentials)
+    return check_active_user(db.query(User).filter(User.id == user_id).first())
+
+
+async def get_current_user_async(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    """Get current authenticated user from JWT token (async session)"""
+    # The revocation epoch may come from Redis (sync client): keep it off the event loop
+    user_id = await run_in_threadpool(authenticated_user_id, credentials.credentials)
+    return check_active_user(await db.get(User, user_id))
+
+
 def require_role(allowed_roles: list):
     """Decorator to require specific role(s)"""
     def role_checker(current_user: User = Depends(get_current_user)) -> User:
@@ -66,6 +95,18 @@ def require_role(allowed_roles: list):
     return role_checker
 
 
+def require_role_async(allowed_roles: list):
+    """require_role for routes using the async session"""
+    async def role_checker(current_user: User = Depends(get_current_user_async)) -> User:
+        if current_user.role.value not in allowed_roles:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"Required role: {', '.join(allowed_roles)}"
+            )
+        return current_user
+    return role_checker
+
+
 def require_permission(permission: str):
     """Decorator to require specific permission"""
     # Permission mapping: action_resource or resource_action
@@ -111,6 +152,9 @@ def get_current_user_optional(
     if user_id is None:
         return None
     
+    if payload.get("epo", 0) < get_auth_session_store().get_epoch(int(user_id)):
+        return None
+    
     user = db.query(User).filter(User.id == int(user_id)).first()
     if user and user.actif:
         return user
@@ -1,86 +1,316 @@
-import aiosmtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import EmailOutbox, EmailStatut
 from config import settings
-from typing import Optional
-import jinja2
-from pathlib import Path
+from typing import Optional, TYPE_CHECKING
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from functools import lru_cache
+import asyncio
+import logging
+import time
 
+if TYPE_CHECKING:
+    import aiosmtplib
 
-async def send_email(
-    to_email: str,
-    subject: str,
-    body_html: Optional[str] = None,
-    body_text: Optional[str] = None
-) -> bool:
-    """Send email via SMTP"""
-    if not settings.smtp_user or not settings.smtp_password:
-        # In development, just log
-        print(f"[EMAIL] Would send to {to_email}: {subject}")
-        return True
-    
-    try:
-        message = MIMEMultipart("alternative")
-        message["From"] = f"{settings.smtp_from_name} <{settings.smtp_from_email}>"
-        message["To"] = to_email
-        message["Subject"] = subject
-        
-        if body_text:
-            message.attach(MIMEText(body_text, "plain"))
-        if body_html:
-            message.attach(MIMEText(body_html, "html"))
-        
-        await aiosmtplib.send(
-            message,
-            hostname=settings.smtp_host,
-            port=settings.smtp_port,
-            username=settings.smtp_user,
-            password=settings.smtp_password,
-            use_tls=settings.smtp_use_tls
-        )
-        return True
-    except Exception as e:
-        print(f"Failed to send email: {str(e)}")
-        return False
-
+logger = logging.getLogger(__name__)
 
-async def send_password_reset_email(to_email: str, reset_token: str, reset_url: str) -> bool:
-    """Send password reset email"""
-    subject = "Réinitialisation de votre mot de passe - ImpactTracker"
-    body_html = f"""
+# Email templates: subject, HTML body and optional text body
+EMAIL_TEMPLATES = {
+    "password_reset": {
+        "subject": "Réinitialisation de votre mot de passe - ImpactTracker",
+        "html": """
     <html>
         <body>
             <h2>Réinitialisation de votre mot de passe</h2>
             <p>Vous avez demandé à réinitialiser votre mot de passe.</p>
             <p>Cliquez sur le lien suivant pour réinitialiser votre mot de passe :</p>
-            <p><a href="{reset_url}?token={reset_token}">{reset_url}?token={reset_token}</a></p>
-            <p>Ce lien est valide pendant 1 heure.</p>
+            <p><a href="{{ reset_url }}?token={{ reset_token }}">{{ reset_url }}?token={{ reset_token }}</a></p>
+            <p>Ce lien est valide pendant {{ ttl_minutes }} minutes.</p>
             <p>Si vous n'avez pas demandé cette réinitialisation, ignorez cet email.</p>
         </body>
     </html>
-    """
-    body_text = f"""
+    """,
+        "text": """
     Réinitialisation de votre mot de passe
-    
-    Cliquez sur le lien suivant pour réinitialiser votre mot de passe :
-    {reset_url}?token={reset_token}
-    
-    Ce lien est valide pendant 1 heure.
-    """
-    return await send_email(to_email, subject, body_html, body_text)
 
+    Cliquez sur le lien suivant pour réinitialiser votre mot de passe :
+    {{ reset_url }}?token={{ reset_token }}
 
-async def send_welcome_email(to_email: str, name: str, temp_password: Optional[str] = None) -> bool:
-    """Send welcome email to new user"""
-    subject = "Bienvenue sur ImpactTracker"
-    body_html = f"""
+    Ce lien est valide pendant {{ ttl_minutes }} minutes.
+    """
+    },
+    "welcome": {
+        "subject": "Bienvenue sur ImpactTracker",
+        "html": """
     <html>
         <body>
-            <h2>Bienvenue {name} !</h2>
+            <h2>Bienvenue {{ name }} !</h2>
             <p>Votre compte ImpactTracker a été créé avec succès.</p>
-            {"<p>Votre mot de passe temporaire est : <strong>" + temp_password + "</strong></p><p>Veuillez le changer lors de votre première connexion.</p>" if temp_password else ""}
+            {% if temp_password %}<p>Votre mot de passe temporaire est : <strong>{{ temp_password }}</strong></p><p>Veuillez le changer lors de votre première connexion.</p>{% endif %}
         </body>
     </html>
     """
-    return await send_email(to_email, subject, body_html)
+    }
+}
+
+@lru_cache(maxsize=None)
+def _compiled_templates() -> dict:
+    """Templates are compiled once, on the first email (jinja2 stays out of worker boot)"""
+    import jinja2
+
+    html_env = jinja2.Environment(autoescape=True)
+    text_env = jinja2.Environment(autoescape=False)
+    return {
+        name: {
+            part: (html_env if part == "html" else text_env).from_string(source)
+            for part, source in parts.items()
+        }
+        for name, parts in EMAIL_TEMPLATES.items()
+    }
+
+
+def render_email(template: str, context: dict) -> tuple[str, str, Optional[str]]:
+    """Render a template into (subject, HTML body, text body)"""
+    parts = _compiled_templates()[template]
+    return (
+        parts["subject"].render(**context),
+        parts["html"].render(**context),
+        parts["text"].render(**context) if "text" in parts else None
+    )
+
+
+def build_message(to_email: str, subject: str, body_html: Optional[str], body_text: Optional[str]) -> MIMEMultipart:
+    message = MIMEMultipart("alternative")
+    message["From"] = f"{settings.smtp_from_name} <{settings.smtp_from_email}>"
+    message["To"] = to_email
+    message["Subject"] = subject
+
+    if body_text:
+        message.attach(MIMEText(body_text, "plain"))
+    if body_html:
+        message.attach(MIMEText(body_html, "html"))
+    return message
+
+
+def smtp_configured() -> bool:
+    return settings.smtp_anonymous or bool(settings.smtp_user and settings.smtp_password)
+
+
+class SMTPConnectionPool:
+    """Authenticated SMTP connections reused across messages and batches"""
+
+    def __init__(self, size: int):
+        self.size = max(size, 1)
+        self._idle = []
+        self._semaphore = None
+
+    async def _connect(self) -> "aiosmtplib.SMTP":
+        import aiosmtplib
+
+        client = aiosmtplib.SMTP(
+            hostname=settings.smtp_host,
+            port=settings.smtp_port,
+            use_tls=settings.smtp_use_tls,
+            timeout=settings.smtp_timeout_seconds
+        )
+        await client.connect()
+        if settings.smtp_user and settings.smtp_password:
+            await client.login(settings.smtp_user, settings.smtp_password)
+        return client
+
+    async def _acquire(self) -> "aiosmtplib.SMTP":
+        while self._idle:
+            client, last_used = self._idle.pop()
+            # Servers drop idle sessions: don't reuse one that may be gone
+            if client.is_connected and time.monotonic() - last_used < settings.smtp_idle_timeout_seconds:
+                return client
+            client.close()
+        return await self._connect()
+
+    @asynccontextmanager
+    async def connection(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.size)
+        async with self._semaphore:
+            client = await self._acquire()
+            try:
+                yield client
+            except BaseException:
+                client.close()
+                raise
+            self._idle.append((client, time.monotonic()))
+
+    async def close(self):
+        import aiosmtplib
+
+        idle, self._idle = self._idle, []
+        for client, _ in idle:
+            try:
+                await client.quit()
+            except aiosmtplib.SMTPException:
+                client.close()
+
+
+smtp_pool = SMTPConnectionPool(settings.smtp_pool_size)
+
+
+async def send_email(
+    to_email: str,
+    subject: str,
+    body_html: Optional[str] = None,
+    body_text: Optional[str] = None
+) -> bool:
+    """Send email via SMTP right away (requests queue them with enqueue_email instead)"""
+    if not smtp_configured():
+        # In development, just log
+        logger.info("[EMAIL] Would send to %s: %s", to_email, subject)
+        return True
+
+    try:
+        async with smtp_pool.connection() as client:
+            await client.send_message(build_message(to_email, subject, body_html, body_text))
+        return True
+    except Exception as e:
+        logger.warning("Failed to send email: %s", e)
+        return False
+
+
+def enqueue_email(
+    db: Session, to_email: str, template: str, context: dict, expires_in_seconds: Optional[int] = None
+) -> EmailOutbox:
+    """Queue an email in the caller's transaction; it is sent once that commits.
+
+    An email whose context holds a secret gets expires_in_seconds: past it the
+    email is not sent and its context is erased.
+    """
+    if template not in EMAIL_TEMPLATES:
+        raise ValueError(f"Unknown email template: {template}")
+    now = datetime.utcnow()
+    email = EmailOutbox(
+        destinataire=to_email,
+        template=template,
+        contexte=context,
+        statut=EmailStatut.EN_ATTENTE,
+        prochain_essai=now,
+        expire_le=now + timedelta(seconds=expires_in_seconds) if expires_in_seconds else None
+    )
+    db.add(email)
+    return email
+
+
+def queue_password_reset_email(db: Session, to_email: str, reset_token: str, reset_url: str) -> EmailOutbox:
+    """Queue password reset email (expires with the token it carries)"""
+    ttl_minutes = settings.password_reset_token_ttl_minutes
+    return enqueue_email(
+        db, to_email, "password_reset",
+        {"reset_token": reset_token, "reset_url": reset_url, "ttl_minutes": ttl_minutes},
+        expires_in_seconds=ttl_minutes * 60
+    )
+
+
+def queue_welcome_email(db: Session, to_email: str, name: str, temp_password: Optional[str] = None) -> EmailOutbox:
+    """Queue welcome email to new user"""
+    return enqueue_email(db, to_email, "welcome", {"name": name, "temp_password": temp_password})
+
+
+def _claim_pending_emails() -> list:
+    """Lease a batch of due emails so other workers skip them while they are sent"""
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        # A secret that outlived its token is no longer worth sending, nor keeping
+        db.query(EmailOutbox).filter(
+            EmailOutbox.statut == EmailStatut.EN_ATTENTE,
+            EmailOutbox.expire_le <= now
+        ).update(
+            {EmailOutbox.statut: EmailStatut.ECHEC, EmailOutbox.contexte: None, EmailOutbox.derniere_erreur: "Expiré avant envoi"},
+            synchronize_session=False
+        )
+        db.commit()
+
+        emails = db.query(EmailOutbox).filter(
+            EmailOutbox.statut == EmailStatut.EN_ATTENTE,
+            EmailOutbox.prochain_essai <= now
+        ).order_by(EmailOutbox.id).limit(settings.email_outbox_batch_size).with_for_update(skip_locked=True).all()
+
+        claimed = []
+        for email in emails:
+            email.prochain_essai = now + timedelta(seconds=settings.email_outbox_lease_seconds)
+            claimed.append((email.id, email.destinataire, email.template, email.contexte or {}))
+        db.commit()
+        return claimed
+    finally:
+        db.close()
+
+
+def _record_results(errors_by_id: dict):
+    """Mark sent emails, schedule retries (exponential backoff) or give up on failed ones"""
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        emails = db.query(EmailOutbox).filter(EmailOutbox.id.in_(list(errors_by_id))).all()
+        for email in emails:
+            error = errors_by_id[email.id]
+            if error is None:
+                email.statut = EmailStatut.ENVOYE
+                email.date_envoi = now
+                email.contexte = None
+                email.derniere_erreur = None
+                continue
+            email.tentatives += 1
+            email.derniere_erreur = error
+            if email.tentatives >= settings.email_max_attempts:
+                email.statut = EmailStatut.ECHEC
+                email.contexte = None
+            else:
+                delay = settings.email_retry_base_seconds * 2 ** (email.tentatives - 1)
+                email.prochain_essai = now + timedelta(seconds=min(delay, settings.email_retry_max_seconds))
+
+        # Keep sent and failed emails for a while, for support
+        retention_limit = now - timedelta(days=settings.email_outbox_retention_days)
+        db.query(EmailOutbox).filter(
+            EmailOutbox.statut == EmailStatut.ENVOYE,
+            EmailOutbox.date_envoi < retention_limit
+        ).delete(synchronize_session=False)
+        db.query(EmailOutbox).filter(
+            EmailOutbox.statut == EmailStatut.ECHEC,
+            EmailOutbox.date_creation < retention_limit
+        ).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def _deliver(to_email: str, template: str, context: dict) -> Optional[str]:
+    """Send one queued email; returns the error message on failure"""
+    try:
+        subject, body_html, body_text = render_email(template, context)
+        if not smtp_configured():
+            logger.info("[EMAIL] Would send to %s: %s", to_email, subject)
+            return None
+        async with smtp_pool.connection() as client:
+            await client.send_message(build_message(to_email, subject, body_html, body_text))
+        return None
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+
+
+async def send_pending_emails() -> int:
+    """Background job: send due outbox emails in batches over pooled connections"""
+    processed = 0
+    while True:
+        claimed = await asyncio.to_thread(_claim_pending_emails)
+        if not claimed:
+            return processed
+
+        errors = await asyncio.gather(*(
+            _deliver(to_email, template, context) for _, to_email, template, context in claimed
+        ))
+        await asyncio.to_thread(_record_results, {email[0]: error for email, error in zip(claimed, errors)})
 
+        processed += len(claimed)
+        if len(claimed) < settings.email_outbox_batch_size:
+            return processed
@@ -4,17 +4,18 @@ from typing import List
 from decimal import Decimal
 from datetime import datetime
 import io
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
+from indicator_definitions import indicator_rollup
 
 
 def generate_pdf_report(projects: List[Project], db: Session) -> bytes:
     """Generate PDF report of projects"""
+    # reportlab is imported on first export, not at worker boot
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4)
     elements = []
@@ -70,6 +71,9 @@ def generate_pdf_report(projects: List[Project], db: Session) -> bytes:
 
 def generate_excel_report(projects: List[Project], db: Session) -> bytes:
     """Generate Excel report of projects"""
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, Alignment, PatternFill
+
     wb = Workbook()
     ws = wb.active
     ws.title = "Projets"
@@ -105,6 +109,28 @@ def generate_excel_report(projects: List[Project], db: Session) -> bytes:
     for i, width in enumerate(column_widths, 1):
         ws.column_dimensions[chr(64 + i)].width = width
     
+    # Indicators rollup (latest values aggregated by definition)
+    ws_indicators = wb.create_sheet("Indicateurs")
+    ws_indicators.append(['ID', 'Indicateur', 'Unité', 'Projets', 'Valeur totale', 'Cible totale', 'Progression'])
+    for cell in ws_indicators[1]:
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = Alignment(horizontal="center")
+    
+    for row in indicator_rollup(db, [project.id for project in projects]):
+        ws_indicators.append([
+            row["definition_id"],
+            row["nom"],
+            row["unite"],
+            row["nb_projets"],
+            float(row["total_valeur"]),
+            float(row["total_cible"]) if row["total_cible"] is not None else None,
+            float(row["progression"]) if row["progression"] is not None else None
+        ])
+    
+    for i, width in enumerate([8, 30, 12, 10, 15, 15, 12], 1):
+        ws_indicators.column_dimensions[chr(64 + i)].width = width
+    
     # Save to bytes
     buffer = io.BytesIO()
     wb.save(buffer)
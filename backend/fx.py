@@ -0,0 +1,190 @@
+from sqlalchemy import select, func, case, literal
+from sqlalchemy.orm import Session
+from models import Financement, FinancementStatut, FxRate
+from config import settings
+from typing import Iterable, Optional
+from decimal import Decimal
+from datetime import date, datetime
+from bisect import bisect_right
+import csv
+import threading
+import time
+
+# Rates are stored against EUR, which therefore never needs a row
+BASE_CURRENCY = "EUR"
+
+
+def normalize_currency(devise: str) -> str:
+    """Normalize a currency code (ISO 4217, upper case)"""
+    return (devise or "").strip().upper()
+
+
+class FxRateCache:
+    """In-memory copy of fx_rates for per-value conversions, refreshed after a TTL"""
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._rates = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _ensure_loaded(self, db: Session):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl_seconds:
+            return
+        # Query outside the lock: under an async session (run_sync) the query yields to
+        # the event loop, and another request on that loop must not block on the lock
+        rates = {}
+        rows = db.query(FxRate.devise, FxRate.date_debut, FxRate.taux_eur).order_by(
+            FxRate.devise, FxRate.date_debut
+        ).all()
+        for devise, date_debut, taux_eur in rows:
+            dates, values = rates.setdefault(devise, ([], []))
+            dates.append(date_debut)
+            values.append(Decimal(taux_eur))
+        with self._lock:
+            self._rates = rates
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def currencies(self, db: Session) -> set:
+        self._ensure_loaded(db)
+        return set(self._rates) | {BASE_CURRENCY}
+
+    def get_rate(self, db: Session, devise: str, on_date: date) -> Optional[Decimal]:
+        """Value in EUR of one unit of devise on the given date"""
+        devise = normalize_currency(devise)
+        if devise == BASE_CURRENCY:
+            return Decimal(1)
+        self._ensure_loaded(db)
+        if devise not in self._rates:
+            return None
+        dates, values = self._rates[devise]
+        position = bisect_right(dates, on_date) - 1
+        return values[position] if position >= 0 else None
+
+
+fx_cache = FxRateCache(settings.fx_cache_ttl_seconds)
+
+
+def convert_amount(db: Session, montant: Decimal, devise: str, on_date: date, target: str) -> Optional[Decimal]:
+    """Convert a single amount with the rates effective on the given date"""
+    devise, target = normalize_currency(devise), normalize_currency(target)
+    if devise == target:
+        return Decimal(montant)
+    source_rate = fx_cache.get_rate(db, devise, on_date)
+    target_rate = fx_cache.get_rate(db, target, on_date)
+    if source_rate is None or target_rate is None:
+        return None
+    return Decimal(montant) * source_rate / target_rate
+
+
+def load_fx_rates_file(db: Session, path: str) -> int:
+    """Load rates from a CSV file (devise,date,taux_eur), replacing the currencies it contains"""
+    by_currency = {}
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            devise = normalize_currency(row["devise"])
+            if devise == BASE_CURRENCY:
+                continue
+            date_debut = datetime.strptime(row["date"].strip(), "%Y-%m-%d").date()
+            by_currency.setdefault(devise, {})[date_debut] = Decimal(row["taux_eur"].strip())
+
+    rows = [
+        {"devise": devise, "date_debut": date_debut, "taux_eur": taux_eur}
+        for devise, rates in by_currency.items()
+        for date_debut, taux_eur in rates.items()
+    ]
+
+    db.query(FxRate).filter(FxRate.devise.in_(list(by_currency))).delete(synchronize_session=False)
+    if rows:
+        db.bulk_insert_mappings(FxRate, rows)
+    db.commit()
+    fx_cache.invalidate()
+    return len(rows)
+
+
+def _rate_at(devise_column, date_column):
+    """Correlated lookup of the rate effective on a date (one index seek)"""
+    return select(FxRate.taux_eur).where(
+        FxRate.devise == devise_column,
+        FxRate.date_debut <= date_column
+    ).order_by(FxRate.date_debut.desc()).limit(1).scalar_subquery()
+
+
+def financement_totals(
+    db: Session,
+    target: str = BASE_CURRENCY,
+    statuts: Optional[Iterable] = None,
+    donateur_id: Optional[int] = None,
+    projet_ids: Optional[Iterable[int]] = None
+) -> dict:
+    """Sum financements in a reporting currency, converted in SQL with date-effective rates.
+
+    Each row's rates are resolved by an index seek on fx_rates, then amounts are
+    grouped once by (project, donor, status, currency); project, donor, status
+    and global totals are folded from those groups. Amounts without a rate on
+    their date are reported per currency in non_converti.
+    """
+    target = normalize_currency(target)
+
+    source_rate = case(
+        (Financement.devise == BASE_CURRENCY, literal(1)),
+        else_=_rate_at(Financement.devise, Financement.date_financement)
+    )
+    if target == BASE_CURRENCY:
+        target_rate = literal(1)
+    else:
+        target_rate = _rate_at(literal(target), Financement.date_financement)
+
+    rated = select(
+        Financement.projet_id,
+        Financement.donateur_id,
+        Financement.statut,
+        Financement.devise,
+        Financement.montant,
+        source_rate.label("taux_source"),
+        target_rate.label("taux_cible")
+    )
+    if statuts is not None:
+        rated = rated.where(Financement.statut.in_(list(statuts)))
+    if donateur_id is not None:
+        rated = rated.where(Financement.donateur_id == donateur_id)
+    if projet_ids is not None:
+        rated = rated.where(Financement.projet_id.in_(list(projet_ids)))
+    rated = rated.subquery()
+
+    converted = case(
+        (rated.c.devise == target, rated.c.montant),
+        else_=rated.c.montant * rated.c.taux_source / rated.c.taux_cible
+    )
+    query = select(
+        rated.c.projet_id,
+        rated.c.donateur_id,
+        rated.c.statut,
+        rated.c.devise,
+        func.sum(converted).label("converti"),
+        func.sum(case((converted.is_(None), rated.c.montant), else_=0)).label("non_converti")
+    ).group_by(rated.c.projet_id, rated.c.donateur_id, rated.c.statut, rated.c.devise)
+
+    totals = {
+        "devise": target,
+        "total": Decimal(0),
+        "par_projet": {},
+        "par_donateur": {},
+        "par_statut": {},
+        "non_converti": {}
+    }
+    for row in db.execute(query):
+        montant = Decimal(row.converti or 0)
+        statut = FinancementStatut(row.statut).value
+        totals["total"] += montant
+        totals["par_projet"][row.projet_id] = totals["par_projet"].get(row.projet_id, Decimal(0)) + montant
+        totals["par_donateur"][row.donateur_id] = totals["par_donateur"].get(row.donateur_id, Decimal(0)) + montant
+        totals["par_statut"][statut] = totals["par_statut"].get(statut, Decimal(0)) + montant
+        if row.non_converti:
+            totals["non_converti"][row.devise] = totals["non_converti"].get(row.devise, Decimal(0)) + Decimal(row.non_converti)
+
+    return totals
@@ -0,0 +1,83 @@
+from typing import BinaryIO, Iterator, Optional, Tuple
+from zipfile import BadZipFile
+import codecs
+import csv
+
+# Columns accepted in an indicator import file (matches IndicatorCreate)
+INDICATOR_IMPORT_COLUMNS = [
+    'projet_id', 'nom', 'valeur', 'valeur_cible', 'unite',
+    'date_saisie', 'periode', 'commentaire'
+]
+
+
+class ImportFileError(ValueError):
+    """The uploaded file cannot be read in its declared format"""
+
+
+def _normalize_header(header) -> list:
+    return [str(h).strip().lower() if h is not None else '' for h in header]
+
+
+def _row_to_dict(header: list, values) -> Optional[dict]:
+    """Map a raw row to a dict of known columns, None for blank rows"""
+    row = {}
+    for column, value in zip(header, values):
+        if column not in INDICATOR_IMPORT_COLUMNS:
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+        if value == '' or value is None:
+            continue
+        row[column] = value
+    return row or None
+
+
+def iter_csv_rows(file_content: BinaryIO) -> Iterator[Tuple[int, dict]]:
+    """Stream rows of a CSV file as (line number, row dict)"""
+    file_content.seek(0)
+    reader = csv.reader(codecs.iterdecode(file_content, 'utf-8-sig'))
+    header = None
+    try:
+        for values in reader:
+            if header is None:
+                header = _normalize_header(values)
+                continue
+            row = _row_to_dict(header, values)
+            if row is not None:
+                yield reader.line_num, row
+    except (csv.Error, UnicodeDecodeError) as e:
+        raise ImportFileError(f"Invalid CSV file near line {reader.line_num + 1}: {e}")
+
+
+def iter_xlsx_rows(file_content: BinaryIO) -> Iterator[Tuple[int, dict]]:
+    """Stream rows of the first sheet of an XLSX file as (line number, row dict)"""
+    from openpyxl import load_workbook
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    file_content.seek(0)
+    try:
+        wb = load_workbook(file_content, read_only=True, data_only=True)
+    except (InvalidFileException, BadZipFile) as e:
+        raise ImportFileError(f"Invalid XLSX file: {e}")
+    try:
+        ws = wb.worksheets[0]
+        header = None
+        for line_num, values in enumerate(ws.iter_rows(values_only=True), 1):
+            if header is None:
+                header = _normalize_header(values)
+                continue
+            row = _row_to_dict(header, values)
+            if row is not None:
+                yield line_num, row
+    finally:
+        wb.close()
+
+
+def iter_indicator_rows(file_content: BinaryIO, filename: str) -> Iterator[Tuple[int, dict]]:
+    """Stream indicator rows from an uploaded CSV or XLSX file"""
+    file_extension = filename.split('.')[-1].lower() if filename and '.' in filename else ''
+    if file_extension == 'csv':
+        return iter_csv_rows(file_content)
+    if file_extension == 'xlsx':
+        return iter_xlsx_rows(file_content)
+    raise ValueError("Unsupported file type. Allowed types: csv, xlsx")
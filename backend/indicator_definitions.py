@@ -0,0 +1,86 @@
+from sqlalchemy import func, case
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import IndicatorDefinition, IndicatorLatest
+from typing import Iterable, Optional
+import re
+import unicodedata
+
+
+def definition_key(nom: str) -> str:
+    """Normalize an indicator name so spelling variants share one definition"""
+    text = unicodedata.normalize("NFKD", nom)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class UnitConflictError(ValueError):
+    """A value given in another unit than its definition's (the catalog unit is shared by all projects)"""
+
+
+def check_unit(definition: IndicatorDefinition, unite: Optional[str]):
+    if unite and definition.unite and unite.strip() != definition.unite:
+        raise UnitConflictError(f"Indicator '{definition.nom}' is measured in {definition.unite}, not {unite.strip()}")
+
+
+def get_or_create_definition(db: Session, nom: str, unite: Optional[str] = None) -> IndicatorDefinition:
+    """Resolve an indicator name to its catalog definition, creating it if needed.
+
+    A definition without a unit takes the first one given; a different unit
+    raises UnitConflictError (changing it is an admin operation on the catalog).
+    """
+    cle = definition_key(nom)
+    definition = db.query(IndicatorDefinition).filter(IndicatorDefinition.cle == cle).first()
+
+    if definition is None:
+        try:
+            with db.begin_nested():
+                definition = IndicatorDefinition(cle=cle, nom=nom.strip(), unite=unite.strip() if unite else None)
+                db.add(definition)
+        except IntegrityError:
+            # Created concurrently by another request
+            definition = db.query(IndicatorDefinition).filter(IndicatorDefinition.cle == cle).one()
+    check_unit(definition, unite)
+    if unite and not definition.unite:
+        definition.unite = unite.strip()
+
+    return definition
+
+
+def indicator_rollup(db: Session, projet_ids: Optional[Iterable[int]] = None) -> list:
+    """Aggregate the latest indicator values across projects, grouped by definition"""
+    totals = db.query(
+        IndicatorLatest.definition_id,
+        func.count(IndicatorLatest.projet_id).label("nb_projets"),
+        func.sum(IndicatorLatest.valeur).label("total_valeur"),
+        func.sum(IndicatorLatest.valeur_cible).label("total_cible"),
+        func.sum(
+            case((IndicatorLatest.valeur_cible.isnot(None), IndicatorLatest.valeur), else_=0)
+        ).label("total_realise")
+    )
+    if projet_ids is not None:
+        totals = totals.filter(IndicatorLatest.projet_id.in_(list(projet_ids)))
+    totals = totals.group_by(IndicatorLatest.definition_id).subquery()
+
+    rows = db.query(
+        IndicatorDefinition.id,
+        IndicatorDefinition.nom,
+        IndicatorDefinition.unite,
+        totals.c.nb_projets,
+        totals.c.total_valeur,
+        totals.c.total_cible,
+        totals.c.total_realise
+    ).join(totals, IndicatorDefinition.id == totals.c.definition_id).order_by(IndicatorDefinition.nom).all()
+
+    return [
+        {
+            "definition_id": row.id,
+            "nom": row.nom,
+            "unite": row.unite,
+            "nb_projets": row.nb_projets,
+            "total_valeur": row.total_valeur,
+            "total_cible": row.total_cible,
+            "progression": row.total_realise / row.total_cible if row.total_cible else None
+        }
+        for row in rows
+    ]
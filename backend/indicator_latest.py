@@ -0,0 +1,84 @@
+from sqlalchemy import select, insert, delete, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import Indicator, IndicatorLatest
+from typing import Iterable
+
+LATEST_COLUMNS = ["projet_id", "definition_id", "indicator_id", "valeur", "valeur_cible", "date_saisie"]
+
+
+def refresh_indicator_latest(db: Session, projet_id: int, definition_id: int):
+    """Recompute the latest value of one (projet_id, definition_id) indicator series"""
+    db.flush()
+
+    latest = db.query(Indicator).filter(
+        Indicator.projet_id == projet_id,
+        Indicator.definition_id == definition_id
+    ).order_by(Indicator.date_saisie.desc(), Indicator.id.desc()).first()
+
+    current = _locked_latest(db, projet_id, definition_id)
+
+    if latest is None:
+        # Last measurement of the series was deleted
+        if current:
+            db.delete(current)
+        return
+
+    if current is None:
+        # No row to lock yet: two first measurements may race to insert it
+        try:
+            with db.begin_nested():
+                current = IndicatorLatest(projet_id=projet_id, definition_id=definition_id)
+                _copy_indicator(current, latest)
+                db.add(current)
+            return
+        except IntegrityError:
+            # Inserted concurrently by another request, whose measurement this snapshot may not see
+            current = _locked_latest(db, projet_id, definition_id)
+            if (current.date_saisie, current.indicator_id) > (latest.date_saisie, latest.id):
+                return
+
+    _copy_indicator(current, latest)
+
+
+def _locked_latest(db: Session, projet_id: int, definition_id: int):
+    return db.query(IndicatorLatest).filter(
+        IndicatorLatest.projet_id == projet_id,
+        IndicatorLatest.definition_id == definition_id
+    ).with_for_update().first()
+
+
+def _copy_indicator(current: IndicatorLatest, latest: Indicator):
+    current.indicator_id = latest.id
+    current.valeur = latest.valeur
+    current.valeur_cible = latest.valeur_cible
+    current.date_saisie = latest.date_saisie
+
+
+def rebuild_indicator_latest(db: Session, projet_ids: Iterable[int]):
+    """Rebuild the latest values of every indicator of the given projects (set-based)"""
+    projet_ids = list(projet_ids)
+    if not projet_ids:
+        return
+    db.flush()
+
+    ranked = select(
+        Indicator.projet_id,
+        Indicator.definition_id,
+        Indicator.id.label("indicator_id"),
+        Indicator.valeur,
+        Indicator.valeur_cible,
+        Indicator.date_saisie,
+        func.row_number().over(
+            partition_by=(Indicator.projet_id, Indicator.definition_id),
+            order_by=(Indicator.date_saisie.desc(), Indicator.id.desc())
+        ).label("rang")
+    ).where(Indicator.projet_id.in_(projet_ids)).subquery()
+
+    db.execute(delete(IndicatorLatest).where(IndicatorLatest.projet_id.in_(projet_ids)))
+    db.execute(
+        insert(IndicatorLatest).from_select(
+            LATEST_COLUMNS,
+            select(*[ranked.c[column] for column in LATEST_COLUMNS]).where(ranked.c.rang == 1)
+        )
+    )
@@ -0,0 +1,28 @@
+"""
+Script pour charger les taux de change depuis un fichier CSV local
+Format attendu : devise,date,taux_eur (valeur en EUR d'une unité de la devise)
+"""
+from database import SessionLocal
+from config import settings
+from fx import load_fx_rates_file
+import sys
+
+
+def load_fx_rates(path: str):
+    """Charger les taux de change dans la table fx_rates"""
+    db = SessionLocal()
+    try:
+        print(f"Chargement des taux de change depuis {path}...")
+        count = load_fx_rates_file(db, path)
+        print(f"✅ {count} taux chargés avec succès!")
+        return True
+    except Exception as e:
+        print(f"❌ Erreur lors du chargement des taux: {e}")
+        return False
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    success = load_fx_rates(sys.argv[1] if len(sys.argv) > 1 else settings.fx_rates_file)
+    sys.exit(0 if success else 1)
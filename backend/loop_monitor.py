@@ -0,0 +1,78 @@
+from config import settings
+from typing import Optional
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+
+class LoopMonitor:
+    """Debug aid: measures event loop lag and logs what blocks the loop.
+
+    A coroutine ticks every interval; a watchdog thread notices when the ticks
+    stop for longer than the threshold and logs the loop thread's current
+    stack, i.e. the callback that is blocking it, while it still runs.
+    """
+
+    def __init__(self, threshold_ms: int):
+        self.threshold = threshold_ms / 1000
+        self.interval = self.threshold / 4
+        self.lag_seconds = 0.0  # Lag of the last tick
+        self.max_lag_seconds = 0.0
+        self.stalls = 0
+        self._last_tick = time.monotonic()
+        self._loop_thread_id = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    async def _tick(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.lag_seconds = max(0.0, now - expected)
+            self.max_lag_seconds = max(self.max_lag_seconds, self.lag_seconds)
+            if self.lag_seconds > self.threshold:
+                logger.warning("Event loop lagged %.0f ms", self.lag_seconds * 1000)
+            self._last_tick = now
+
+    def _watch(self):
+        reported_tick = None
+        while not self._stopped.wait(self.interval):
+            last_tick = self._last_tick
+            blocked_for = time.monotonic() - last_tick - self.interval
+            if blocked_for <= self.threshold or last_tick == reported_tick:
+                continue
+            # One report per stall, taken while the blocking code is still on the stack
+            reported_tick = last_tick
+            self.stalls += 1
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "(unavailable)\n"
+            logger.warning("Event loop blocked for more than %.0f ms in:\n%s", blocked_for * 1000, stack)
+
+    def start(self):
+        """Start monitoring the running event loop"""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._tick(), name="loop_monitor")
+        self._watchdog = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopped.set()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+
+loop_monitor = LoopMonitor(settings.loop_stall_threshold_ms)
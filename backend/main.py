@@ -1,17 +1,28 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
+from fastapi.responses import JSONResponse, Response
 from config import settings
-from database import engine, Base
-from middleware import SecurityHeadersMiddleware
+from database import replica_engine, async_engine, async_replica_engine
+from migrations import check_schema_revision
+from middleware import (
+    SecurityHeadersMiddleware, RateLimitMiddleware, ReadYourWritesMiddleware, QueryStatsMiddleware, MetricsMiddleware
+)
+from metrics import render_metrics, mark_process_dead
 from rate_limit import limiter
+from previews import shutdown_executor as shutdown_preview_executor
+from workers import start_workers, stop_workers
+from slow_queries import slow_query_log
+from loop_monitor import loop_monitor
+from auth_sessions import get_auth_session_store
+from cache_invalidation import cache_invalidator
+import hmac
+import logging
 import uvicorn
 
 # Import routes
-from routes import auth, users, projects, indicators, financements, documents, stats, audit_logs
+from routes import auth, users, projects, indicators, financements, documents, stats, audit_logs, me
+
+logger = logging.getLogger(__name__)
 
 # Create FastAPI app
 app = FastAPI(
@@ -22,9 +33,16 @@ app = FastAPI(
     redoc_url="/api/redoc"
 )
 
-# Add rate limiter
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+# Rate limits (innermost, so 429 responses still get CORS and security headers)
+app.add_middleware(RateLimitMiddleware)
+
+# SQL query count and time per request (Server-Timing), N+1 warnings, route of slow queries
+if settings.query_stats_enabled or settings.slow_query_threshold_ms > 0:
+    app.add_middleware(QueryStatsMiddleware)
+
+# Reads follow the client's own writes to the primary while the replica may lag
+if replica_engine is not None:
+    app.add_middleware(ReadYourWritesMiddleware)
 
 # CORS middleware
 app.add_middleware(
@@ -38,6 +56,10 @@ app.add_middleware(
 # Security headers middleware
 app.add_middleware(SecurityHeadersMiddleware)
 
+# Prometheus metrics (outermost, so latencies include every other middleware)
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
 # Error handlers
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -47,7 +69,11 @@ async def global_exception_handler(request: Request, exc: Exception):
     )
 
 
-# Include routers
+# Include routers (async read routes first, so they take precedence over their sync twins)
+if settings.async_db_enabled:
+    for module in (projects, indicators, financements, stats):
+        app.include_router(module.async_router, prefix=settings.api_v1_prefix)
+
 app.include_router(auth.router, prefix=settings.api_v1_prefix)
 app.include_router(users.router, prefix=settings.api_v1_prefix)
 app.include_router(projects.router, prefix=settings.api_v1_prefix)
@@ -56,6 +82,7 @@ app.include_router(financements.router, prefix=settings.api_v1_prefix)
 app.include_router(documents.router, prefix=settings.api_v1_prefix)
 app.include_router(stats.router, prefix=settings.api_v1_prefix)
 app.include_router(audit_logs.router, prefix=settings.api_v1_prefix)
+app.include_router(me.router, prefix=settings.api_v1_prefix)
 
 
 @app.get("/")
@@ -72,12 +99,44 @@ async def health():
     return {"status": "healthy"}
 
 
-# Create database tables on startup (in production, use migrations)
+if settings.metrics_enabled:
+    if not settings.metrics_token:
+        logger.warning("/metrics is enabled without METRICS_TOKEN: keep it unreachable from outside the internal network")
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics(request: Request):
+        if settings.metrics_token and not hmac.compare_digest(
+            request.headers.get("authorization", "").encode(), f"Bearer {settings.metrics_token}".encode()
+        ):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+        content, content_type = render_metrics()
+        return Response(content, headers={"Content-Type": content_type})
+
+
+# The schema is managed by Alembic (`alembic upgrade head`); startup only checks its revision
 @app.on_event("startup")
 async def startup_event():
-    # Create tables if they don't exist
-    Base.metadata.create_all(bind=engine)
-    print("Database tables created/verified")
+    check_schema_revision()
+    if settings.loop_monitor_enabled:
+        loop_monitor.start()
+    start_workers()
+    get_auth_session_store().start()
+    cache_invalidator.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await stop_workers()
+    await loop_monitor.stop()
+    get_auth_session_store().stop()
+    cache_invalidator.stop()
+    await limiter.close()
+    for async_db_engine in (async_engine, async_replica_engine):
+        if async_db_engine is not None:
+            await async_db_engine.dispose()
+    shutdown_preview_executor()
+    slow_query_log.shutdown()
+    mark_process_dead()
 
 
 if __name__ == "__main__":
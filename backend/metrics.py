@@ -0,0 +1,117 @@
+"""Prometheus metrics.
+
+With several worker processes, set PROMETHEUS_MULTIPROC_DIR to an empty
+directory shared by the workers (cleared before the server starts): every
+worker writes its samples there and /metrics aggregates them.
+"""
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, REGISTRY, generate_latest, multiprocess
+)
+from prometheus_client.core import GaugeMetricFamily
+from config import settings
+from typing import Iterator
+import os
+import time
+
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests being served", multiprocess_mode="livesum"
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections", "Connections checked out of the pool", ["engine"], multiprocess_mode="livesum"
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow_connections", "Connections open beyond the pool size", ["engine"], multiprocess_mode="livesum"
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds", "Time spent waiting for a pooled connection", ["engine"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+)
+BCRYPT_QUEUE_DEPTH = Gauge(
+    "bcrypt_queue_depth", "Password hashes waiting for a bcrypt worker", multiprocess_mode="livesum"
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total", "In-process cache lookups (hit ratio: result=\"hit\" over all)", ["cache", "result"]
+)
+EXPORT_DURATION = Histogram(
+    "export_duration_seconds", "Time to generate an export", ["format"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+)
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def iter_timed_export(export_format: str, chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Pass a streamed export through, recording its duration once fully sent"""
+    started = time.perf_counter()
+    yield from chunks
+    EXPORT_DURATION.labels(export_format).observe(time.perf_counter() - started)
+
+
+def update_runtime_gauges():
+    """Sample this process's pools and bcrypt queue (gauges are summed across workers)"""
+    from database import engine, replica_engine, async_engine, async_replica_engine
+    from security import password_hasher
+
+    engines = {"primary": engine, "replica": replica_engine}
+    engines["async_primary"] = async_engine.sync_engine if async_engine is not None else None
+    engines["async_replica"] = async_replica_engine.sync_engine if async_replica_engine is not None else None
+    for name, db_engine in engines.items():
+        pool = db_engine.pool if db_engine is not None else None
+        if pool is not None and hasattr(pool, "checkedout"):
+            DB_POOL_CHECKED_OUT.labels(name).set(pool.checkedout())
+            DB_POOL_OVERFLOW.labels(name).set(max(pool.overflow(), 0))
+    BCRYPT_QUEUE_DEPTH.set(password_hasher.queue_depth)
+
+
+class QueueSizeCollector:
+    """Pending rows of the database-backed queues, counted at most once per METRICS_QUEUE_SIZE_TTL_SECONDS"""
+
+    _sizes: dict = {}
+    _counted_at = float("-inf")
+
+    def collect(self):
+        from database import SessionLocal
+        from models import StorageDeletion, EmailOutbox, EmailStatut
+
+        sizes = QueueSizeCollector._sizes
+        if time.monotonic() - QueueSizeCollector._counted_at >= settings.metrics_queue_size_ttl_seconds:
+            db = SessionLocal()
+            try:
+                sizes = {
+                    "storage_deletions": db.query(StorageDeletion).count(),
+                    "email_outbox": db.query(EmailOutbox).filter(EmailOutbox.statut == EmailStatut.EN_ATTENTE).count(),
+                }
+            finally:
+                db.close()
+            QueueSizeCollector._sizes, QueueSizeCollector._counted_at = sizes, time.monotonic()
+        family = GaugeMetricFamily("queue_size", "Items waiting in a background queue", labels=["queue"])
+        for queue, size in sizes.items():
+            family.add_metric([queue], size)
+        yield family
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Exposition of all workers' metrics plus the queue sizes"""
+    update_runtime_gauges()
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    queues = CollectorRegistry()
+    queues.register(QueueSizeCollector())
+    return generate_latest(registry) + generate_latest(queues), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead():
+    """Drop this worker's live gauges when it exits"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
@@ -1,14 +1,15 @@
 from fastapi import Request, HTTPException, status
 from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
+from starlette.responses import Response, JSONResponse
 from config import settings
+from database import PRIMARY_COOKIE, READ_METHODS
+from metrics import REQUEST_LATENCY, REQUESTS_IN_FLIGHT, update_runtime_gauges
+from query_stats import QueryStats, current_query_stats
+import logging
+from rate_limit import limiter, classify_request, rate_limit_key, retry_after_header, RATE_LIMITS
 import time
 
-# Rate limiter
-limiter = Limiter(key_func=get_remote_address)
+logger = logging.getLogger(__name__)
 
 
 class SecurityHeadersMiddleware(BaseHTTPMiddleware):
@@ -23,3 +24,88 @@ class SecurityHeadersMiddleware(BaseHTTPMiddleware):
         response.headers["Content-Security-Policy"] = "default-src 'self'"
         return response
 
+
+class RateLimitMiddleware(BaseHTTPMiddleware):
+    """Apply the login, password reset, write and export rate limits before routing"""
+
+    async def dispatch(self, request: Request, call_next):
+        route_class = classify_request(request) if settings.rate_limit_enabled else None
+        if route_class is None:
+            return await call_next(request)
+
+        limit = RATE_LIMITS[route_class]
+        allowed, tokens, retry_after = await limiter.hit(rate_limit_key(request, route_class), limit)
+        if not allowed:
+            return JSONResponse(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                content={"detail": "Trop de requêtes, réessayez plus tard"},
+                headers={
+                    "Retry-After": retry_after_header(retry_after),
+                    "X-RateLimit-Limit": str(limit.capacity),
+                    "X-RateLimit-Remaining": "0"
+                }
+            )
+
+        response = await call_next(request)
+        response.headers["X-RateLimit-Limit"] = str(limit.capacity)
+        response.headers["X-RateLimit-Remaining"] = str(int(tokens))
+        return response
+
+
+class ReadYourWritesMiddleware(BaseHTTPMiddleware):
+    """After a successful write, pin the client's reads to the primary for the replica lag tolerance"""
+
+    async def dispatch(self, request: Request, call_next):
+        response = await call_next(request)
+        if request.method not in READ_METHODS and request.method != "OPTIONS" and response.status_code < 400:
+            response.set_cookie(
+                PRIMARY_COOKIE, "1", max_age=settings.replica_max_lag_seconds + 1, httponly=True, samesite="lax"
+            )
+        return response
+
+
+class QueryStatsMiddleware(BaseHTTPMiddleware):
+    """Count the SQL queries of each request, report them in Server-Timing and warn about N+1 patterns"""
+
+    async def dispatch(self, request: Request, call_next):
+        stats = QueryStats(request.scope)
+        token = current_query_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            current_query_stats.reset(token)
+        if not settings.query_stats_enabled:
+            return response  # Installed for the slow-query log's route only
+
+        response.headers["Server-Timing"] = (
+            f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries", '
+            f"app;dur={(time.perf_counter() - started) * 1000:.1f}"
+        )
+        for statement, count in stats.n_plus_one_suspects(settings.n_plus_one_threshold):
+            logger.warning(
+                "N+1 suspect on %s %s: statement executed %d times: %s",
+                request.method, request.url.path, count, " ".join(statement.split())[:300]
+            )
+        return response
+
+
+class MetricsMiddleware(BaseHTTPMiddleware):
+    """Request latency by route template and status, requests in flight"""
+
+    async def dispatch(self, request: Request, call_next):
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            # The router stores the matched route in the shared scope; templates keep the label cardinality bounded
+            route = request.scope.get("route")
+            REQUEST_LATENCY.labels(
+                request.method, getattr(route, "path", "unmatched"), str(status_code)
+            ).observe(time.perf_counter() - started)
+            update_runtime_gauges()
@@ -0,0 +1,49 @@
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from config import settings
+from database import engine
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def script_directory() -> ScriptDirectory:
+    """The migrations shipped with this code, whatever the working directory"""
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "alembic"))
+    return ScriptDirectory.from_config(config)
+
+
+def expected_revisions() -> set:
+    return set(script_directory().get_heads())
+
+
+def current_revisions() -> set:
+    """Revisions recorded in the database's alembic_version table"""
+    with engine.connect() as connection:
+        return set(MigrationContext.configure(connection).get_current_heads())
+
+
+def check_schema_revision():
+    """Refuse to serve (or warn, per SCHEMA_REVISION_CHECK) when the database is not at the migrations' head.
+
+    Replaces create_all on boot: one query instead of reflecting every
+    table, and schema changes go through `alembic upgrade head` only.
+    """
+    if settings.schema_revision_check == "off":
+        return
+    expected, current = expected_revisions(), current_revisions()
+    if current == expected:
+        return
+    message = (
+        f"Database schema at revision {', '.join(sorted(current)) or '(none)'}, "
+        f"code expects {', '.join(sorted(expected))}: run `alembic upgrade head`"
+    )
+    if settings.schema_revision_check == "warn":
+        logger.warning(message)
+    else:
+        raise RuntimeError(message)
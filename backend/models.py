@@ -1,10 +1,14 @@
-from sqlalchemy import Column, Integer, String, Text, Numeric, Date, Boolean, DateTime, ForeignKey, BigInteger, Enum as SQLEnum, JSON, LargeBinary
+from sqlalchemy import Column, Integer, String, Text, Numeric, Date, Boolean, DateTime, ForeignKey, BigInteger, Enum as SQLEnum, JSON, LargeBinary, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.mysql import LONGBLOB, JSON as MySQLJSON
 from sqlalchemy.sql import func
 from datetime import datetime
 import enum
 from database import Base
+from config import settings
+
+# Test mode: lazy loads raise, so N+1 regressions fail instead of quietly adding queries
+LAZY = "raise" if settings.raise_on_lazy_load else "select"
 
 
 class UserRole(str, enum.Enum):
@@ -34,6 +38,12 @@ class FinancementStatut(str, enum.Enum):
     UTILISE = "utilise"
 
 
+class EmailStatut(str, enum.Enum):
+    EN_ATTENTE = "en_attente"
+    ENVOYE = "envoye"
+    ECHEC = "echec"
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -55,13 +65,13 @@ class User(Base):
     date_modification = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
 
     # Relationships
-    projects_as_chef = relationship("Project", foreign_keys="Project.chef_projet_id", back_populates="chef_projet")
-    projects_created = relationship("Project", foreign_keys="Project.cree_par", back_populates="createur")
-    indicators_created = relationship("Indicator", back_populates="saisi_par_user")
-    financements = relationship("Financement", back_populates="donateur")
-    documents_uploaded = relationship("Document", back_populates="uploade_par_user")
-    password_history = relationship("PasswordHistory", back_populates="user", cascade="all, delete-orphan")
-    audit_logs = relationship("AuditLog", back_populates="user")
+    projects_as_chef = relationship("Project", foreign_keys="Project.chef_projet_id", back_populates="chef_projet", lazy=LAZY)
+    projects_created = relationship("Project", foreign_keys="Project.cree_par", back_populates="createur", lazy=LAZY)
+    indicators_created = relationship("Indicator", back_populates="saisi_par_user", lazy=LAZY)
+    financements = relationship("Financement", back_populates="donateur", lazy=LAZY)
+    documents_uploaded = relationship("Document", back_populates="uploade_par_user", lazy=LAZY)
+    password_history = relationship("PasswordHistory", back_populates="user", cascade="all, delete-orphan", lazy=LAZY)
+    audit_logs = relationship("AuditLog", back_populates="user", lazy=LAZY)
 
 
 class PasswordHistory(Base):
@@ -72,7 +82,7 @@ class PasswordHistory(Base):
     password_hash = Column(Text, nullable=False)
     created_at = Column(DateTime, nullable=False, server_default=func.now())
 
-    user = relationship("User", back_populates="password_history")
+    user = relationship("User", back_populates="password_history", lazy=LAZY)
 
 
 class Project(Base):
@@ -97,11 +107,25 @@ class Project(Base):
     cree_par = Column(Integer, ForeignKey("users.id"))
 
     # Relationships
-    chef_projet = relationship("User", foreign_keys=[chef_projet_id], back_populates="projects_as_chef")
-    createur = relationship("User", foreign_keys=[cree_par], back_populates="projects_created")
-    indicators = relationship("Indicator", back_populates="projet", cascade="all, delete-orphan")
-    financements = relationship("Financement", back_populates="projet", cascade="all, delete-orphan")
-    documents = relationship("Document", back_populates="projet", cascade="all, delete-orphan")
+    chef_projet = relationship("User", foreign_keys=[chef_projet_id], back_populates="projects_as_chef", lazy=LAZY)
+    createur = relationship("User", foreign_keys=[cree_par], back_populates="projects_created", lazy=LAZY)
+    indicators = relationship("Indicator", back_populates="projet", cascade="all, delete-orphan", lazy=LAZY)
+    financements = relationship("Financement", back_populates="projet", cascade="all, delete-orphan", lazy=LAZY)
+    documents = relationship("Document", back_populates="projet", cascade="all, delete-orphan", lazy=LAZY)
+
+
+class IndicatorDefinition(Base):
+    """Catalog of indicator names shared by all measurements"""
+    __tablename__ = "indicator_definitions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cle = Column(String(255), unique=True, nullable=False)  # Normalized name used for deduplication
+    nom = Column(String(255), nullable=False)
+    unite = Column(String(50))
+    date_creation = Column(DateTime, nullable=False, server_default=func.now())
+
+    # Relationships
+    indicators = relationship("Indicator", back_populates="definition", lazy=LAZY)
 
 
 class Indicator(Base):
@@ -109,10 +133,9 @@ class Indicator(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     projet_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False, index=True)
-    nom = Column(String(255), nullable=False, index=True)
+    definition_id = Column(Integer, ForeignKey("indicator_definitions.id"), nullable=False, index=True)
     valeur = Column(Numeric(14, 4), nullable=False)
     valeur_cible = Column(Numeric(14, 4))
-    unite = Column(Text)
     date_saisie = Column(Date, nullable=False, index=True)
     periode = Column(Text)
     commentaire = Column(Text)
@@ -121,8 +144,45 @@ class Indicator(Base):
     date_modification = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
 
     # Relationships
-    projet = relationship("Project", back_populates="indicators")
-    saisi_par_user = relationship("User", back_populates="indicators_created")
+    projet = relationship("Project", back_populates="indicators", lazy=LAZY)
+    saisi_par_user = relationship("User", back_populates="indicators_created", lazy=LAZY)
+    definition = relationship("IndicatorDefinition", back_populates="indicators", lazy="joined")
+
+    __table_args__ = (
+        Index("ix_indicators_projet_definition_date", "projet_id", "definition_id", "date_saisie"),
+    )
+
+    @property
+    def nom(self) -> str:
+        return self.definition.nom
+
+    @property
+    def unite(self):
+        return self.definition.unite
+
+
+class IndicatorLatest(Base):
+    """Latest value of each indicator per project (maintained on write)"""
+    __tablename__ = "indicator_latest"
+
+    projet_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    definition_id = Column(Integer, ForeignKey("indicator_definitions.id"), primary_key=True)
+    indicator_id = Column(Integer, ForeignKey("indicators.id", ondelete="CASCADE"), nullable=False)
+    valeur = Column(Numeric(14, 4), nullable=False)
+    valeur_cible = Column(Numeric(14, 4))
+    date_saisie = Column(Date, nullable=False)
+    date_modification = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
+
+    # Relationships
+    definition = relationship("IndicatorDefinition", lazy="joined")
+
+    @property
+    def nom(self) -> str:
+        return self.definition.nom
+
+    @property
+    def unite(self):
+        return self.definition.unite
 
 
 class Financement(Base):
@@ -132,7 +192,7 @@ class Financement(Base):
     projet_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False, index=True)
     donateur_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     montant = Column(Numeric(14, 2), nullable=False)
-    devise = Column(Text, nullable=False, default="EUR")
+    devise = Column(String(10), nullable=False, default="EUR")  # ISO 4217 code, upper case
     date_financement = Column(Date, nullable=False)
     statut = Column(SQLEnum(FinancementStatut), nullable=False, default=FinancementStatut.PROMIS)
     commentaire = Column(Text)
@@ -140,8 +200,74 @@ class Financement(Base):
     date_modification = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
 
     # Relationships
-    projet = relationship("Project", back_populates="financements")
-    donateur = relationship("User", back_populates="financements")
+    projet = relationship("Project", back_populates="financements", lazy=LAZY)
+    donateur = relationship("User", back_populates="financements", lazy=LAZY)
+
+    __table_args__ = (
+        Index("ix_financements_devise_date", "devise", "date_financement"),
+    )
+
+
+class FxRate(Base):
+    """Exchange rate of a currency against EUR, effective from date_debut until the next rate"""
+    __tablename__ = "fx_rates"
+
+    id = Column(Integer, primary_key=True, index=True)
+    devise = Column(String(10), nullable=False)
+    date_debut = Column(Date, nullable=False)
+    taux_eur = Column(Numeric(18, 8), nullable=False)  # Value in EUR of one unit of devise
+
+    __table_args__ = (
+        UniqueConstraint("devise", "date_debut", name="uq_fx_rates_devise_date"),
+        Index("ix_fx_rates_lookup", "devise", "date_debut", "taux_eur"),
+    )
+
+
+class StoredObject(Base):
+    """File content stored once under its SHA-256, shared by every document with the same bytes"""
+    __tablename__ = "stored_objects"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), unique=True, nullable=False)
+    url_stockage = Column(Text, nullable=False)
+    taille = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    url_miniature = Column(Text)  # Thumbnail, NULL until rendered
+    url_apercu = Column(Text)  # First-page preview of a PDF or recompressed large image
+    date_creation = Column(DateTime, nullable=False, server_default=func.now())
+
+    documents = relationship("Document", back_populates="objet", lazy=LAZY)
+
+
+class StorageDeletion(Base):
+    """Stored file waiting to be deleted by the background worker"""
+    __tablename__ = "storage_deletions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    url_stockage = Column(Text, nullable=False)
+    sha256 = Column(String(64), index=True)  # Content-addressed objects: cancelled if the content is uploaded again
+    tentatives = Column(Integer, nullable=False, default=0)
+    prochain_essai = Column(DateTime, nullable=False, server_default=func.now(), index=True)
+    derniere_erreur = Column(Text)
+    date_creation = Column(DateTime, nullable=False, server_default=func.now())
+
+
+class UploadSession(Base):
+    """Resumable upload in progress; chunks are appended to a temporary file"""
+    __tablename__ = "upload_sessions"
+
+    id = Column(String(36), primary_key=True)
+    projet_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    nom_fichier = Column(String(255), nullable=False)
+    description = Column(Text)
+    taille = Column(BigInteger, nullable=False)  # Declared size
+    recu = Column(BigInteger, nullable=False, default=0)  # Bytes received so far (next offset)
+    chemin_temp = Column(Text, nullable=False)
+    date_creation = Column(DateTime, nullable=False, server_default=func.now())
+    date_expiration = Column(DateTime, nullable=False, index=True)
+    ecriture_jeton = Column(String(32))  # Lease of the request writing a chunk or finalizing
+    ecriture_jusqu_a = Column(DateTime)
 
 
 class Document(Base):
@@ -153,13 +279,47 @@ class Document(Base):
     type_fichier = Column(String(50), nullable=False)
     taille = Column(Integer, nullable=False)
     url_stockage = Column(Text, nullable=False)
+    objet_id = Column(Integer, ForeignKey("stored_objects.id"), index=True)  # NULL for uploads made before deduplication
     description = Column(Text)
     uploade_par = Column(Integer, ForeignKey("users.id"), nullable=False)
     date_upload = Column(DateTime, nullable=False, server_default=func.now())
 
     # Relationships
-    projet = relationship("Project", back_populates="documents")
-    uploade_par_user = relationship("User", back_populates="documents_uploaded")
+    projet = relationship("Project", back_populates="documents", lazy=LAZY)
+    objet = relationship("StoredObject", back_populates="documents", lazy=LAZY)
+    uploade_par_user = relationship("User", back_populates="documents_uploaded", lazy=LAZY)
+
+
+class AuthToken(Base):
+    """Single-use token (password reset), stored as its SHA-256 hash"""
+    __tablename__ = "auth_tokens"
+
+    token_hash = Column(String(64), primary_key=True)
+    usage = Column(String(50), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    expire_le = Column(DateTime, nullable=False, index=True)
+    date_creation = Column(DateTime, nullable=False, server_default=func.now())
+
+
+class EmailOutbox(Base):
+    """Email waiting to be sent (or sent) by the background sender"""
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    destinataire = Column(String(255), nullable=False)
+    template = Column(String(100), nullable=False)
+    contexte = Column(JSON)  # Template variables, cleared once sent
+    statut = Column(SQLEnum(EmailStatut), nullable=False, default=EmailStatut.EN_ATTENTE)
+    tentatives = Column(Integer, nullable=False, default=0)
+    prochain_essai = Column(DateTime, nullable=False, server_default=func.now())
+    derniere_erreur = Column(Text)
+    date_creation = Column(DateTime, nullable=False, server_default=func.now())
+    date_envoi = Column(DateTime)
+    expire_le = Column(DateTime)  # Not sent (and context erased) past this date: the context holds a secret
+
+    __table_args__ = (
+        Index("ix_email_outbox_pending", "statut", "prochain_essai"),
+    )
 
 
 class AuditLog(Base):
@@ -176,7 +336,7 @@ class AuditLog(Base):
     created_at = Column(DateTime, nullable=False, server_default=func.now(), index=True)
 
     # Relationships
-    user = relationship("User", back_populates="audit_logs")
+    user = relationship("User", back_populates="audit_logs", lazy=LAZY)
 
 
 class SatisfactionSurvey(Base):
@@ -0,0 +1,69 @@
+from sqlalchemy.orm import Session
+from models import Project, IndicatorLatest, FinancementStatut
+from config import settings
+from schemas import IndicatorLatestResponse
+from cache import TTLCache
+from cache_invalidation import cache_invalidator
+from fx import financement_totals, BASE_CURRENCY
+from decimal import Decimal
+
+# Portfolio summaries per donor, invalidated in every worker on that donor's financement writes
+portfolio_cache = TTLCache(settings.portfolio_cache_ttl_seconds, name="portfolio")
+cache_invalidator.register("portfolio", portfolio_cache, int)
+
+RECEIVED_STATUTS = [FinancementStatut.RECU, FinancementStatut.UTILISE]
+
+
+def invalidate_portfolio(donateur_id: int):
+    cache_invalidator.invalidate("portfolio", donateur_id)
+
+
+def compute_portfolio(db: Session, donateur_id: int) -> dict:
+    """Build a donor's portfolio with a fixed number of aggregate queries"""
+    # 1. Donor's financements by status and by project
+    donor_totals = financement_totals(db, BASE_CURRENCY, donateur_id=donateur_id)
+    projet_ids = list(donor_totals["par_projet"])
+
+    projects = []
+    if projet_ids:
+        # 2. Funded projects
+        rows = db.query(Project.id, Project.titre, Project.statut, Project.budget).filter(
+            Project.id.in_(projet_ids)
+        ).order_by(Project.id).all()
+
+        # 3. Amount received by each project from all donors
+        received = financement_totals(db, BASE_CURRENCY, statuts=RECEIVED_STATUTS, projet_ids=projet_ids)["par_projet"]
+
+        # 4. Latest indicator values of those projects
+        indicators = {}
+        for latest in db.query(IndicatorLatest).filter(IndicatorLatest.projet_id.in_(projet_ids)):
+            indicators.setdefault(latest.projet_id, []).append(IndicatorLatestResponse.model_validate(latest))
+
+        for row in rows:
+            montant_recu = received.get(row.id, Decimal(0))
+            projects.append({
+                "projet_id": row.id,
+                "titre": row.titre,
+                "statut": row.statut,
+                "budget": row.budget,
+                "montant_donateur": donor_totals["par_projet"].get(row.id, Decimal(0)),
+                "montant_recu": montant_recu,
+                "taux_couverture": montant_recu / row.budget if row.budget else None,
+                "indicateurs": indicators.get(row.id, [])
+            })
+
+    return {
+        "devise": BASE_CURRENCY,
+        "total": donor_totals["total"],
+        "par_statut": donor_totals["par_statut"],
+        "non_converti": donor_totals["non_converti"],
+        "projets": projects
+    }
+
+
+def get_portfolio(db: Session, donateur_id: int) -> dict:
+    portfolio = portfolio_cache.get(donateur_id)
+    if portfolio is None:
+        portfolio = compute_portfolio(db, donateur_id)
+        portfolio_cache.set(donateur_id, portfolio)
+    return portfolio
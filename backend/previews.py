@@ -0,0 +1,137 @@
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from config import settings
+from database import SessionLocal
+from models import StoredObject
+from storage import storage_for_url
+from storage_deletions import enqueue_deletion
+from typing import Optional, TYPE_CHECKING
+import logging
+import os
+import tempfile
+import threading
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+IMAGE_TYPES = {'png', 'jpg', 'jpeg'}
+PREVIEW_TYPES = IMAGE_TYPES | {'pdf'}
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _to_jpeg(image: "Image.Image", max_size: int) -> bytes:
+    from PIL import Image
+
+    image.thumbnail((max_size, max_size))
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    output = BytesIO()
+    image.save(output, 'JPEG', quality=settings.document_preview_quality, optimize=True)
+    return output.getvalue()
+
+
+def render_derivatives(path: str, type_fichier: str) -> dict:
+    """Render the thumbnail and preview of a file as JPEG bytes (runs in a worker process)"""
+    # Imaging libraries load in the preview workers on first use, not in every API worker
+    from PIL import Image, ImageOps
+
+    if type_fichier in IMAGE_TYPES:
+        derivatives = {}
+        with Image.open(path) as image:
+            image = ImageOps.exif_transpose(image)
+            derivatives['thumbnail'] = _to_jpeg(image.copy(), settings.document_thumbnail_size)
+            recompress_bytes = settings.document_recompress_min_kb * 1024
+            if recompress_bytes and os.path.getsize(path) > recompress_bytes:
+                derivatives['preview'] = _to_jpeg(image, settings.document_preview_size)
+        return derivatives
+
+    if type_fichier == 'pdf':
+        try:
+            import pymupdf  # Optional: without it PDFs get no preview
+        except ImportError:
+            return {}
+        with pymupdf.open(path) as pdf:
+            if pdf.page_count == 0:
+                return {}
+            page = pdf[0]
+            zoom = settings.document_preview_size / max(page.rect.width, page.rect.height)
+            pixmap = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), alpha=False)
+            image = Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+        return {
+            'preview': _to_jpeg(image.copy(), settings.document_preview_size),
+            'thumbnail': _to_jpeg(image, settings.document_thumbnail_size)
+        }
+
+    return {}
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=settings.document_preview_workers)
+        return _executor
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def generate_previews(objet_id: int, type_fichier: str):
+    """Background task: render a stored object's derivatives and store them beside it"""
+    type_fichier = type_fichier.lower()
+    if type_fichier not in PREVIEW_TYPES:
+        return
+
+    db = SessionLocal()
+    try:
+        stored = db.query(StoredObject).filter(StoredObject.id == objet_id).first()
+        if stored is None or stored.url_miniature:
+            return
+        storage, key = storage_for_url(stored.url_stockage)
+
+        with tempfile.NamedTemporaryFile(suffix=f".{type_fichier}") as source:
+            storage.download(key, source)
+            source.flush()
+            derivatives = get_executor().submit(render_derivatives, source.name, type_fichier).result()
+        if not derivatives:
+            return
+
+        # objects/ab/<sha>.pdf -> objects/ab/<sha>.thumbnail.jpg
+        base_key = key.rsplit('.', 1)[0] if '.' in key.rsplit('/', 1)[-1] else key
+        urls = {}
+        for name, data in derivatives.items():
+            derivative_key = f"{base_key}.{name}.jpg"
+            storage.upload(BytesIO(data), derivative_key, 'image/jpeg')
+            urls[name] = storage.url_for(derivative_key)
+
+        # The object may have lost its last reference meanwhile
+        sha256 = stored.sha256
+        stored = db.query(StoredObject).filter(StoredObject.id == objet_id).with_for_update().first()
+        if stored is None:
+            # Same keys are reused if the content was uploaded again meanwhile
+            if not db.query(StoredObject).filter(StoredObject.sha256 == sha256).first():
+                for url in urls.values():
+                    enqueue_deletion(db, url, sha256)
+                db.commit()
+            return
+        stored.url_miniature = urls.get('thumbnail')
+        stored.url_apercu = urls.get('preview')
+        db.commit()
+    except Exception:
+        logger.exception("Preview generation failed for stored object %s", objet_id)
+    finally:
+        db.close()
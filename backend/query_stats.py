@@ -0,0 +1,57 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from contextvars import ContextVar
+from collections import Counter
+from typing import Optional
+from slow_queries import slow_query_log
+import time
+
+
+class QueryStats:
+    """SQL statements executed while serving one request"""
+
+    def __init__(self, scope: Optional[dict] = None):
+        self.scope = scope  # ASGI scope of the request, for the route
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def record(self, statement: str, duration: float):
+        self.count += 1
+        self.duration += duration
+        self.statements[statement] += 1
+
+    @property
+    def route(self) -> Optional[str]:
+        """Method and route template once the request is routed, raw path before"""
+        if self.scope is None:
+            return None
+        route = self.scope.get("route")
+        return f'{self.scope["method"]} {getattr(route, "path", self.scope["path"])}'
+
+    def n_plus_one_suspects(self, threshold: int) -> list:
+        """Statements repeated at least threshold times (same SQL, usually different parameters)"""
+        return [(statement, count) for statement, count in self.statements.most_common() if count >= threshold]
+
+
+# Set by the request middleware; threadpool routes and AsyncSession.run_sync inherit it
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is None or not hasattr(context, "_query_started"):
+        return
+    duration = time.perf_counter() - context._query_started
+    stats = current_query_stats.get()
+    if stats is not None:
+        stats.record(statement, duration)
+    if slow_query_log.enabled and duration >= slow_query_log.threshold:
+        route = stats.route if stats is not None else None
+        slow_query_log.record(conn, statement, parameters, executemany, duration, route)
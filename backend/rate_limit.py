@@ -1,28 +1,206 @@
-from slowapi import Limiter
-from slowapi.util import get_remote_address
-from functools import wraps
-from fastapi import Request
+from fastapi import HTTPException, Request, Response, status
 from config import settings
-import redis
+from schemas import RefreshTokenRequest
+from security import verify_token
+from collections import OrderedDict
 from typing import Optional
+import logging
+import math
+import time
+import redis
+import redis.asyncio as aioredis
+
+logger = logging.getLogger(__name__)
+
+# Token bucket, refilled continuously; read, refill, take and write in one atomic call.
+# Time comes from the Redis server so workers with skewed clocks share one bucket.
+_TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate))
+return {allowed, tostring(tokens), tostring(retry_after)}
+"""
+
+LOGIN, PASSWORD_RESET, REFRESH, WRITE, EXPORT = "login", "password_reset", "refresh", "write", "export"
+
+# Unauthenticated endpoints that guess or spend credentials, one bucket each so
+# password resets do not use up login attempts
+CREDENTIAL_PATHS = {
+    "/auth/login": LOGIN,
+    "/auth/forgot-password": PASSWORD_RESET,
+    "/auth/reset-password": PASSWORD_RESET,
+}
+# Limited per refresh-token family by the route (limit_refresh), not per address:
+# clients behind one NAT must not share a bucket
+REFRESH_PATH = "/auth/refresh"
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
 
-# Initialize Redis for rate limiting
-redis_client: Optional[redis.Redis] = None
+class RateLimit:
+    """A bucket of `capacity` requests refilled evenly over `period_seconds`"""
 
-try:
-    if settings.redis_url:
-        redis_client = redis.from_url(settings.redis_url, decode_responses=True)
-except Exception:
-    redis_client = None
+    def __init__(self, capacity: int, period_seconds: int):
+        self.capacity = max(capacity, 1)
+        self.rate = self.capacity / max(period_seconds, 1)
 
-# Fallback to in-memory limiter if Redis is not available
-limiter = Limiter(key_func=get_remote_address, storage_uri=settings.redis_url if redis_client else "memory://")
 
+RATE_LIMITS = {
+    LOGIN: RateLimit(settings.rate_limit_login_attempts, settings.rate_limit_login_window_minutes * 60),
+    PASSWORD_RESET: RateLimit(
+        settings.rate_limit_password_reset_attempts, settings.rate_limit_password_reset_window_minutes * 60
+    ),
+    REFRESH: RateLimit(settings.rate_limit_refreshes_per_minute, 60),
+    WRITE: RateLimit(settings.rate_limit_writes_per_minute, 60),
+    EXPORT: RateLimit(settings.rate_limit_exports_per_hour, 3600),
+}
 
-def get_user_id_from_request(request: Request) -> str:
-    """Get user ID from request for user-based rate limiting"""
-    # Try to get user from request state (set by auth middleware)
+
+def classify_request(request: Request) -> Optional[str]:
+    """Route class of a request, or None when it is not limited"""
+    path = request.url.path
+    if not path.startswith(settings.api_v1_prefix):
+        return None
+    path = path[len(settings.api_v1_prefix):]
+    if request.method == "POST" and path in CREDENTIAL_PATHS:
+        return CREDENTIAL_PATHS[path]
+    if request.method == "POST" and path == REFRESH_PATH:
+        return None
+    if request.method == "GET" and ("/export/" in path or path.endswith("/documents/archive")):
+        return EXPORT
+    if request.method in WRITE_METHODS:
+        return WRITE
+    return None
+
+
+def get_user_id_from_request(request: Request) -> Optional[str]:
+    """User id of a valid bearer access token (signature and expiry only; revocation is checked by the route)"""
     if hasattr(request.state, "user_id"):
         return str(request.state.user_id)
-    return get_remote_address(request)
+    authorization = request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    payload = verify_token(token)
+    if not payload or payload.get("type") != "access" or payload.get("sub") is None:
+        return None
+    request.state.user_id = payload["sub"]
+    return str(payload["sub"])
+
+
+def rate_limit_key(request: Request, route_class: str) -> str:
+    """Limits follow the user once authenticated, the client address before"""
+    user_id = None if route_class in (LOGIN, PASSWORD_RESET) else get_user_id_from_request(request)
+    if user_id is not None:
+        return f"ratelimit:{route_class}:user:{user_id}"
+    client = request.client.host if request.client else "unknown"
+    return f"ratelimit:{route_class}:ip:{client}"
+
+
+class LocalTokenBuckets:
+    """Per-process token buckets, used while Redis is unreachable (limits then apply per worker)"""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    def take(self, key: str, limit: RateLimit) -> tuple[bool, float, float]:
+        now = time.monotonic()
+        tokens, last = self._buckets.pop(key, (limit.capacity, now))
+        tokens = min(limit.capacity, tokens + (now - last) * limit.rate)
+        if tokens >= 1:
+            allowed, tokens, retry_after = True, tokens - 1, 0.0
+        else:
+            allowed, retry_after = False, (1 - tokens) / limit.rate
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed, tokens, retry_after
+
+
+class RateLimiter:
+    """Token buckets in Redis, one round trip per check, with a local fallback.
+
+    After a Redis error the limiter uses local buckets and only tries Redis
+    again once rate_limit_redis_retry_seconds have passed.
+    """
+
+    def __init__(self):
+        self._client = None
+        self._script = None
+        self._redis_down_until = 0.0
+        self.local = LocalTokenBuckets(settings.rate_limit_local_max_keys)
+
+    def _redis_script(self):
+        if self._script is None:
+            self._client = aioredis.from_url(
+                settings.redis_url,
+                socket_timeout=settings.rate_limit_redis_timeout_ms / 1000,
+                socket_connect_timeout=settings.rate_limit_redis_timeout_ms / 1000
+            )
+            self._script = self._client.register_script(_TOKEN_BUCKET_SCRIPT)
+        return self._script
+
+    async def hit(self, key: str, limit: RateLimit) -> tuple[bool, float, float]:
+        """Take one token; returns (allowed, tokens left, seconds until the next token)"""
+        if time.monotonic() >= self._redis_down_until:
+            try:
+                allowed, tokens, retry_after = await self._redis_script()(
+                    keys=[key], args=[limit.capacity, repr(limit.rate)]
+                )
+                return bool(int(allowed)), float(tokens), float(retry_after)
+            except (redis.RedisError, OSError):
+                logger.warning("Redis unavailable, rate limits fall back to local buckets", exc_info=True)
+                self._redis_down_until = time.monotonic() + settings.rate_limit_redis_retry_seconds
+        return self.local.take(key, limit)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client, self._script = None, None
+
+
+limiter = RateLimiter()
+
+
+def retry_after_header(retry_after: float) -> str:
+    return str(max(1, math.ceil(retry_after)))
+
 
+async def limit_refresh(refresh_data: RefreshTokenRequest, request: Request, response: Response):
+    """Refresh limit per token family (per client address for tokens that do not decode)"""
+    if not settings.rate_limit_enabled:
+        return
+    payload = verify_token(refresh_data.refresh_token, is_refresh=True)
+    if payload and payload.get("fam"):
+        key = f"ratelimit:{REFRESH}:family:{payload['fam']}"
+    else:
+        key = rate_limit_key(request, REFRESH)
+    limit = RATE_LIMITS[REFRESH]
+    allowed, tokens, retry_after = await limiter.hit(key, limit)
+    if not allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Trop de requêtes, réessayez plus tard",
+            headers={
+                "Retry-After": retry_after_header(retry_after),
+                "X-RateLimit-Limit": str(limit.capacity),
+                "X-RateLimit-Remaining": "0"
+            }
+        )
+    response.headers["X-RateLimit-Limit"] = str(limit.capacity)
+    response.headers["X-RateLimit-Remaining"] = str(int(tokens))
@@ -1,6 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
+from fastapi.security import HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 from database import get_db
@@ -13,17 +12,34 @@ from security import (
     verify_password, get_password_hash, create_access_token, create_refresh_token,
     verify_token, check_password_strength, decrypt_field
 )
-from dependencies import get_current_user
+from dependencies import get_current_user, security
+from auth_sessions import get_auth_session_store, new_token_id, ROTATED, REUSED
 from audit import log_audit, AuditAction
 from config import settings
-from email_service import send_password_reset_email, send_welcome_email
-from rate_limit import limiter
+from rate_limit import limit_refresh
+from email_service import queue_password_reset_email
+from token_store import get_token_store, PASSWORD_RESET
+from typing import Optional
 import secrets
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
-# Store password reset tokens in memory (in production, use Redis)
-password_reset_tokens = {}
+
+def issue_tokens(user: User, family_id: Optional[str] = None, jti: Optional[str] = None) -> Token:
+    """Create an access token and a refresh token of the given (or a new) family"""
+    store = get_auth_session_store()
+    epoch = store.get_epoch(user.id)
+    if family_id is None:
+        family_id, jti = new_token_id(), new_token_id()
+        store.create_family(family_id, user.id, jti, settings.refresh_token_expire_days * 86400)
+    
+    access_token = create_access_token(data={
+        "sub": str(user.id), "email": user.email, "role": user.role.value, "fam": family_id, "epo": epoch
+    })
+    refresh_token = create_refresh_token(data={
+        "sub": str(user.id), "email": user.email, "fam": family_id, "jti": jti, "epo": epoch
+    })
+    return Token(access_token=access_token, refresh_token=refresh_token)
 
 
 @router.post("/login", response_model=Token)
@@ -74,56 +90,89 @@ def login(
     user.date_derniere_connexion = datetime.utcnow()
     db.commit()
     
-    # Create tokens
-    access_token = create_access_token(data={"sub": str(user.id), "email": user.email, "role": user.role.value})
-    refresh_token = create_refresh_token(data={"sub": str(user.id), "email": user.email})
+    # Create tokens (new refresh-token family)
+    tokens = issue_tokens(user)
     
     log_audit(db, user.id, AuditAction.USER_LOGIN, request=request)
     
-    return Token(access_token=access_token, refresh_token=refresh_token)
+    return tokens
 
 
-@router.post("/refresh", response_model=Token)
+@router.post("/refresh", response_model=Token, dependencies=[Depends(limit_refresh)])
 def refresh_token(
     refresh_data: RefreshTokenRequest,
+    request: Request,
     db: Session = Depends(get_db)
 ):
-    """Refresh access token"""
+    """Refresh access token (the refresh token is rotated and can be used once)"""
     payload = verify_token(refresh_data.refresh_token, is_refresh=True)
     
-    if not payload or payload.get("type") != "refresh":
+    if not payload or payload.get("type") != "refresh" or not payload.get("fam") or not payload.get("jti"):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid refresh token"
         )
     
-    user_id = payload.get("sub")
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    user_id = int(payload.get("sub"))
+    store = get_auth_session_store()
+    if payload.get("epo", 0) < store.get_epoch(user_id):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh token has been revoked"
+        )
+    
+    result, new_jti = store.rotate(
+        payload["fam"], payload["jti"], new_token_id(), settings.refresh_token_expire_days * 86400
+    )
+    if result == REUSED:
+        # An already rotated token was replayed: the whole session is revoked
+        log_audit(db, user_id, AuditAction.REFRESH_TOKEN_REUSED, details={"family": payload["fam"]}, request=request)
+    if result != ROTATED:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh token has been revoked"
+        )
+    
+    user = db.query(User).filter(User.id == user_id).first()
     
     if not user or not user.actif:
+        store.revoke_family(payload["fam"])
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found or inactive"
         )
     
-    # Create new tokens
-    access_token = create_access_token(data={"sub": str(user.id), "email": user.email, "role": user.role.value})
-    refresh_token = create_refresh_token(data={"sub": str(user.id), "email": user.email})
-    
-    return Token(access_token=access_token, refresh_token=refresh_token)
+    # Create new tokens in the same family
+    return issue_tokens(user, family_id=payload["fam"], jti=new_jti)
 
 
 @router.post("/logout")
 def logout(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
     current_user: User = Depends(get_current_user),
     request: Request = None,
     db: Session = Depends(get_db)
 ):
-    """Logout endpoint (audit log only, tokens are stateless)"""
+    """Logout endpoint (revokes this session's refresh tokens)"""
+    payload = verify_token(credentials.credentials, is_refresh=False)
+    if payload and payload.get("fam"):
+        get_auth_session_store().revoke_family(payload["fam"])
     log_audit(db, current_user.id, AuditAction.USER_LOGOUT, request=request)
     return {"message": "Logged out successfully"}
 
 
+@router.post("/logout-all")
+def logout_all(
+    current_user: User = Depends(get_current_user),
+    request: Request = None,
+    db: Session = Depends(get_db)
+):
+    """Revoke every access and refresh token of the current user"""
+    get_auth_session_store().bump_epoch(current_user.id)
+    log_audit(db, current_user.id, AuditAction.USER_LOGOUT_ALL, request=request)
+    return {"message": "All sessions revoked"}
+
+
 @router.post("/change-password")
 def change_password(
     password_data: ChangePasswordRequest,
@@ -180,13 +229,16 @@ def change_password(
     
     db.commit()
     
+    # Tokens issued with the old password are revoked
+    get_auth_session_store().bump_epoch(current_user.id)
+    
     log_audit(db, current_user.id, AuditAction.PASSWORD_CHANGED, request=request)
     
     return {"message": "Password changed successfully"}
 
 
 @router.post("/forgot-password")
-async def forgot_password(
+def forgot_password(
     forgot_data: ForgotPasswordRequest,
     request: Request,
     db: Session = Depends(get_db)
@@ -198,14 +250,14 @@ async def forgot_password(
     if user:
         # Generate reset token
         reset_token = secrets.token_urlsafe(32)
-        password_reset_tokens[reset_token] = {
-            "user_id": user.id,
-            "expires_at": datetime.utcnow() + timedelta(hours=1)
-        }
+        get_token_store().put(
+            PASSWORD_RESET, reset_token, user.id, settings.password_reset_token_ttl_minutes * 60
+        )
         
-        # Send email
+        # Queue email (sent by the background sender)
         reset_url = f"{request.base_url}reset-password"
-        await send_password_reset_email(user.email, reset_token, str(reset_url))
+        queue_password_reset_email(db, user.email, reset_token, str(reset_url))
+        db.commit()
     
     return {"message": "If the email exists, a password reset link has been sent"}
 
@@ -217,36 +269,29 @@ def reset_password(
     db: Session = Depends(get_db)
 ):
     """Reset password with token"""
-    # Verify token
-    token_data = password_reset_tokens.get(reset_data.token)
-    if not token_data:
+    # Check password strength first, so a rejected password doesn't use up the token
+    is_valid, message = check_password_strength(reset_data.new_password)
+    if not is_valid:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid or expired reset token"
+            detail=message
         )
     
-    if token_data["expires_at"] < datetime.utcnow():
-        del password_reset_tokens[reset_data.token]
+    # Verify and consume token (single use, even across workers)
+    user_id = get_token_store().consume(PASSWORD_RESET, reset_data.token)
+    if user_id is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Reset token has expired"
+            detail="Invalid or expired reset token"
         )
     
-    user = db.query(User).filter(User.id == token_data["user_id"]).first()
+    user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    # Check password strength
-    is_valid, message = check_password_strength(reset_data.new_password)
-    if not is_valid:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=message
-        )
-    
     # Add current password to history
     password_history = PasswordHistory(
         user_id=user.id,
@@ -270,8 +315,8 @@ def reset_password(
     
     db.commit()
     
-    # Remove token
-    del password_reset_tokens[reset_data.token]
+    # Tokens issued with the old password are revoked
+    get_auth_session_store().bump_epoch(user.id)
     
     log_audit(db, user.id, AuditAction.PASSWORD_RESET, request=request)
     
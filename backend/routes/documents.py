@@ -1,12 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request, UploadFile, File
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Request, UploadFile, File, Header
+from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, joinedload
+from typing import List, Optional, Tuple
 from database import get_db
-from models import Document, Project, User, UserRole
-from schemas import DocumentCreate, DocumentResponse
+from models import Document, Project, User, UserRole, UploadSession
+from schemas import (
+    DocumentCreate, DocumentResponse, DocumentDownloadUrlsRequest,
+    DocumentDownloadUrl, DocumentDownloadUrlsResponse, UploadSessionCreate, UploadSessionResponse
+)
 from dependencies import get_current_user, require_permission
-from storage import upload_file, validate_file_type, get_presigned_url, delete_file
+from storage import validate_file_type, get_presigned_url, get_storage, LocalStorage
+from stored_objects import store_file, release_stored_object
+from storage_deletions import enqueue_deletion
+from previews import generate_previews
+from upload_sessions import (
+    create_upload_session, claim_upload_session, write_chunk, record_chunk, release_upload_session,
+    discard_upload_session
+)
 from audit import log_audit, AuditAction
+from config import settings
+from datetime import datetime
+import mimetypes
+import os
 
 router = APIRouter(prefix="/documents", tags=["documents"])
 
@@ -27,16 +43,29 @@ def filter_documents_by_role(db: Session, current_user: User, query):
     return query.filter(False)
 
 
+def document_response(document: Document, include_download_url: bool = False) -> DocumentResponse:
+    """Build a document response with URLs of its thumbnail and preview"""
+    objet = document.objet
+    urls = {
+        "thumbnail_url": get_presigned_url(objet.url_miniature) if objet and objet.url_miniature else None,
+        "preview_url": get_presigned_url(objet.url_apercu) if objet and objet.url_apercu else None
+    }
+    if include_download_url:
+        urls["download_url"] = get_presigned_url(document.url_stockage)
+    return DocumentResponse.model_validate(document).model_copy(update=urls)
+
+
 @router.get("", response_model=List[DocumentResponse])
 def get_documents(
     skip: int = 0,
     limit: int = 100,
     projet_id: int = None,
+    include_urls: bool = False,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get documents (filtered by role)"""
-    query = db.query(Document)
+    """Get documents (filtered by role), optionally with their download URLs"""
+    query = db.query(Document).options(joinedload(Document.objet))
     
     if projet_id:
         query = query.filter(Document.projet_id == projet_id)
@@ -44,7 +73,110 @@ def get_documents(
     query = filter_documents_by_role(db, current_user, query)
     documents = query.offset(skip).limit(limit).all()
     
-    return documents
+    return [document_response(document, include_download_url=include_urls) for document in documents]
+
+
+@router.post("/download-urls", response_model=DocumentDownloadUrlsResponse)
+def get_download_urls(
+    payload: DocumentDownloadUrlsRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get download URLs for several documents in one request"""
+    ids = list(dict.fromkeys(payload.ids))
+    if len(ids) > settings.presigned_url_batch_max:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.presigned_url_batch_max} documents per request"
+        )
+    
+    query = db.query(Document).filter(Document.id.in_(ids))
+    documents = {document.id: document for document in filter_documents_by_role(db, current_user, query).all()}
+    
+    return DocumentDownloadUrlsResponse(
+        urls=[
+            DocumentDownloadUrl(
+                id=document_id,
+                filename=documents[document_id].nom_fichier,
+                download_url=get_presigned_url(documents[document_id].url_stockage)
+            )
+            for document_id in ids if document_id in documents
+        ],
+        not_found=[document_id for document_id in ids if document_id not in documents]
+    )
+
+
+def parse_byte_range(range_header: Optional[str], file_size: int) -> Optional[tuple[int, int]]:
+    """Parse a single "bytes=start-end" range; None means serve the whole file"""
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    start, _, end = range_header[len("bytes="):].strip().partition("-")
+    try:
+        if start:
+            start, end = int(start), int(end) if end else file_size - 1
+        else:
+            # Suffix range: the last N bytes
+            length = int(end)
+            if length == 0:
+                raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{file_size}"})
+            start, end = max(file_size - length, 0), file_size - 1
+    except ValueError:
+        return None
+    if start >= file_size or start > end:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{file_size}"})
+    return start, min(end, file_size - 1)
+
+
+def iter_file_range(path: str, start: int, end: int, chunk_size: int = 64 * 1024):
+    """Read bytes start..end (inclusive) of a file in chunks"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+@router.get("/files/{key:path}")
+def download_local_file(
+    key: str,
+    expires: int,
+    signature: str,
+    range_header: Optional[str] = Header(None, alias="Range")
+):
+    """Serve a file of the local storage backend from a signed URL (supports Range requests)"""
+    storage = get_storage(LocalStorage.scheme)
+    if not storage.verify(key, expires, signature):
+        raise HTTPException(status_code=403, detail="Invalid or expired download URL")
+    
+    try:
+        path = storage.path_for(key)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="File not found")
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    file_size = os.path.getsize(path)
+    byte_range = parse_byte_range(range_header, file_size)
+    
+    if byte_range is None:
+        return FileResponse(path, media_type=media_type, headers={"Accept-Ranges": "bytes"})
+    
+    start, end = byte_range
+    return StreamingResponse(
+        iter_file_range(path, start, end),
+        status_code=206,
+        media_type=media_type,
+        headers={
+            "Accept-Ranges": "bytes",
+            "Content-Range": f"bytes {start}-{end}/{file_size}",
+            "Content-Length": str(end - start + 1)
+        }
+    )
 
 
 @router.get("/{document_id}", response_model=DocumentResponse)
@@ -54,14 +186,14 @@ def get_document(
     db: Session = Depends(get_db)
 ):
     """Get document by ID"""
-    query = db.query(Document).filter(Document.id == document_id)
+    query = db.query(Document).filter(Document.id == document_id).options(joinedload(Document.objet))
     query = filter_documents_by_role(db, current_user, query)
     document = query.first()
     
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    return document
+    return document_response(document)
 
 
 @router.get("/{document_id}/download")
@@ -79,7 +211,7 @@ def download_document(
         raise HTTPException(status_code=404, detail="Document not found")
     
     # Generate presigned URL
-    presigned_url = get_presigned_url(document.url_stockage, expiration=3600)
+    presigned_url = get_presigned_url(document.url_stockage)
     
     if not presigned_url:
         raise HTTPException(status_code=500, detail="Failed to generate download URL")
@@ -87,16 +219,17 @@ def download_document(
     return {"download_url": presigned_url, "filename": document.nom_fichier}
 
 
-@router.post("", response_model=DocumentResponse, status_code=status.HTTP_201_CREATED)
-def upload_document(
-    projet_id: int,
-    description: str = None,
-    file: UploadFile = File(...),
-    request: Request = None,
-    current_user: User = Depends(require_permission("upload_documents")),
-    db: Session = Depends(get_db)
-):
-    """Upload document"""
+CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+
+
+def check_upload_access(db: Session, current_user: User, projet_id: int, filename: str) -> Project:
+    """Check that the user may upload this file to the project"""
     # Verify project exists and user has access
     project = db.query(Project).filter(Project.id == projet_id).first()
     if not project:
@@ -107,34 +240,41 @@ def upload_document(
         raise HTTPException(status_code=403, detail="You can only upload documents to your own projects")
     
     # Validate file type
-    if not validate_file_type(file.filename):
+    if not validate_file_type(filename):
         raise HTTPException(
             status_code=400,
             detail=f"Invalid file type. Allowed types: {', '.join(['pdf', 'jpg', 'png', 'xlsx'])}"
         )
     
-    # Determine content type
-    content_type_map = {
-        'pdf': 'application/pdf',
-        'jpg': 'image/jpeg',
-        'jpeg': 'image/jpeg',
-        'png': 'image/png',
-        'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    }
-    file_extension = file.filename.split('.')[-1].lower()
-    content_type = content_type_map.get(file_extension, 'application/octet-stream')
+    return project
+
+
+def create_document(
+    db: Session,
+    current_user: User,
+    projet_id: int,
+    file_content,
+    filename: str,
+    description: Optional[str],
+    request: Request,
+    background_tasks: BackgroundTasks
+) -> DocumentResponse:
+    """Store an uploaded file and create its document row"""
+    file_extension = filename.split('.')[-1].lower()
+    content_type = CONTENT_TYPES.get(file_extension, 'application/octet-stream')
     
     try:
-        # Upload to S3
-        url_stockage, file_size = upload_file(file.file, file.filename, projet_id, content_type)
+        # Store the content (once per distinct file across all projects)
+        stored = store_file(db, file_content, filename, content_type)
         
         # Create document record
         new_document = Document(
             projet_id=projet_id,
-            nom_fichier=file.filename,
+            nom_fichier=filename,
             type_fichier=file_extension,
-            taille=file_size,
-            url_stockage=url_stockage,
+            taille=stored.taille,
+            url_stockage=stored.url_stockage,
+            objet=stored,
             description=description,
             uploade_par=current_user.id
         )
@@ -145,11 +285,170 @@ def upload_document(
         
         log_audit(db, current_user.id, AuditAction.DOCUMENT_UPLOADED, "Document", new_document.id, request=request)
         
-        return new_document
+        # Thumbnail/preview rendering runs after the response is sent
+        if stored.url_miniature is None:
+            background_tasks.add_task(generate_previews, stored.id, file_extension)
+        
+        db.refresh(new_document, ["objet"])
+        return document_response(new_document)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to upload document: {str(e)}")
 
 
+@router.post("", response_model=DocumentResponse, status_code=status.HTTP_201_CREATED)
+def upload_document(
+    projet_id: int,
+    background_tasks: BackgroundTasks,
+    description: str = None,
+    file: UploadFile = File(...),
+    request: Request = None,
+    current_user: User = Depends(require_permission("upload_documents")),
+    db: Session = Depends(get_db)
+):
+    """Upload document"""
+    check_upload_access(db, current_user, projet_id, file.filename)
+    return create_document(db, current_user, projet_id, file.file, file.filename, description, request, background_tasks)
+
+
+def upload_session_response(upload_session: UploadSession) -> UploadSessionResponse:
+    return UploadSessionResponse(
+        id=upload_session.id,
+        projet_id=upload_session.projet_id,
+        nom_fichier=upload_session.nom_fichier,
+        taille=upload_session.taille,
+        offset=upload_session.recu,
+        date_expiration=upload_session.date_expiration
+    )
+
+
+def get_upload_session(db: Session, session_id: str, current_user: User) -> UploadSession:
+    """Get an unexpired upload session of the current user"""
+    upload_session = db.query(UploadSession).filter(
+        UploadSession.id == session_id,
+        UploadSession.user_id == current_user.id,
+        UploadSession.date_expiration >= datetime.utcnow()
+    ).first()
+    if not upload_session:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return upload_session
+
+
+def claim_chunk_write(db: Session, session_id: str, current_user: User, offset: int) -> Tuple[str, str, int]:
+    """Lease the session for a chunk at offset; returns (lease token, temporary file, declared size)"""
+    upload_session = get_upload_session(db, session_id, current_user)
+    if offset != upload_session.recu:
+        raise HTTPException(status_code=409, detail=f"Upload must resume at offset {upload_session.recu}")
+    chemin_temp, taille = upload_session.chemin_temp, upload_session.taille
+    token = claim_upload_session(db, session_id, UploadSession.recu == offset)
+    if token is None:
+        raise HTTPException(status_code=409, detail="Another chunk of this upload is being written")
+    return token, chemin_temp, taille
+
+
+@router.post("/uploads", response_model=UploadSessionResponse, status_code=status.HTTP_201_CREATED)
+def create_upload(
+    upload: UploadSessionCreate,
+    current_user: User = Depends(require_permission("upload_documents")),
+    db: Session = Depends(get_db)
+):
+    """Start a resumable upload"""
+    check_upload_access(db, current_user, upload.projet_id, upload.nom_fichier)
+    if upload.taille > settings.max_upload_size_mb * 1024 * 1024:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File size exceeds maximum allowed size of {settings.max_upload_size_mb}MB"
+        )
+    
+    upload_session = create_upload_session(
+        db, current_user.id, upload.projet_id, upload.nom_fichier, upload.taille, upload.description
+    )
+    return upload_session_response(upload_session)
+
+
+@router.get("/uploads/{session_id}", response_model=UploadSessionResponse)
+def get_upload(
+    session_id: str,
+    current_user: User = Depends(require_permission("upload_documents")),
+    db: Session = Depends(get_db)
+):
+    """Get the offset to resume an upload from"""
+    return upload_session_response(get_upload_session(db, session_id, current_user))
+
+
+@router.put("/uploads/{session_id}", response_model=UploadSessionResponse)
+async def upload_chunk(
+    session_id: str,
+    offset: int,
+    request: Request,
+    current_user: User = Depends(require_permission("upload_documents")),
+    db: Session = Depends(get_db)
+):
+    """Append the request body at offset (must be the current offset of the session)"""
+    # The lease is committed before streaming, so no connection or row lock is held during
+    # the transfer, and a retried PUT at the same offset gets a 409 instead of writing the same file
+    token, chemin_temp, taille = await run_in_threadpool(claim_chunk_write, db, session_id, current_user, offset)
+    try:
+        received = await write_chunk(chemin_temp, taille, offset, request.stream())
+    except Exception as e:
+        await run_in_threadpool(release_upload_session, db, session_id, token)
+        if isinstance(e, ValueError):
+            raise HTTPException(status_code=413, detail=str(e))
+        raise
+    
+    if not await run_in_threadpool(record_chunk, db, session_id, token, offset, received):
+        raise HTTPException(status_code=409, detail="Upload session was taken over by another request")
+    return upload_session_response(await run_in_threadpool(get_upload_session, db, session_id, current_user))
+
+
+@router.post("/uploads/{session_id}/complete", response_model=DocumentResponse, status_code=status.HTTP_201_CREATED)
+def complete_upload(
+    session_id: str,
+    background_tasks: BackgroundTasks,
+    request: Request,
+    current_user: User = Depends(require_permission("upload_documents")),
+    db: Session = Depends(get_db)
+):
+    """Finalize a resumable upload into a document"""
+    upload_session = get_upload_session(db, session_id, current_user)
+    if upload_session.recu != upload_session.taille:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Upload incomplete: {upload_session.recu} of {upload_session.taille} bytes received"
+        )
+    
+    check_upload_access(db, current_user, upload_session.projet_id, upload_session.nom_fichier)
+    # A single request finalizes: a concurrent or retried complete gets a 409 (a 404 once done)
+    token = claim_upload_session(db, session_id, UploadSession.recu == UploadSession.taille)
+    if token is None:
+        raise HTTPException(status_code=409, detail="Upload is already being finalized")
+    try:
+        with open(upload_session.chemin_temp, "rb") as file_content:
+            document = create_document(
+                db, current_user, upload_session.projet_id, file_content,
+                upload_session.nom_fichier, upload_session.description, request, background_tasks
+            )
+    except Exception:
+        db.rollback()
+        release_upload_session(db, session_id, token)
+        raise
+    
+    discard_upload_session(db, upload_session)
+    return document
+
+
+@router.delete("/uploads/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+def cancel_upload(
+    session_id: str,
+    current_user: User = Depends(require_permission("upload_documents")),
+    db: Session = Depends(get_db)
+):
+    """Abandon a resumable upload"""
+    discard_upload_session(db, get_upload_session(db, session_id, current_user))
+    return None
+
+
 @router.delete("/{document_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_document(
     document_id: int,
@@ -171,11 +470,13 @@ def delete_document(
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    # Delete from S3
-    delete_file(document.url_stockage)
-    
-    # Delete from database
+    # Delete from database; the stored file is queued for deletion once no document references it
     db.delete(document)
+    db.flush()
+    if document.objet_id is not None:
+        release_stored_object(db, document.objet_id)
+    else:
+        enqueue_deletion(db, document.url_stockage)
     db.commit()
     
     log_audit(db, current_user.id, AuditAction.DOCUMENT_DELETED, "Document", document_id, request=request)
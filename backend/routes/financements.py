@@ -1,13 +1,28 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List
-from database import get_db
-from models import Financement, Project, User, UserRole
-from schemas import FinancementCreate, FinancementUpdate, FinancementResponse
-from dependencies import get_current_user, require_permission, require_role
+from database import get_db, get_async_db
+from models import Financement, FinancementStatut, Project, User, UserRole
+from schemas import (
+    FinancementCreate, FinancementUpdate, FinancementResponse,
+    FinancementBulkStatusRequest, FinancementBulkStatusResponse
+)
+from dependencies import get_current_user, get_current_user_async, require_permission, require_role
 from audit import log_audit, AuditAction
+from portfolio import invalidate_portfolio
 
 router = APIRouter(prefix="/financements", tags=["financements"])
+# Async variants of the read routes, mounted before router when ASYNC_DB_ENABLED is set
+async_router = APIRouter(prefix="/financements", tags=["financements"])
+
+# Allowed status transitions (pledge -> received -> used)
+FINANCEMENT_TRANSITIONS = {
+    FinancementStatut.PROMIS: [FinancementStatut.RECU],
+    FinancementStatut.RECU: [FinancementStatut.UTILISE],
+    FinancementStatut.UTILISE: [],
+}
 
 
 def filter_financements_by_role(db: Session, current_user: User, query):
@@ -59,6 +74,38 @@ def get_financement(
     return financement
 
 
+@async_router.get("", response_model=List[FinancementResponse])
+async def get_financements_async(
+    skip: int = 0,
+    limit: int = 100,
+    projet_id: int = None,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get financements (filtered by role)"""
+    query = select(Financement)
+    if projet_id:
+        query = query.filter(Financement.projet_id == projet_id)
+    query = filter_financements_by_role(db, current_user, query)
+    return (await db.scalars(query.offset(skip).limit(limit))).all()
+
+
+@async_router.get("/{financement_id}", response_model=FinancementResponse)
+async def get_financement_async(
+    financement_id: int,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get financement by ID"""
+    query = filter_financements_by_role(db, current_user, select(Financement).filter(Financement.id == financement_id))
+    financement = (await db.scalars(query)).first()
+    
+    if not financement:
+        raise HTTPException(status_code=404, detail="Financement not found")
+    
+    return financement
+
+
 @router.post("", response_model=FinancementResponse, status_code=status.HTTP_201_CREATED)
 def create_financement(
     financement_data: FinancementCreate,
@@ -98,12 +145,82 @@ def create_financement(
     db.add(new_financement)
     db.commit()
     db.refresh(new_financement)
+    invalidate_portfolio(new_financement.donateur_id)
     
     log_audit(db, current_user.id, AuditAction.FINANCEMENT_CREATED, "Financement", new_financement.id, request=request)
     
     return new_financement
 
 
+@router.post("/bulk-status", response_model=FinancementBulkStatusResponse)
+def bulk_update_financement_status(
+    bulk_data: FinancementBulkStatusRequest,
+    request: Request,
+    current_user: User = Depends(require_role(["admin"])),
+    db: Session = Depends(get_db)
+):
+    """Move many financements to a new status in one transaction (admin only)"""
+    if (bulk_data.ids is None) == (bulk_data.filtre is None):
+        raise HTTPException(status_code=400, detail="Provide either ids or filtre")
+    
+    target = bulk_data.statut
+    sources = [statut for statut, targets in FINANCEMENT_TRANSITIONS.items() if target in targets]
+    if not sources:
+        raise HTTPException(status_code=400, detail=f"No financement can be moved to {target.value}")
+    
+    query = db.query(Financement.id, Financement.statut, Financement.donateur_id)
+    if bulk_data.ids is not None:
+        query = query.filter(Financement.id.in_(bulk_data.ids))
+    else:
+        filtre = bulk_data.filtre
+        if filtre.statut is not None and filtre.statut not in sources:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Cannot move financements from {filtre.statut.value} to {target.value}"
+            )
+        query = query.filter(Financement.statut.in_([filtre.statut] if filtre.statut else sources))
+        if filtre.projet_id is not None:
+            query = query.filter(Financement.projet_id == filtre.projet_id)
+        if filtre.donateur_id is not None:
+            query = query.filter(Financement.donateur_id == filtre.donateur_id)
+        if filtre.date_financement_max is not None:
+            query = query.filter(Financement.date_financement <= filtre.date_financement_max)
+    
+    # Lock the selected rows until the transition is committed
+    rows = query.with_for_update().all()
+    
+    if bulk_data.ids is not None:
+        missing = sorted(set(bulk_data.ids) - {row.id for row in rows})
+        if missing:
+            db.rollback()
+            raise HTTPException(status_code=404, detail={"message": "Financements not found", "ids": missing})
+        invalid = [{"id": row.id, "statut": row.statut.value} for row in rows if row.statut not in sources]
+        if invalid:
+            db.rollback()
+            raise HTTPException(
+                status_code=409,
+                detail={"message": f"Invalid transition to {target.value}", "financements": invalid}
+            )
+    
+    ids = sorted(row.id for row in rows)
+    if ids:
+        db.query(Financement).filter(
+            Financement.id.in_(ids),
+            Financement.statut.in_(sources)
+        ).update({Financement.statut: target}, synchronize_session=False)
+    
+    # The audit entry commits the transition with it
+    log_audit(
+        db, current_user.id, AuditAction.FINANCEMENT_BULK_STATUS, "Financement",
+        details={"statut": target.value, "ids": ids}, request=request
+    )
+    
+    for donateur_id in {row.donateur_id for row in rows}:
+        invalidate_portfolio(donateur_id)
+    
+    return FinancementBulkStatusResponse(statut=target, updated=len(ids), ids=ids)
+
+
 @router.put("/{financement_id}", response_model=FinancementResponse)
 def update_financement(
     financement_id: int,
@@ -144,6 +261,7 @@ def update_financement(
     
     db.commit()
     db.refresh(financement)
+    invalidate_portfolio(financement.donateur_id)
     
     log_audit(db, current_user.id, AuditAction.FINANCEMENT_UPDATED, "Financement", financement.id, request=request)
     
@@ -164,6 +282,7 @@ def delete_financement(
     
     db.delete(financement)
     db.commit()
+    invalidate_portfolio(financement.donateur_id)
     
     log_audit(db, current_user.id, AuditAction.FINANCEMENT_DELETED, "Financement", financement_id, request=request)
     
@@ -1,13 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, UploadFile, File
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List
-from database import get_db
-from models import Indicator, Project, User, UserRole
-from schemas import IndicatorCreate, IndicatorUpdate, IndicatorResponse
-from dependencies import get_current_user, require_permission, require_role
+from database import get_db, get_async_db
+from models import Indicator, IndicatorDefinition, IndicatorLatest, Project, User, UserRole
+from schemas import (
+    IndicatorCreate, IndicatorUpdate, IndicatorResponse, IndicatorDefinitionResponse, IndicatorDefinitionUpdate,
+    IndicatorImportError, IndicatorImportResponse, IndicatorLatestResponse
+)
+from dependencies import get_current_user, get_current_user_async, require_permission, require_role
 from audit import log_audit, AuditAction
+from imports import iter_indicator_rows, ImportFileError
+from indicator_latest import refresh_indicator_latest, rebuild_indicator_latest
+from indicator_definitions import definition_key, get_or_create_definition, check_unit, UnitConflictError
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/indicators", tags=["indicators"])
+# Async variants of the read routes, mounted before router when ASYNC_DB_ENABLED is set
+async_router = APIRouter(prefix="/indicators", tags=["indicators"])
 
 
 def filter_indicators_by_role(db: Session, current_user: User, query):
@@ -26,6 +41,19 @@ def filter_indicators_by_role(db: Session, current_user: User, query):
     return query.filter(False)
 
 
+def filter_latest_by_role(db: Session, current_user: User, query):
+    """Filter latest indicator values based on user role"""
+    from models import Financement
+    if current_user.role == UserRole.ADMIN:
+        return query
+    elif current_user.role == UserRole.CHEF_PROJET:
+        return query.join(Project, IndicatorLatest.projet_id == Project.id).filter(Project.chef_projet_id == current_user.id)
+    elif current_user.role == UserRole.DONATEUR:
+        funded_projects = select(Financement.projet_id).filter(Financement.donateur_id == current_user.id)
+        return query.filter(IndicatorLatest.projet_id.in_(funded_projects))
+    return query.filter(False)
+
+
 @router.get("", response_model=List[IndicatorResponse])
 def get_indicators(
     skip: int = 0,
@@ -46,6 +74,61 @@ def get_indicators(
     return indicators
 
 
+@router.get("/latest", response_model=List[IndicatorLatestResponse])
+def get_latest_indicators(
+    skip: int = 0,
+    limit: int = 100,
+    projet_id: int = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the current value of each indicator per project (filtered by role)"""
+    query = db.query(IndicatorLatest)
+
+    if projet_id:
+        query = query.filter(IndicatorLatest.projet_id == projet_id)
+
+    query = filter_latest_by_role(db, current_user, query)
+    latest = query.order_by(IndicatorLatest.projet_id, IndicatorLatest.definition_id).offset(skip).limit(limit).all()
+
+    return latest
+
+
+@router.get("/definitions", response_model=List[IndicatorDefinitionResponse])
+def get_indicator_definitions(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the indicator definitions catalog"""
+    return db.query(IndicatorDefinition).order_by(IndicatorDefinition.nom).all()
+
+
+@router.put("/definitions/{definition_id}", response_model=IndicatorDefinitionResponse)
+def update_indicator_definition(
+    definition_id: int,
+    definition_data: IndicatorDefinitionUpdate,
+    request: Request,
+    current_user: User = Depends(require_role(["admin"])),
+    db: Session = Depends(get_db)
+):
+    """Change the unit of a catalog definition, for every project (admin only)"""
+    definition = db.query(IndicatorDefinition).filter(IndicatorDefinition.id == definition_id).first()
+    if not definition:
+        raise HTTPException(status_code=404, detail="Indicator definition not found")
+
+    previous_unite = definition.unite
+    definition.unite = definition_data.unite.strip() if definition_data.unite else None
+    db.commit()
+    db.refresh(definition)
+
+    log_audit(
+        db, current_user.id, AuditAction.INDICATOR_UPDATED, "IndicatorDefinition", definition.id,
+        details={"unite": {"avant": previous_unite, "apres": definition.unite}}, request=request
+    )
+
+    return definition
+
+
 @router.get("/{indicator_id}", response_model=IndicatorResponse)
 def get_indicator(
     indicator_id: int,
@@ -63,6 +146,64 @@ def get_indicator(
     return indicator
 
 
+@async_router.get("", response_model=List[IndicatorResponse])
+async def get_indicators_async(
+    skip: int = 0,
+    limit: int = 100,
+    projet_id: int = None,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get indicators (filtered by role)"""
+    query = select(Indicator)
+    if projet_id:
+        query = query.filter(Indicator.projet_id == projet_id)
+    query = filter_indicators_by_role(db, current_user, query)
+    return (await db.scalars(query.offset(skip).limit(limit))).all()
+
+
+@async_router.get("/latest", response_model=List[IndicatorLatestResponse])
+async def get_latest_indicators_async(
+    skip: int = 0,
+    limit: int = 100,
+    projet_id: int = None,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get the current value of each indicator per project (filtered by role)"""
+    query = select(IndicatorLatest)
+    if projet_id:
+        query = query.filter(IndicatorLatest.projet_id == projet_id)
+    query = filter_latest_by_role(db, current_user, query)
+    query = query.order_by(IndicatorLatest.projet_id, IndicatorLatest.definition_id).offset(skip).limit(limit)
+    return (await db.scalars(query)).all()
+
+
+@async_router.get("/definitions", response_model=List[IndicatorDefinitionResponse])
+async def get_indicator_definitions_async(
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get the indicator definitions catalog"""
+    return (await db.scalars(select(IndicatorDefinition).order_by(IndicatorDefinition.nom))).all()
+
+
+@async_router.get("/{indicator_id}", response_model=IndicatorResponse)
+async def get_indicator_async(
+    indicator_id: int,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get indicator by ID"""
+    query = filter_indicators_by_role(db, current_user, select(Indicator).filter(Indicator.id == indicator_id))
+    indicator = (await db.scalars(query)).first()
+    
+    if not indicator:
+        raise HTTPException(status_code=404, detail="Indicator not found")
+    
+    return indicator
+
+
 @router.post("", response_model=IndicatorResponse, status_code=status.HTTP_201_CREATED)
 def create_indicator(
     indicator_data: IndicatorCreate,
@@ -80,12 +221,16 @@ def create_indicator(
     if current_user.role == UserRole.CHEF_PROJET and project.chef_projet_id != current_user.id:
         raise HTTPException(status_code=403, detail="You can only add indicators to your own projects")
     
+    try:
+        definition = get_or_create_definition(db, indicator_data.nom, indicator_data.unite)
+    except UnitConflictError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    
     new_indicator = Indicator(
         projet_id=indicator_data.projet_id,
-        nom=indicator_data.nom,
+        definition=definition,
         valeur=indicator_data.valeur,
         valeur_cible=indicator_data.valeur_cible,
-        unite=indicator_data.unite,
         date_saisie=indicator_data.date_saisie,
         periode=indicator_data.periode,
         commentaire=indicator_data.commentaire,
@@ -93,6 +238,7 @@ def create_indicator(
     )
     
     db.add(new_indicator)
+    refresh_indicator_latest(db, new_indicator.projet_id, definition.id)
     db.commit()
     db.refresh(new_indicator)
     
@@ -101,6 +247,101 @@ def create_indicator(
     return new_indicator
 
 
+@router.post("/import", response_model=IndicatorImportResponse)
+def import_indicators(
+    request: Request,
+    file: UploadFile = File(...),
+    current_user: User = Depends(require_permission("create_indicators")),
+    db: Session = Depends(get_db)
+):
+    """Bulk import indicators from a CSV or XLSX file"""
+    try:
+        rows = iter_indicator_rows(file.file, file.filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Ownership is checked once per distinct project (None means allowed)
+    project_errors = {}
+    definitions = {}
+    batch = []
+    imported_projects = set()
+    inserted = 0
+    rejected = 0
+    errors = []
+
+    def reject(line: int, line_errors: List[dict]):
+        nonlocal rejected
+        rejected += 1
+        if len(errors) < settings.indicator_import_max_errors:
+            errors.append(IndicatorImportError(line=line, errors=line_errors))
+
+    try:
+        for line, row in rows:
+            try:
+                indicator_data = IndicatorCreate(**row)
+            except ValidationError as e:
+                reject(line, [
+                    {"field": ".".join(str(loc) for loc in err["loc"]), "message": err["msg"]}
+                    for err in e.errors()
+                ])
+                continue
+
+            projet_id = indicator_data.projet_id
+            if projet_id not in project_errors:
+                project = db.query(Project.chef_projet_id).filter(Project.id == projet_id).first()
+                if not project:
+                    project_errors[projet_id] = "Project not found"
+                elif current_user.role == UserRole.CHEF_PROJET and project.chef_projet_id != current_user.id:
+                    project_errors[projet_id] = "You can only add indicators to your own projects"
+                else:
+                    project_errors[projet_id] = None
+            if project_errors[projet_id]:
+                reject(line, [{"field": "projet_id", "message": project_errors[projet_id]}])
+                continue
+
+            cle = definition_key(indicator_data.nom)
+            try:
+                if cle not in definitions:
+                    definitions[cle] = get_or_create_definition(db, indicator_data.nom, indicator_data.unite)
+                check_unit(definitions[cle], indicator_data.unite)
+            except UnitConflictError as e:
+                reject(line, [{"field": "unite", "message": str(e)}])
+                continue
+
+            batch.append({
+                **indicator_data.model_dump(exclude={"nom", "unite"}),
+                "definition_id": definitions[cle].id,
+                "saisi_par": current_user.id
+            })
+            imported_projects.add(projet_id)
+            if len(batch) >= settings.indicator_import_batch_size:
+                db.execute(insert(Indicator), batch)
+                inserted += len(batch)
+                batch = []
+
+        if batch:
+            db.execute(insert(Indicator), batch)
+            inserted += len(batch)
+        rebuild_indicator_latest(db, imported_projects)
+        db.commit()
+    except ImportFileError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Failed to import indicators: {str(e)}")
+    except Exception:
+        # Server faults are not the file's fault: logged, and a plain 500 for the client
+        db.rollback()
+        logger.exception("Indicator import of %s failed", file.filename)
+        raise
+
+    log_audit(
+        db, current_user.id, AuditAction.INDICATOR_IMPORTED, "Indicator",
+        details={"filename": file.filename, "inserted": inserted, "rejected": rejected},
+        request=request
+    )
+
+    return IndicatorImportResponse(inserted=inserted, rejected=rejected, errors=errors)
+
+
 @router.put("/{indicator_id}", response_model=IndicatorResponse)
 def update_indicator(
     indicator_id: int,
@@ -119,16 +360,20 @@ def update_indicator(
     indicator = query.first()
     if not indicator:
         raise HTTPException(status_code=404, detail="Indicator not found")
+    previous_definition_id = indicator.definition_id
     
-    # Update fields
-    if indicator_data.nom is not None:
-        indicator.nom = indicator_data.nom
+    # Update fields (the unit belongs to the shared definition: it can only match it, or fill a missing one)
+    try:
+        if indicator_data.nom is not None:
+            indicator.definition = get_or_create_definition(db, indicator_data.nom, indicator_data.unite)
+        elif indicator_data.unite is not None:
+            get_or_create_definition(db, indicator.nom, indicator_data.unite)
+    except UnitConflictError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
     if indicator_data.valeur is not None:
         indicator.valeur = indicator_data.valeur
     if indicator_data.valeur_cible is not None:
         indicator.valeur_cible = indicator_data.valeur_cible
-    if indicator_data.unite is not None:
-        indicator.unite = indicator_data.unite
     if indicator_data.date_saisie is not None:
         indicator.date_saisie = indicator_data.date_saisie
     if indicator_data.periode is not None:
@@ -136,6 +381,10 @@ def update_indicator(
     if indicator_data.commentaire is not None:
         indicator.commentaire = indicator_data.commentaire
     
+    db.flush()
+    refresh_indicator_latest(db, indicator.projet_id, indicator.definition_id)
+    if indicator.definition_id != previous_definition_id:
+        refresh_indicator_latest(db, indicator.projet_id, previous_definition_id)
     db.commit()
     db.refresh(indicator)
     
@@ -162,6 +411,7 @@ def delete_indicator(
         raise HTTPException(status_code=404, detail="Indicator not found")
     
     db.delete(indicator)
+    refresh_indicator_latest(db, indicator.projet_id, indicator.definition_id)
     db.commit()
     
     log_audit(db, current_user.id, AuditAction.INDICATOR_DELETED, "Indicator", indicator_id, request=request)
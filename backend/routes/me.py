@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from database import get_db
+from models import User
+from schemas import PortfolioResponse
+from dependencies import require_role
+from portfolio import get_portfolio
+
+router = APIRouter(prefix="/me", tags=["me"])
+
+
+@router.get("/portfolio", response_model=PortfolioResponse)
+def get_my_portfolio(
+    current_user: User = Depends(require_role(["donateur"])),
+    db: Session = Depends(get_db)
+):
+    """Get the donor's portfolio: totals by status, funded projects and latest indicators"""
+    return get_portfolio(db, current_user.id)
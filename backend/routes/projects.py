@@ -1,14 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 from typing import List
-from database import get_db
-from models import Project, User, UserRole
+from database import get_db, get_async_db
+from models import Project, User, UserRole, Document
 from schemas import ProjectCreate, ProjectUpdate, ProjectResponse, ProjectDetailResponse
-from dependencies import get_current_user, require_role, require_permission
-from security import encrypt_field, decrypt_field
+from dependencies import get_current_user, get_current_user_async, require_role, require_permission
+from security import encrypt_field, decrypt_field, decrypt_fields
 from audit import log_audit, AuditAction
+from stored_objects import release_stored_object
+from storage_deletions import enqueue_deletion
+from archives import iter_documents_archive
+from metrics import iter_timed_export
+from routes.documents import filter_documents_by_role
 
 router = APIRouter(prefix="/projects", tags=["projects"])
+# Async variants of the read routes, mounted before router when ASYNC_DB_ENABLED is set
+async_router = APIRouter(prefix="/projects", tags=["projects"])
 
 
 def filter_projects_by_role(db: Session, current_user: User, query):
@@ -26,6 +36,26 @@ def filter_projects_by_role(db: Session, current_user: User, query):
     return query.filter(False)  # No access
 
 
+# Relationships returned by the project detail routes, loaded with one query each
+PROJECT_DETAIL_OPTIONS = (
+    selectinload(Project.indicators), selectinload(Project.financements), selectinload(Project.documents)
+)
+
+
+def project_responses(db: Session, projects: list, schema=ProjectResponse) -> list:
+    """Build project responses, decrypting the coordinates of all projects in one query"""
+    coordinates = decrypt_fields(db, [value for project in projects for value in (project.latitude, project.longitude)])
+    result = []
+    for n, project in enumerate(projects):
+        project_data = schema.from_orm(project)
+        if project.latitude:
+            project_data.latitude = float(coordinates[2 * n] or 0)
+        if project.longitude:
+            project_data.longitude = float(coordinates[2 * n + 1] or 0)
+        result.append(project_data)
+    return result
+
+
 @router.get("", response_model=List[ProjectResponse])
 def get_projects(
     skip: int = 0,
@@ -38,17 +68,7 @@ def get_projects(
     query = filter_projects_by_role(db, current_user, query)
     projects = query.offset(skip).limit(limit).all()
     
-    # Decrypt coordinates for response
-    result = []
-    for project in projects:
-        project_data = ProjectResponse.from_orm(project)
-        if project.latitude:
-            project_data.latitude = float(decrypt_field(db, project.latitude) or 0)
-        if project.longitude:
-            project_data.longitude = float(decrypt_field(db, project.longitude) or 0)
-        result.append(project_data)
-    
-    return result
+    return project_responses(db, projects)
 
 
 @router.get("/{project_id}", response_model=ProjectDetailResponse)
@@ -58,27 +78,44 @@ def get_project(
     db: Session = Depends(get_db)
 ):
     """Get project by ID"""
-    query = db.query(Project).filter(Project.id == project_id)
+    query = db.query(Project).filter(Project.id == project_id).options(*PROJECT_DETAIL_OPTIONS)
     query = filter_projects_by_role(db, current_user, query)
     project = query.first()
     
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    project_data = ProjectDetailResponse.from_orm(project)
+    return project_responses(db, [project], ProjectDetailResponse)[0]
+
+
+@async_router.get("", response_model=List[ProjectResponse])
+async def get_projects_async(
+    skip: int = 0,
+    limit: int = 100,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get projects (filtered by role)"""
+    query = filter_projects_by_role(db, current_user, select(Project))
+    projects = (await db.scalars(query.offset(skip).limit(limit))).all()
     
-    # Decrypt coordinates
-    if project.latitude:
-        project_data.latitude = float(decrypt_field(db, project.latitude) or 0)
-    if project.longitude:
-        project_data.longitude = float(decrypt_field(db, project.longitude) or 0)
+    return await db.run_sync(project_responses, projects)
+
+
+@async_router.get("/{project_id}", response_model=ProjectDetailResponse)
+async def get_project_async(
+    project_id: int,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get project by ID"""
+    query = select(Project).filter(Project.id == project_id).options(*PROJECT_DETAIL_OPTIONS)
+    project = (await db.scalars(filter_projects_by_role(db, current_user, query))).first()
     
-    # Load relationships
-    project_data.indicators = project.indicators
-    project_data.financements = project.financements
-    project_data.documents = project.documents
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
     
-    return project_data
+    return (await db.run_sync(project_responses, [project], ProjectDetailResponse))[0]
 
 
 @router.post("", response_model=ProjectResponse, status_code=status.HTTP_201_CREATED)
@@ -195,6 +232,37 @@ def update_project(
     return project_response
 
 
+@router.get("/{project_id}/documents/archive")
+def download_project_documents_archive(
+    project_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Download all documents of a project as a ZIP streamed from storage"""
+    query = filter_projects_by_role(db, current_user, db.query(Project).filter(Project.id == project_id))
+    if not query.first():
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    query = filter_documents_by_role(db, current_user, db.query(Document).filter(Document.projet_id == project_id))
+    # Plain values: the session is closed while the archive streams
+    files = [
+        (document.nom_fichier, document.url_stockage, document.date_upload)
+        for document in query.order_by(Document.id).all()
+    ]
+    
+    log_audit(
+        db, current_user.id, AuditAction.EXPORT_GENERATED, "Project", project_id,
+        details={"export": "documents_archive", "documents": len(files)}, request=request
+    )
+    
+    return StreamingResponse(
+        iter_timed_export("zip", iter_documents_archive(files)),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename=projet_{project_id}_documents.zip"}
+    )
+
+
 @router.delete("/{project_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_project(
     project_id: int,
@@ -207,7 +275,23 @@ def delete_project(
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
+    # References held by the project's documents on stored files
+    references = db.query(Document.objet_id, func.count(Document.id)).filter(
+        Document.projet_id == project_id,
+        Document.objet_id.isnot(None)
+    ).group_by(Document.objet_id).order_by(Document.objet_id).all()
+    legacy_urls = [url for (url,) in db.query(Document.url_stockage).filter(
+        Document.projet_id == project_id,
+        Document.objet_id.is_(None)
+    )]
+    
     db.delete(project)
+    db.flush()
+    # Files are removed by the background worker once this transaction commits
+    for objet_id, count in references:
+        release_stored_object(db, objet_id, count)
+    for url in legacy_urls:
+        enqueue_deletion(db, url)
     db.commit()
     
     log_audit(db, current_user.id, AuditAction.PROJECT_DELETED, "Project", project_id, request=request)
@@ -1,21 +1,29 @@
-from fastapi import APIRouter, Depends, Response
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from database import get_db
+from database import get_db, get_async_db
 from models import Project, Financement, User, SatisfactionSurvey, Indicator, UserRole
-from schemas import KPIResponse
-from dependencies import get_current_user, require_role
+from models import FinancementStatut
+from schemas import KPIResponse, IndicatorRollupResponse, FinancementTotalsResponse, SlowQueryResponse
+from dependencies import get_current_user, require_role, require_role_async
 from exports import generate_pdf_report, generate_excel_report
+from metrics import EXPORT_DURATION
+from indicator_definitions import indicator_rollup
+from fx import financement_totals, fx_cache, normalize_currency, BASE_CURRENCY
+from slow_queries import slow_query_log
+from typing import List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/stats", tags=["statistics"])
+# Async variants of the read routes, mounted before router when ASYNC_DB_ENABLED is set
+async_router = APIRouter(prefix="/stats", tags=["statistics"])
 
 
-@router.get("/kpis", response_model=KPIResponse)
-def get_kpis(
-    current_user: User = Depends(require_role(["admin"])),
-    db: Session = Depends(get_db)
-):
-    """Get KPIs (admin only)"""
+def compute_kpis(db: Session) -> KPIResponse:
+    """Portfolio KPIs (shared by the sync and async routes)"""
     # Total projects
     total_projects = db.query(Project).count()
     
@@ -26,11 +34,13 @@ def get_kpis(
     total_budget_result = db.query(func.sum(Project.budget)).scalar()
     total_budget = total_budget_result if total_budget_result else 0
     
-    # Total financed
-    total_financed_result = db.query(func.sum(Financement.montant)).filter(
-        Financement.statut.in_(["recu", "utilise"])
-    ).scalar()
-    total_financed = total_financed_result if total_financed_result else 0
+    # Total financed (converted to EUR with date-effective rates); amounts without a rate are reported apart
+    financed = financement_totals(db, BASE_CURRENCY, statuts=[FinancementStatut.RECU, FinancementStatut.UTILISE])
+    if financed["non_converti"]:
+        logger.warning(
+            "KPI total_financed excludes amounts without an exchange rate to %s: %s",
+            BASE_CURRENCY, ", ".join(f"{montant} {devise}" for devise, montant in sorted(financed["non_converti"].items()))
+        )
     
     # Total donateurs
     total_donateurs = db.query(User).filter(User.role == UserRole.DONATEUR).count()
@@ -55,7 +65,8 @@ def get_kpis(
         total_projects=total_projects,
         active_projects=active_projects,
         total_budget=total_budget,
-        total_financed=total_financed,
+        total_financed=financed["total"],
+        total_financed_non_converti=financed["non_converti"],
         total_donateurs=total_donateurs,
         average_satisfaction=average_satisfaction,
         projects_by_domain=projects_by_domain,
@@ -63,14 +74,90 @@ def get_kpis(
     )
 
 
+@router.get("/kpis", response_model=KPIResponse)
+def get_kpis(
+    current_user: User = Depends(require_role(["admin"])),
+    db: Session = Depends(get_db)
+):
+    """Get KPIs (admin only)"""
+    return compute_kpis(db)
+
+
+@router.get("/financements", response_model=FinancementTotalsResponse)
+def get_financement_totals(
+    devise: str = BASE_CURRENCY,
+    statut: Optional[List[FinancementStatut]] = Query(None),
+    current_user: User = Depends(require_role(["admin"])),
+    db: Session = Depends(get_db)
+):
+    """Financement totals per project, per donor and global in a reporting currency (admin only)"""
+    devise = normalize_currency(devise)
+    if devise not in fx_cache.currencies(db):
+        raise HTTPException(status_code=400, detail=f"No exchange rates available for {devise}")
+
+    return financement_totals(db, devise, statuts=statut)
+
+
+@router.get("/indicators", response_model=List[IndicatorRollupResponse])
+def get_indicator_rollup(
+    current_user: User = Depends(require_role(["admin"])),
+    db: Session = Depends(get_db)
+):
+    """Cross-project indicator rollup and progress, grouped by definition (admin only)"""
+    return indicator_rollup(db)
+
+
+@router.get("/slow-queries", response_model=List[SlowQueryResponse])
+def get_slow_queries(
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(require_role(["admin"]))
+):
+    """Recent SQL statements slower than SLOW_QUERY_THRESHOLD_MS in this worker, newest first (admin only)"""
+    return slow_query_log.entries(limit)
+
+
+@async_router.get("/kpis", response_model=KPIResponse)
+async def get_kpis_async(
+    current_user: User = Depends(require_role_async(["admin"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get KPIs (admin only)"""
+    return await db.run_sync(compute_kpis)
+
+
+@async_router.get("/financements", response_model=FinancementTotalsResponse)
+async def get_financement_totals_async(
+    devise: str = BASE_CURRENCY,
+    statut: Optional[List[FinancementStatut]] = Query(None),
+    current_user: User = Depends(require_role_async(["admin"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Financement totals per project, per donor and global in a reporting currency (admin only)"""
+    devise = normalize_currency(devise)
+    if devise not in await db.run_sync(fx_cache.currencies):
+        raise HTTPException(status_code=400, detail=f"No exchange rates available for {devise}")
+
+    return await db.run_sync(financement_totals, devise, statuts=statut)
+
+
+@async_router.get("/indicators", response_model=List[IndicatorRollupResponse])
+async def get_indicator_rollup_async(
+    current_user: User = Depends(require_role_async(["admin"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Cross-project indicator rollup and progress, grouped by definition (admin only)"""
+    return await db.run_sync(indicator_rollup)
+
+
 @router.get("/export/pdf")
 def export_pdf(
     current_user: User = Depends(require_role(["admin"])),
     db: Session = Depends(get_db)
 ):
     """Export projects as PDF (admin only)"""
-    projects = db.query(Project).all()
-    pdf_data = generate_pdf_report(projects, db)
+    with EXPORT_DURATION.labels("pdf").time():
+        projects = db.query(Project).all()
+        pdf_data = generate_pdf_report(projects, db)
     
     return Response(
         content=pdf_data,
@@ -85,8 +172,9 @@ def export_excel(
     db: Session = Depends(get_db)
 ):
     """Export projects as Excel (admin only)"""
-    projects = db.query(Project).all()
-    excel_data = generate_excel_report(projects, db)
+    with EXPORT_DURATION.labels("excel").time():
+        projects = db.query(Project).all()
+        excel_data = generate_excel_report(projects, db)
     
     return Response(
         content=excel_data,
@@ -7,7 +7,8 @@ from schemas import UserCreate, UserUpdate, UserResponse
 from dependencies import get_current_user, require_role
 from security import get_password_hash, encrypt_field, decrypt_field
 from audit import log_audit, AuditAction
-from email_service import send_welcome_email
+from email_service import queue_welcome_email
+from auth_sessions import get_auth_session_store
 from datetime import datetime, timedelta
 from config import settings
 
@@ -47,7 +48,7 @@ def get_user(
 
 
 @router.post("", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def create_user(
+def create_user(
     user_data: UserCreate,
     request: Request,
     current_user: User = Depends(require_role(["admin"])),
@@ -78,14 +79,15 @@ async def create_user(
     )
     
     db.add(new_user)
+    
+    # Welcome email is sent by the background sender once the user is committed
+    queue_welcome_email(db, new_user.email, f"{new_user.prenom} {new_user.nom}")
+    
     db.commit()
     db.refresh(new_user)
     
     log_audit(db, current_user.id, AuditAction.USER_CREATED, "User", new_user.id, {"email": user_data.email}, request)
     
-    # Send welcome email
-    await send_welcome_email(new_user.email, f"{new_user.prenom} {new_user.nom}")
-    
     # Return response
     user_response = UserResponse.from_orm(new_user)
     if new_user.telephone:
@@ -124,6 +126,10 @@ def update_user(
     db.commit()
     db.refresh(user)
     
+    # A deactivated user loses its sessions immediately
+    if user_data.actif is False:
+        get_auth_session_store().bump_epoch(user.id)
+    
     log_audit(db, current_user.id, AuditAction.USER_UPDATED, "User", user.id, request=request)
     
     user_response = UserResponse.from_orm(user)
@@ -150,6 +156,7 @@ def delete_user(
     
     db.delete(user)
     db.commit()
+    get_auth_session_store().bump_epoch(user_id)
     
     log_audit(db, current_user.id, AuditAction.USER_DELETED, "User", user_id, request=request)
     
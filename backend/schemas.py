@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field, validator
-from typing import Optional, List
+from typing import Optional, List, Union
 from datetime import datetime, date
 from decimal import Decimal
 from models import UserRole, ProjectDomain, ProjectStatus, FinancementStatut
@@ -202,6 +202,7 @@ class IndicatorUpdate(BaseModel):
 class IndicatorResponse(IndicatorBase):
     id: int
     projet_id: int
+    definition_id: int
     saisi_par: int
     date_creation: datetime
     date_modification: datetime
@@ -210,7 +211,65 @@ class IndicatorResponse(IndicatorBase):
         from_attributes = True
 
 
+class IndicatorDefinitionUpdate(BaseModel):
+    unite: Optional[str] = None
+
+
+class IndicatorDefinitionResponse(BaseModel):
+    id: int
+    nom: str
+    unite: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class IndicatorRollupResponse(BaseModel):
+    definition_id: int
+    nom: str
+    unite: Optional[str] = None
+    nb_projets: int
+    total_valeur: Decimal
+    total_cible: Optional[Decimal] = None
+    progression: Optional[Decimal] = None
+
+
+class IndicatorLatestResponse(BaseModel):
+    projet_id: int
+    definition_id: int
+    nom: str
+    indicator_id: int
+    valeur: Decimal
+    valeur_cible: Optional[Decimal] = None
+    unite: Optional[str] = None
+    date_saisie: date
+    date_modification: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class IndicatorImportError(BaseModel):
+    line: int
+    errors: List[dict]
+
+
+class IndicatorImportResponse(BaseModel):
+    inserted: int
+    rejected: int
+    errors: List[IndicatorImportError] = []
+
+
 # Financement Schemas
+def validate_currency(v):
+    if v is None:
+        return v
+    v = v.strip().upper()
+    if len(v) != 3 or not v.isalpha():
+        raise ValueError('Currency must be a 3-letter ISO 4217 code')
+    return v
+
+
 class FinancementBase(BaseModel):
     montant: Decimal
     devise: str = "EUR"
@@ -223,6 +282,11 @@ class FinancementCreate(FinancementBase):
     projet_id: int
     donateur_id: int
 
+    # Only on input: responses must still serve legacy rows whose devise is not an ISO code
+    @validator('devise')
+    def validate_devise(cls, v):
+        return validate_currency(v)
+
 
 class FinancementUpdate(BaseModel):
     montant: Optional[Decimal] = None
@@ -231,6 +295,29 @@ class FinancementUpdate(BaseModel):
     statut: Optional[FinancementStatut] = None
     commentaire: Optional[str] = None
 
+    @validator('devise')
+    def validate_devise(cls, v):
+        return validate_currency(v)
+
+
+class FinancementBulkFilter(BaseModel):
+    projet_id: Optional[int] = None
+    donateur_id: Optional[int] = None
+    statut: Optional[FinancementStatut] = None
+    date_financement_max: Optional[date] = None
+
+
+class FinancementBulkStatusRequest(BaseModel):
+    ids: Optional[List[int]] = None
+    filtre: Optional[FinancementBulkFilter] = None
+    statut: FinancementStatut
+
+
+class FinancementBulkStatusResponse(BaseModel):
+    statut: FinancementStatut
+    updated: int
+    ids: List[int]
+
 
 class FinancementResponse(FinancementBase):
     id: int
@@ -262,11 +349,51 @@ class DocumentResponse(DocumentBase):
     url_stockage: str
     uploade_par: int
     date_upload: datetime
+    download_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    preview_url: Optional[str] = None
 
     class Config:
         from_attributes = True
 
 
+class UploadSessionCreate(BaseModel):
+    projet_id: int
+    nom_fichier: str
+    taille: int
+    description: Optional[str] = None
+
+    @validator('taille')
+    def validate_taille(cls, v):
+        if v <= 0:
+            raise ValueError('taille must be positive')
+        return v
+
+
+class UploadSessionResponse(BaseModel):
+    id: str
+    projet_id: int
+    nom_fichier: str
+    taille: int
+    offset: int
+    date_expiration: datetime
+
+
+class DocumentDownloadUrlsRequest(BaseModel):
+    ids: List[int]
+
+
+class DocumentDownloadUrl(BaseModel):
+    id: int
+    filename: str
+    download_url: Optional[str] = None
+
+
+class DocumentDownloadUrlsResponse(BaseModel):
+    urls: List[DocumentDownloadUrl]
+    not_found: List[int]
+
+
 # Audit Log Schema
 class AuditLogResponse(BaseModel):
     id: int
@@ -289,12 +416,53 @@ class KPIResponse(BaseModel):
     active_projects: int
     total_budget: Decimal
     total_financed: Decimal
+    total_financed_non_converti: dict = {}  # Amounts per currency without a rate on their date, not in total_financed
     total_donateurs: int
     average_satisfaction: Optional[Decimal] = None
     projects_by_domain: dict
     projects_by_status: dict
 
 
+class PortfolioProject(BaseModel):
+    projet_id: int
+    titre: str
+    statut: ProjectStatus
+    budget: Decimal
+    montant_donateur: Decimal
+    montant_recu: Decimal
+    taux_couverture: Optional[Decimal] = None
+    indicateurs: List[IndicatorLatestResponse] = []
+
+
+class PortfolioResponse(BaseModel):
+    devise: str
+    total: Decimal
+    par_statut: dict
+    non_converti: dict
+    projets: List[PortfolioProject] = []
+
+
+class FinancementTotalsResponse(BaseModel):
+    devise: str
+    total: Decimal
+    par_projet: dict
+    par_donateur: dict
+    par_statut: dict
+    non_converti: dict
+
+
+class SlowQueryResponse(BaseModel):
+    id: int
+    date: datetime
+    duree_ms: float
+    route: Optional[str] = None
+    moteur: str
+    requete: str
+    parametres: Union[dict, list, str]
+    explain: Optional[List[dict]] = None
+    explain_erreur: Optional[str] = None
+
+
 # Update forward references
 ProjectDetailResponse.model_rebuild()
 
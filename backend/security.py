@@ -6,21 +6,50 @@ from sqlalchemy.orm import Session
 from sqlalchemy import text
 from config import settings
 from models import User
+from concurrent.futures import ThreadPoolExecutor
 import bcrypt
+import threading
 
 # Password hashing context
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=12)
 
 
+class PasswordHasher:
+    """bcrypt runs on a bounded pool: at most `workers` hashes use the CPU at once, the rest queue"""
+
+    def __init__(self, workers: int):
+        self._executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="bcrypt")
+        self._queued = 0
+        self._lock = threading.Lock()
+
+    @property
+    def queue_depth(self) -> int:
+        """Hashes waiting for a worker"""
+        return self._queued
+
+    def _started(self, fn, *args):
+        with self._lock:
+            self._queued -= 1
+        return fn(*args)
+
+    def run(self, fn, *args):
+        with self._lock:
+            self._queued += 1
+        return self._executor.submit(self._started, fn, *args).result()
+
+
+password_hasher = PasswordHasher(settings.bcrypt_workers)
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against a bcrypt hash"""
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    """Verify a password against a bcrypt hash (blocking: call from sync routes)"""
+    return password_hasher.run(bcrypt.checkpw, plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
 
 def get_password_hash(password: str) -> str:
-    """Hash a password using bcrypt"""
+    """Hash a password using bcrypt (blocking: call from sync routes)"""
     salt = bcrypt.gensalt(rounds=12)
-    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+    return password_hasher.run(bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -79,6 +108,25 @@ def decrypt_field(db: Session, encrypted_value: bytes) -> Optional[str]:
         return None
 
 
+def decrypt_fields(db: Session, encrypted_values: list) -> list:
+    """Decrypt several fields in a single query (empty values stay None)"""
+    results = [None] * len(encrypted_values)
+    present = [i for i, value in enumerate(encrypted_values) if value]
+    if not present:
+        return results
+    columns = ", ".join(f"CAST(AES_DECRYPT(:v{n}, :key) AS CHAR)" for n in range(len(present)))
+    params = {f"v{n}": encrypted_values[i] for n, i in enumerate(present)}
+    params["key"] = settings.enc_key
+    try:
+        row = db.execute(text(f"SELECT {columns}"), params).one()
+    except Exception:
+        return results
+    for n, i in enumerate(present):
+        value = row[n]
+        results[i] = value.decode('utf-8') if isinstance(value, bytes) else value
+    return results
+
+
 def check_password_strength(password: str) -> tuple[bool, str]:
     """Check password strength according to policy"""
     if len(password) < settings.password_min_length:
@@ -94,45 +94,75 @@ SELECT
   (SELECT id FROM users WHERE email='admin@example.org' LIMIT 1)
 WHERE NOT EXISTS (SELECT 1 FROM projects WHERE titre = 'Projet ' || generate_series(3, 15));
 
+-- Indicator definitions (catalogue partagé ; cle = nom normalisé : sans accents, en minuscules)
+INSERT INTO indicator_definitions (cle, nom, unite)
+VALUES
+('nombre d''eleves inscrits', 'Nombre d''élèves inscrits', 'personnes'),
+('taux d''assiduite', 'Taux d''assiduité', '%'),
+('nombre de puits construits', 'Nombre de puits construits', 'puits')
+ON CONFLICT (cle) DO NOTHING;
+
+INSERT INTO indicator_definitions (cle, nom, unite)
+SELECT
+  'indicateur ' || n,
+  'Indicateur ' || n,
+  CASE n % 4
+    WHEN 0 THEN 'personnes'
+    WHEN 1 THEN '%'
+    WHEN 2 THEN 'unités'
+    ELSE 'kg'
+  END
+FROM generate_series(4, 50) AS n
+ON CONFLICT (cle) DO NOTHING;
+
 -- Indicators seed (50+ indicateurs pour demo)
-INSERT INTO indicators (projet_id, nom, valeur, valeur_cible, unite, date_saisie, periode, commentaire, saisi_par)
+INSERT INTO indicators (projet_id, definition_id, valeur, valeur_cible, date_saisie, periode, commentaire, saisi_par)
 VALUES
 ((SELECT id FROM projects WHERE titre='Éducation des filles rurales' LIMIT 1),
- 'Nombre d''élèves inscrits', 487, 500, 'personnes', '2024-04-15', 'Avril 2024', 'Campagne dans 5 villages terminée.', (SELECT id FROM users WHERE email='chef@example.org' LIMIT 1))
+ (SELECT id FROM indicator_definitions WHERE cle='nombre d''eleves inscrits'),
+ 487, 500, '2024-04-15', 'Avril 2024', 'Campagne dans 5 villages terminée.', (SELECT id FROM users WHERE email='chef@example.org' LIMIT 1))
 ON CONFLICT DO NOTHING;
 
-INSERT INTO indicators (projet_id, nom, valeur, valeur_cible, unite, date_saisie, periode, commentaire, saisi_par)
+INSERT INTO indicators (projet_id, definition_id, valeur, valeur_cible, date_saisie, periode, commentaire, saisi_par)
 VALUES
 ((SELECT id FROM projects WHERE titre='Éducation des filles rurales' LIMIT 1),
- 'Taux d''assiduité', 87, 90, '%', '2024-04-15', 'Avril 2024', NULL, (SELECT id FROM users WHERE email='chef@example.org' LIMIT 1))
+ (SELECT id FROM indicator_definitions WHERE cle='taux d''assiduite'),
+ 87, 90, '2024-04-15', 'Avril 2024', NULL, (SELECT id FROM users WHERE email='chef@example.org' LIMIT 1))
 ON CONFLICT DO NOTHING;
 
-INSERT INTO indicators (projet_id, nom, valeur, valeur_cible, unite, date_saisie, periode, commentaire, saisi_par)
+INSERT INTO indicators (projet_id, definition_id, valeur, valeur_cible, date_saisie, periode, commentaire, saisi_par)
 VALUES
 ((SELECT id FROM projects WHERE titre='Accès à l''eau potable - Région Est' LIMIT 1),
- 'Nombre de puits construits', 0, 10, 'puits', '2024-05-01', 'Mai 2024', 'Phase préparation.', (SELECT id FROM users WHERE email='chef@example.org' LIMIT 1))
+ (SELECT id FROM indicator_definitions WHERE cle='nombre de puits construits'),
+ 0, 10, '2024-05-01', 'Mai 2024', 'Phase préparation.', (SELECT id FROM users WHERE email='chef@example.org' LIMIT 1))
 ON CONFLICT DO NOTHING;
 
 -- Ajouter plus d'indicateurs (47 autres)
-INSERT INTO indicators (projet_id, nom, valeur, valeur_cible, unite, date_saisie, periode, saisi_par)
-SELECT 
+INSERT INTO indicators (projet_id, definition_id, valeur, valeur_cible, date_saisie, periode, saisi_par)
+SELECT
   p.id,
-  'Indicateur ' || generate_series(4, 50),
+  d.id,
   (random() * 1000)::numeric(14,4),
   (random() * 1200)::numeric(14,4),
-  CASE (random() * 4)::int
-    WHEN 0 THEN 'personnes'
-    WHEN 1 THEN '%'
-    WHEN 2 THEN 'unités'
-    ELSE 'kg'
-  END,
   '2024-01-01'::date + (random() * 365)::int,
-  'Période ' || generate_series(4, 50),
+  'Période ' || substr(d.nom, 12),
   (SELECT id FROM users WHERE email='chef@example.org' LIMIT 1)
 FROM projects p
-WHERE EXISTS (SELECT 1 FROM projects)
+JOIN indicator_definitions d ON d.cle LIKE 'indicateur %'
 LIMIT 47;
 
+-- Dernière valeur par projet et définition (maintenue par l'API, reconstruite ici)
+INSERT INTO indicator_latest (projet_id, definition_id, indicator_id, valeur, valeur_cible, date_saisie)
+SELECT projet_id, definition_id, id, valeur, valeur_cible, date_saisie
+FROM (
+  SELECT i.*, ROW_NUMBER() OVER (
+    PARTITION BY projet_id, definition_id ORDER BY date_saisie DESC, id DESC
+  ) AS rang
+  FROM indicators i
+) ranked
+WHERE rang = 1
+ON CONFLICT DO NOTHING;
+
 -- Financements seed
 INSERT INTO financements (projet_id, donateur_id, montant, devise, date_financement, statut, commentaire)
 VALUES
@@ -103,53 +103,82 @@ FROM (
 WHERE n <= 15
 AND NOT EXISTS (SELECT 1 FROM projects WHERE titre = CONCAT('Projet ', n));
 
+-- Indicator definitions (catalogue partagé ; cle = nom normalisé : sans accents, en minuscules)
+INSERT INTO indicator_definitions (cle, nom, unite)
+VALUES
+('nombre d''eleves inscrits', 'Nombre d''élèves inscrits', 'personnes'),
+('taux d''assiduite', 'Taux d''assiduité', '%'),
+('nombre de puits construits', 'Nombre de puits construits', 'puits')
+ON DUPLICATE KEY UPDATE cle=cle;
+
+INSERT INTO indicator_definitions (cle, nom, unite)
+SELECT
+  CONCAT('indicateur ', n),
+  CONCAT('Indicateur ', n),
+  CASE n % 4
+    WHEN 0 THEN 'personnes'
+    WHEN 1 THEN '%'
+    WHEN 2 THEN 'unités'
+    ELSE 'kg'
+  END
+FROM (
+  SELECT 4 + t1.n + t2.n*10 AS n
+  FROM (SELECT 0 AS n UNION SELECT 1 UNION SELECT 2 UNION SELECT 3 UNION SELECT 4 UNION SELECT 5 UNION SELECT 6 UNION SELECT 7 UNION SELECT 8 UNION SELECT 9) t1
+  CROSS JOIN (SELECT 0 AS n UNION SELECT 1 UNION SELECT 2 UNION SELECT 3 UNION SELECT 4) t2
+) numbers
+WHERE n <= 50
+ON DUPLICATE KEY UPDATE cle=cle;
+
 -- Indicators seed (50+ indicateurs pour demo)
-INSERT INTO indicators (projet_id, nom, valeur, valeur_cible, unite, date_saisie, periode, commentaire, saisi_par)
+INSERT INTO indicators (projet_id, definition_id, valeur, valeur_cible, date_saisie, periode, commentaire, saisi_par)
 VALUES
 ((SELECT id FROM projects WHERE titre='Éducation des filles rurales' LIMIT 1),
- 'Nombre d''élèves inscrits', 487, 500, 'personnes', '2024-04-15', 'Avril 2024', 'Campagne dans 5 villages terminée.', 
+ (SELECT id FROM indicator_definitions WHERE cle='nombre d''eleves inscrits'),
+ 487, 500, '2024-04-15', 'Avril 2024', 'Campagne dans 5 villages terminée.', 
  (SELECT id FROM users WHERE email='chef@example.org' LIMIT 1))
-ON DUPLICATE KEY UPDATE nom=nom;
+ON DUPLICATE KEY UPDATE definition_id=definition_id;
 
-INSERT INTO indicators (projet_id, nom, valeur, valeur_cible, unite, date_saisie, periode, commentaire, saisi_par)
+INSERT INTO indicators (projet_id, definition_id, valeur, valeur_cible, date_saisie, periode, commentaire, saisi_par)
 VALUES
 ((SELECT id FROM projects WHERE titre='Éducation des filles rurales' LIMIT 1),
- 'Taux d''assiduité', 87, 90, '%', '2024-04-15', 'Avril 2024', NULL, 
+ (SELECT id FROM indicator_definitions WHERE cle='taux d''assiduite'),
+ 87, 90, '2024-04-15', 'Avril 2024', NULL, 
  (SELECT id FROM users WHERE email='chef@example.org' LIMIT 1))
-ON DUPLICATE KEY UPDATE nom=nom;
+ON DUPLICATE KEY UPDATE definition_id=definition_id;
 
-INSERT INTO indicators (projet_id, nom, valeur, valeur_cible, unite, date_saisie, periode, commentaire, saisi_par)
+INSERT INTO indicators (projet_id, definition_id, valeur, valeur_cible, date_saisie, periode, commentaire, saisi_par)
 VALUES
 ((SELECT id FROM projects WHERE titre='Accès à l''eau potable - Région Est' LIMIT 1),
- 'Nombre de puits construits', 0, 10, 'puits', '2024-05-01', 'Mai 2024', 'Phase préparation.', 
+ (SELECT id FROM indicator_definitions WHERE cle='nombre de puits construits'),
+ 0, 10, '2024-05-01', 'Mai 2024', 'Phase préparation.', 
  (SELECT id FROM users WHERE email='chef@example.org' LIMIT 1))
-ON DUPLICATE KEY UPDATE nom=nom;
+ON DUPLICATE KEY UPDATE definition_id=definition_id;
 
 -- Ajouter plus d'indicateurs (47 autres)
-INSERT INTO indicators (projet_id, nom, valeur, valeur_cible, unite, date_saisie, periode, saisi_par)
+INSERT INTO indicators (projet_id, definition_id, valeur, valeur_cible, date_saisie, periode, saisi_par)
 SELECT 
   p.id,
-  CONCAT('Indicateur ', n),
+  d.id,
   ROUND(RAND() * 1000, 4),
   ROUND(RAND() * 1200, 4),
-  CASE FLOOR(RAND() * 4)
-    WHEN 0 THEN 'personnes'
-    WHEN 1 THEN '%'
-    WHEN 2 THEN 'unités'
-    ELSE 'kg'
-  END,
   DATE_ADD('2024-01-01', INTERVAL FLOOR(RAND() * 365) DAY),
-  CONCAT('Période ', n),
+  CONCAT('Période ', SUBSTRING(d.nom, 12)),
   (SELECT id FROM users WHERE email='chef@example.org' LIMIT 1)
-FROM (
-  SELECT 4 + t1.n + t2.n*10 AS n
-  FROM (SELECT 0 AS n UNION SELECT 1 UNION SELECT 2 UNION SELECT 3 UNION SELECT 4 UNION SELECT 5 UNION SELECT 6 UNION SELECT 7 UNION SELECT 8 UNION SELECT 9) t1
-  CROSS JOIN (SELECT 0 AS n UNION SELECT 1 UNION SELECT 2 UNION SELECT 3 UNION SELECT 4) t2
-) numbers
-CROSS JOIN projects p
-WHERE n <= 50
+FROM projects p
+JOIN indicator_definitions d ON d.cle LIKE 'indicateur %'
 LIMIT 47;
 
+-- Dernière valeur par projet et définition (maintenue par l'API, reconstruite ici)
+INSERT IGNORE INTO indicator_latest (projet_id, definition_id, indicator_id, valeur, valeur_cible, date_saisie)
+SELECT projet_id, definition_id, id, valeur, valeur_cible, date_saisie
+FROM (
+  SELECT i.*, ROW_NUMBER() OVER (
+    PARTITION BY projet_id, definition_id ORDER BY date_saisie DESC, id DESC
+  ) AS rang
+  FROM indicators i
+) ranked
+WHERE rang = 1;
+
 -- Financements seed
 INSERT INTO financements (projet_id, donateur_id, montant, devise, date_financement, statut, commentaire)
 VALUES
@@ -0,0 +1,131 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from datetime import datetime
+from itertools import count
+from typing import Optional
+from config import settings
+from database import engine, replica_engine, async_engine, async_replica_engine
+import logging
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Literals and driver placeholders (?, %s, %(name)s, :name) all become ?, expanded IN lists become IN (...)
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|(?<!:):\w+|\?")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_EXPLAINABLE = ("select", "with")
+MAX_PENDING_EXPLAINS = 20
+
+
+def normalize_sql(statement: str) -> str:
+    """One line per query shape, without values"""
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _PLACEHOLDER.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    statement = _IN_LIST.sub("(...)", statement)
+    return " ".join(statement.split())
+
+
+def redact_parameters(parameters, executemany: bool):
+    """Parameter types only; values may be personal or encrypted data"""
+    if executemany:
+        return f"{len(parameters)} rows"
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    return [type(value).__name__ for value in parameters or ()]
+
+
+def _json_value(value):
+    return value if value is None or isinstance(value, (int, float, str)) else str(value)
+
+
+class SlowQueryLog:
+    """The last slow statements, with their EXPLAIN plan captured off the request path"""
+
+    def __init__(self, threshold_ms: int, max_entries: int, explain: bool):
+        self.threshold = threshold_ms / 1000
+        self.explain = explain
+        self._entries = deque(maxlen=max_entries)
+        self._ids = count(1)
+        self._lock = threading.Lock()
+        self._pending_explains = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    def record(self, conn, statement: str, parameters, executemany: bool, duration: float, route: Optional[str]):
+        entry = {
+            "id": next(self._ids),
+            "date": datetime.utcnow(),
+            "duree_ms": round(duration * 1000, 1),
+            "route": route,
+            "moteur": conn.engine.pool.logging_name or "default",
+            "requete": normalize_sql(statement),
+            "parametres": redact_parameters(parameters, executemany),
+            "explain": None,
+            "explain_erreur": None,
+        }
+        with self._lock:
+            self._entries.append(entry)
+        logger.warning(
+            "Slow query (%.0f ms) on %s: %s", entry["duree_ms"], route or "background job", entry["requete"][:500]
+        )
+        if self.explain and not executemany and statement.lstrip().lower().startswith(_EXPLAINABLE):
+            self._submit_explain(entry, conn.engine, statement, parameters)
+
+    def _submit_explain(self, entry: dict, db_engine, statement: str, parameters):
+        with self._lock:
+            if self._pending_explains >= MAX_PENDING_EXPLAINS:
+                entry["explain_erreur"] = "File d'EXPLAIN pleine"
+                return
+            self._pending_explains += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+        self._executor.submit(self._run_explain, entry, db_engine, statement, parameters)
+
+    def _run_explain(self, entry: dict, db_engine, statement: str, parameters):
+        try:
+            entry["explain"] = explain(db_engine, statement, parameters)
+        except Exception as e:
+            entry["explain_erreur"] = f"{type(e).__name__}: {e}"
+        finally:
+            with self._lock:
+                self._pending_explains -= 1
+
+    def entries(self, limit: int) -> list:
+        """Most recent first"""
+        with self._lock:
+            return [dict(entry) for entry in reversed(self._entries)][:limit]
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def explain(db_engine, statement: str, parameters) -> list:
+    """EXPLAIN a statement with its original parameters on a raw connection (no events, so no recursion)"""
+    # Async engines cannot be driven from a plain thread; their synchronous twin reaches the same database
+    if async_engine is not None and db_engine is async_engine.sync_engine:
+        db_engine = engine
+    elif async_replica_engine is not None and db_engine is async_replica_engine.sync_engine:
+        db_engine = replica_engine
+    prefix = "EXPLAIN QUERY PLAN " if db_engine.dialect.name == "sqlite" else "EXPLAIN "
+    connection = db_engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(prefix + statement, parameters)
+        columns = [column[0] for column in cursor.description]
+        rows = [{name: _json_value(value) for name, value in zip(columns, row)} for row in cursor.fetchall()]
+        cursor.close()
+        return rows
+    finally:
+        connection.close()
+
+
+slow_query_log = SlowQueryLog(settings.slow_query_threshold_ms, settings.slow_query_log_size, settings.slow_query_explain)
@@ -1,98 +1,431 @@
-import boto3
 from botocore.exceptions import ClientError
 from config import settings
-from typing import BinaryIO, Optional
-import uuid
+from cache import TTLCache
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Dict, Iterator, List, Optional
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import hashlib
+import hmac
+import os
+import shutil
+import tempfile
+import time
 from datetime import timedelta
 
-# Initialize S3 client
-s3_client = None
-if settings.s3_access_key_id and settings.s3_secret_access_key:
-    s3_client = boto3.client(
-        's3',
-        endpoint_url=settings.s3_endpoint_url,
-        aws_access_key_id=settings.s3_access_key_id,
-        aws_secret_access_key=settings.s3_secret_access_key,
-        region_name=settings.s3_region
-    )
+LOCAL_COPY_CHUNK_SIZE = 1024 * 1024
+S3_DELETE_BATCH_SIZE = 1000
+
+
+def _size_exceeded_error() -> ValueError:
+    return ValueError(f"File size exceeds maximum allowed size of {settings.max_upload_size_mb}MB")
+
+
+class StorageBackend(ABC):
+    """Interface implemented by the storage drivers; stored URLs are <scheme>://<location>/<key>"""
+    scheme = ""
+
+    @abstractmethod
+    def url_for(self, key: str) -> str:
+        ...
+
+    @abstractmethod
+    def key_from_url(self, url: str) -> str:
+        ...
+
+    @abstractmethod
+    def upload(self, file_content: BinaryIO, key: str, content_type: str) -> int:
+        """Store the file under key and return its size"""
+
+    @abstractmethod
+    def download(self, key: str, file_obj: BinaryIO):
+        """Write the stored file into file_obj"""
+
+    @abstractmethod
+    def iter_chunks(self, key: str, chunk_size: int = LOCAL_COPY_CHUNK_SIZE) -> Iterator[bytes]:
+        """Stream the stored file in chunks"""
+
+    @abstractmethod
+    def presigned_url(self, key: str, expiration: int = 3600) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def delete_many(self, keys: List[str]) -> Dict[str, str]:
+        """Delete several files; returns the error of each key that could not be deleted"""
+
+
+class S3Storage(StorageBackend):
+    """S3 (or S3-compatible) bucket"""
+    scheme = "s3"
+
+    def __init__(self):
+        self.bucket = settings.s3_bucket_name
+        self.client = None
+        if settings.s3_access_key_id and settings.s3_secret_access_key:
+            import boto3  # Slow import, only paid once S3 is used
+
+            self.client = boto3.client(
+                's3',
+                endpoint_url=settings.s3_endpoint_url,
+                aws_access_key_id=settings.s3_access_key_id,
+                aws_secret_access_key=settings.s3_secret_access_key,
+                region_name=settings.s3_region
+            )
+
+    def url_for(self, key: str) -> str:
+        return f"s3://{self.bucket}/{key}"
+
+    def key_from_url(self, url: str) -> str:
+        # Older rows may hold a bare key
+        return url.replace(f"s3://{self.bucket}/", "")
+
+    def _upload_part(self, key: str, upload_id: str, part_number: int, data: bytes) -> dict:
+        response = self.client.upload_part(
+            Bucket=self.bucket,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=data
+        )
+        return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+    def _multipart_upload(
+        self,
+        file_content: BinaryIO,
+        key: str,
+        content_type: str,
+        first_chunk: bytes,
+        part_size: int,
+        max_size: int
+    ) -> int:
+        """Stream file chunks to an S3 multipart upload, with a bounded number of parts in flight"""
+        upload_id = self.client.create_multipart_upload(
+            Bucket=self.bucket,
+            Key=key,
+            ContentType=content_type
+        )["UploadId"]
+
+        concurrency = max(settings.s3_upload_concurrency, 1)
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        pending = set()
+        parts = []
+        file_size = 0
+        try:
+            chunk = first_chunk
+            part_number = 1
+            while chunk:
+                file_size += len(chunk)
+                if file_size > max_size:
+                    raise _size_exceeded_error()
+
+                # Memory stays bounded by (concurrency + 1) parts
+                if len(pending) >= concurrency:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    parts.extend(future.result() for future in done)
+                pending.add(executor.submit(self._upload_part, key, upload_id, part_number, chunk))
+                part_number += 1
+                chunk = file_content.read(part_size)
+
+            parts.extend(future.result() for future in wait(pending).done)
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": sorted(parts, key=lambda part: part["PartNumber"])}
+            )
+            return file_size
+        except BaseException:
+            executor.shutdown(wait=True, cancel_futures=True)
+            self.client.abort_multipart_upload(
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload_id
+            )
+            raise
+        finally:
+            executor.shutdown(wait=False)
+
+    def upload(self, file_content: BinaryIO, key: str, content_type: str) -> int:
+        """Stream file to S3 (multipart above one part) and return its size"""
+        if not self.client:
+            raise Exception("S3 client not configured")
+
+        max_size = settings.max_upload_size_mb * 1024 * 1024
+        part_size = max(settings.s3_multipart_chunk_mb, 5) * 1024 * 1024
+
+        file_content.seek(0)
+        first_chunk = file_content.read(part_size)
+
+        try:
+            if len(first_chunk) < part_size:
+                # Small file: a single request
+                if len(first_chunk) > max_size:
+                    raise _size_exceeded_error()
+                self.client.put_object(
+                    Bucket=self.bucket,
+                    Key=key,
+                    Body=first_chunk,
+                    ContentType=content_type
+                )
+                return len(first_chunk)
+            return self._multipart_upload(file_content, key, content_type, first_chunk, part_size, max_size)
+        except ClientError as e:
+            raise Exception(f"Failed to upload file to S3: {str(e)}")
+
+    def download(self, key: str, file_obj: BinaryIO):
+        """Download S3 object into file_obj"""
+        if not self.client:
+            raise Exception("S3 client not configured")
+        self.client.download_fileobj(self.bucket, key, file_obj)
+
+    def iter_chunks(self, key: str, chunk_size: int = LOCAL_COPY_CHUNK_SIZE) -> Iterator[bytes]:
+        """Stream S3 object in chunks"""
+        if not self.client:
+            raise Exception("S3 client not configured")
+        body = self.client.get_object(Bucket=self.bucket, Key=key)["Body"]
+        try:
+            yield from body.iter_chunks(chunk_size)
+        finally:
+            body.close()
+
+    def presigned_url(self, key: str, expiration: int = 3600) -> Optional[str]:
+        """Generate presigned URL for S3 object"""
+        if not self.client:
+            return None
+
+        try:
+            return self.client.generate_presigned_url(
+                'get_object',
+                Params={'Bucket': self.bucket, 'Key': key},
+                ExpiresIn=expiration
+            )
+        except ClientError:
+            return None
+
+    def delete(self, key: str) -> bool:
+        """Delete file from S3"""
+        if not self.client:
+            return False
+
+        try:
+            self.client.delete_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError:
+            return False
+
+    def delete_many(self, keys: List[str]) -> Dict[str, str]:
+        """Delete objects with DeleteObjects, 1000 keys per request"""
+        if not self.client:
+            return {key: "S3 client not configured" for key in keys}
+
+        errors = {}
+        for start in range(0, len(keys), S3_DELETE_BATCH_SIZE):
+            batch = keys[start:start + S3_DELETE_BATCH_SIZE]
+            try:
+                response = self.client.delete_objects(
+                    Bucket=self.bucket,
+                    Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True}
+                )
+            except ClientError as e:
+                errors.update({key: str(e) for key in batch})
+                continue
+            for error in response.get("Errors", []):
+                errors[error["Key"]] = f"{error.get('Code')}: {error.get('Message')}"
+        return errors
+
+
+class LocalStorage(StorageBackend):
+    """Directory on the local filesystem, served by GET /documents/files/{key} with signed URLs"""
+    scheme = "local"
+
+    def __init__(self):
+        self.root = os.path.abspath(settings.local_storage_path)
+
+    def url_for(self, key: str) -> str:
+        return f"local://{key}"
+
+    def key_from_url(self, url: str) -> str:
+        return url.replace("local://", "", 1)
+
+    def path_for(self, key: str) -> str:
+        """Absolute path of a key, refusing anything outside the storage root"""
+        path = os.path.abspath(os.path.join(self.root, key))
+        if os.path.commonpath([self.root, path]) != self.root or path == self.root:
+            raise ValueError("Invalid storage key")
+        return path
+
+    def upload(self, file_content: BinaryIO, key: str, content_type: str) -> int:
+        """Copy file to disk in chunks (atomic rename) and return its size"""
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        max_size = settings.max_upload_size_mb * 1024 * 1024
+
+        file_content.seek(0)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".upload-")
+        file_size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    chunk = file_content.read(LOCAL_COPY_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    file_size += len(chunk)
+                    if file_size > max_size:
+                        raise _size_exceeded_error()
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+            return file_size
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def download(self, key: str, file_obj: BinaryIO):
+        """Copy file from disk into file_obj"""
+        with open(self.path_for(key), "rb") as f:
+            shutil.copyfileobj(f, file_obj, LOCAL_COPY_CHUNK_SIZE)
+
+    def iter_chunks(self, key: str, chunk_size: int = LOCAL_COPY_CHUNK_SIZE) -> Iterator[bytes]:
+        """Stream file from disk in chunks"""
+        with open(self.path_for(key), "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    @staticmethod
+    def sign(key: str, expires: int) -> str:
+        message = f"{key}:{expires}".encode()
+        return hmac.new(settings.jwt_secret.encode(), message, hashlib.sha256).hexdigest()
+
+    def verify(self, key: str, expires: int, signature: str) -> bool:
+        """Check a download URL signature and expiry"""
+        if expires < time.time():
+            return False
+        return hmac.compare_digest(self.sign(key, expires), signature)
+
+    def presigned_url(self, key: str, expiration: int = 3600) -> Optional[str]:
+        """Generate an expiring signed URL to the local file endpoint"""
+        expires = int(time.time()) + expiration
+        return (
+            f"{settings.local_storage_base_url}{settings.api_v1_prefix}/documents/files/{key}"
+            f"?expires={expires}&signature={self.sign(key, expires)}"
+        )
+
+    def delete(self, key: str) -> bool:
+        """Delete file from disk"""
+        try:
+            os.unlink(self.path_for(key))
+            return True
+        except (OSError, ValueError):
+            return False
+
+    def delete_many(self, keys: List[str]) -> Dict[str, str]:
+        """Delete files from disk (already missing files count as deleted)"""
+        errors = {}
+        for key in keys:
+            try:
+                os.unlink(self.path_for(key))
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                errors[key] = str(e)
+        return errors
+
+
+# Presigned URLs keyed by stored URL; entries expire before the URLs they hold
+presigned_url_cache = TTLCache(
+    max(settings.presigned_url_expiration_seconds - settings.presigned_url_refresh_margin_seconds, 0),
+    name="presigned_urls"
+)
+
+
+STORAGE_BACKENDS = {
+    S3Storage.scheme: S3Storage,
+    LocalStorage.scheme: LocalStorage
+}
+_storages = {}
+
+
+def get_storage(scheme: Optional[str] = None) -> StorageBackend:
+    """Storage driver for a scheme (the configured STORAGE_BACKEND by default)"""
+    scheme = scheme or settings.storage_backend
+    if scheme not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend: {scheme}")
+    if scheme not in _storages:
+        _storages[scheme] = STORAGE_BACKENDS[scheme]()
+    return _storages[scheme]
+
+
+def storage_for_url(url: str) -> tuple[StorageBackend, str]:
+    """Resolve a stored URL to its driver and key"""
+    scheme = url.split("://", 1)[0] if "://" in url else S3Storage.scheme
+    storage = get_storage(scheme)
+    return storage, storage.key_from_url(url)
+
+
+def hash_file(file_content: BinaryIO) -> tuple[str, int]:
+    """SHA-256 and size of a file, read in chunks and checked against the upload limit"""
+    max_size = settings.max_upload_size_mb * 1024 * 1024
+    digest = hashlib.sha256()
+    file_size = 0
+    
+    file_content.seek(0)
+    while True:
+        chunk = file_content.read(LOCAL_COPY_CHUNK_SIZE)
+        if not chunk:
+            break
+        file_size += len(chunk)
+        if file_size > max_size:
+            raise _size_exceeded_error()
+        digest.update(chunk)
+    file_content.seek(0)
+    
+    return digest.hexdigest(), file_size
+
+
+def content_key(sha256: str, filename: str) -> str:
+    """Content-addressed storage key (the extension keeps content types guessable)"""
+    file_extension = filename.split('.')[-1].lower() if '.' in filename else ''
+    key = f"objects/{sha256[:2]}/{sha256}"
+    return f"{key}.{file_extension}" if file_extension else key
 
 
 def upload_file(
     file_content: BinaryIO,
-    filename: str,
-    project_id: int,
+    key: str,
     content_type: str
 ) -> tuple[str, int]:
-    """Upload file to S3 and return URL and size"""
-    if not s3_client:
-        raise Exception("S3 client not configured")
-    
-    # Generate unique filename
-    file_extension = filename.split('.')[-1] if '.' in filename else ''
-    unique_filename = f"{uuid.uuid4()}.{file_extension}" if file_extension else str(uuid.uuid4())
-    s3_key = f"projects/{project_id}/{unique_filename}"
-    
-    # Read file content
-    file_content.seek(0)
-    file_data = file_content.read()
-    file_size = len(file_data)
-    
-    # Check file size
-    max_size = settings.max_upload_size_mb * 1024 * 1024
-    if file_size > max_size:
-        raise ValueError(f"File size exceeds maximum allowed size of {settings.max_upload_size_mb}MB")
-    
-    # Upload to S3
-    try:
-        s3_client.put_object(
-            Bucket=settings.s3_bucket_name,
-            Key=s3_key,
-            Body=file_data,
-            ContentType=content_type
-        )
-        
-        # Generate URL
-        url = f"s3://{settings.s3_bucket_name}/{s3_key}"
-        
-        return url, file_size
-    except ClientError as e:
-        raise Exception(f"Failed to upload file to S3: {str(e)}")
-
-
-def get_presigned_url(s3_key: str, expiration: int = 3600) -> Optional[str]:
-    """Generate presigned URL for S3 object"""
-    if not s3_client:
-        return None
-    
-    try:
-        # Extract key from s3:// URL if needed
-        if s3_key.startswith("s3://"):
-            s3_key = s3_key.replace(f"s3://{settings.s3_bucket_name}/", "")
-        
-        url = s3_client.generate_presigned_url(
-            'get_object',
-            Params={'Bucket': settings.s3_bucket_name, 'Key': s3_key},
-            ExpiresIn=expiration
-        )
-        return url
-    except ClientError:
-        return None
+    """Upload file to the configured storage under key and return URL and size"""
+    storage = get_storage()
+    file_size = storage.upload(file_content, key, content_type)
+    return storage.url_for(key), file_size
 
 
-def delete_file(s3_key: str) -> bool:
-    """Delete file from S3"""
-    if not s3_client:
-        return False
+def get_presigned_url(url: str, expiration: Optional[int] = None) -> Optional[str]:
+    """Get a temporary download URL for a stored file, reusing a cached one until shortly before expiry"""
+    expiration = expiration or settings.presigned_url_expiration_seconds
+    cached = presigned_url_cache.get(url)
+    if cached is not None and cached[0] == expiration:
+        return cached[1]
     
-    try:
-        # Extract key from s3:// URL if needed
-        if s3_key.startswith("s3://"):
-            s3_key = s3_key.replace(f"s3://{settings.s3_bucket_name}/", "")
-        
-        s3_client.delete_object(Bucket=settings.s3_bucket_name, Key=s3_key)
-        return True
-    except ClientError:
-        return False
+    storage, key = storage_for_url(url)
+    presigned_url = storage.presigned_url(key, expiration)
+    reuse_seconds = expiration - settings.presigned_url_refresh_margin_seconds
+    if presigned_url and reuse_seconds > 0:
+        presigned_url_cache.set(url, (expiration, presigned_url), ttl_seconds=reuse_seconds)
+    return presigned_url
+
+
+def delete_file(url: str) -> bool:
+    """Delete a stored file"""
+    storage, key = storage_for_url(url)
+    presigned_url_cache.delete(url)
+    return storage.delete(key)
 
 
 def validate_file_type(filename: str) -> bool:
@@ -0,0 +1,72 @@
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import StorageDeletion
+from config import settings
+from storage import storage_for_url, presigned_url_cache
+from typing import Optional
+from datetime import datetime, timedelta
+
+
+def enqueue_deletion(db: Session, url_stockage: str, sha256: Optional[str] = None):
+    """Queue a stored file for deletion, committed with the caller's transaction"""
+    presigned_url_cache.delete(url_stockage)
+    db.add(StorageDeletion(url_stockage=url_stockage, sha256=sha256, prochain_essai=datetime.utcnow()))
+
+
+def cancel_deletions(db: Session, sha256: str):
+    """Drop pending deletions of content that is being stored again.
+
+    Waits for a worker currently deleting those files, so the new upload
+    always happens after the old copy is gone.
+    """
+    db.query(StorageDeletion).filter(StorageDeletion.sha256 == sha256).delete(synchronize_session=False)
+
+
+def _retry_delay(tentatives: int) -> timedelta:
+    delay = settings.storage_deletion_retry_base_seconds * 2 ** (tentatives - 1)
+    return timedelta(seconds=min(delay, settings.storage_deletion_retry_max_seconds))
+
+
+def drain_storage_deletions() -> int:
+    """Delete due queued files in batches; failures are retried with exponential backoff"""
+    batch_size = max(min(settings.storage_deletion_batch_size, 1000), 1)
+    processed = 0
+
+    while True:
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            deletions = db.query(StorageDeletion).filter(
+                StorageDeletion.prochain_essai <= now
+            ).order_by(StorageDeletion.id).limit(batch_size).with_for_update(skip_locked=True).all()
+            if not deletions:
+                return processed
+
+            by_storage = {}
+            for deletion in deletions:
+                try:
+                    storage, key = storage_for_url(deletion.url_stockage)
+                except ValueError as e:
+                    deletion.tentatives += 1
+                    deletion.derniere_erreur = str(e)
+                    deletion.prochain_essai = now + _retry_delay(deletion.tentatives)
+                    continue
+                by_storage.setdefault(storage, {}).setdefault(key, []).append(deletion)
+
+            for storage, deletions_by_key in by_storage.items():
+                errors = storage.delete_many(list(deletions_by_key))
+                for key, key_deletions in deletions_by_key.items():
+                    for deletion in key_deletions:
+                        if key in errors:
+                            deletion.tentatives += 1
+                            deletion.derniere_erreur = errors[key]
+                            deletion.prochain_essai = now + _retry_delay(deletion.tentatives)
+                        else:
+                            db.delete(deletion)
+
+            db.commit()
+            processed += len(deletions)
+            if len(deletions) < batch_size:
+                return processed
+        finally:
+            db.close()
@@ -0,0 +1,47 @@
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import StoredObject
+from storage import hash_file, content_key, upload_file
+from storage_deletions import enqueue_deletion, cancel_deletions
+from typing import BinaryIO
+
+
+def store_file(db: Session, file_content: BinaryIO, filename: str, content_type: str) -> StoredObject:
+    """Take a reference on the stored copy of a file, uploading it only if the content is new"""
+    sha256, _ = hash_file(file_content)
+    
+    stored = db.query(StoredObject).filter(StoredObject.sha256 == sha256).with_for_update().first()
+    if stored is not None:
+        # Duplicate content: metadata only
+        stored.ref_count += 1
+        return stored
+    
+    cancel_deletions(db, sha256)
+    url_stockage, file_size = upload_file(file_content, content_key(sha256, filename), content_type)
+    try:
+        with db.begin_nested():
+            stored = StoredObject(sha256=sha256, url_stockage=url_stockage, taille=file_size, ref_count=1)
+            db.add(stored)
+    except IntegrityError:
+        # Same content stored concurrently by another request
+        stored = db.query(StoredObject).filter(StoredObject.sha256 == sha256).with_for_update().one()
+        stored.ref_count += 1
+    
+    return stored
+
+
+def release_stored_object(db: Session, objet_id: int, count: int = 1) -> bool:
+    """Drop references on a stored object; the last one deletes the row and queues its files for deletion"""
+    stored = db.query(StoredObject).filter(StoredObject.id == objet_id).with_for_update().first()
+    if stored is None:
+        return False
+    
+    stored.ref_count -= count
+    if stored.ref_count > 0:
+        return False
+    
+    db.delete(stored)
+    for url in (stored.url_stockage, stored.url_miniature, stored.url_apercu):
+        if url:
+            enqueue_deletion(db, url, stored.sha256)
+    return True
@@ -0,0 +1,88 @@
+"""Test settings, applied before the application modules read them, and shared fixtures"""
+import os
+import sys
+import tempfile
+from datetime import date
+from types import SimpleNamespace
+
+TEST_DIR = tempfile.mkdtemp(prefix="impacttracker_tests_")
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(TEST_DIR, 'tests.sqlite')}")
+os.environ.setdefault("DEBUG", "False")
+os.environ.setdefault("BACKGROUND_WORKERS_ENABLED", "false")
+os.environ.setdefault("AUTH_SESSION_BACKEND", "memory")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("SCHEMA_REVISION_CHECK", "off")
+os.environ.setdefault("RAISE_ON_LAZY_LOAD", "true")  # A relationship loaded lazily is an N+1 path: fail the test
+os.environ.setdefault("QUERY_STATS_ENABLED", "true")  # Server-Timing query counts, N+1 warnings
+os.environ.setdefault("ASYNC_DB_ENABLED", "true")  # aiosqlite: the async read routes are tested too
+os.environ.setdefault("STORAGE_BACKEND", "local")
+os.environ.setdefault("LOCAL_STORAGE_PATH", os.path.join(TEST_DIR, "storage"))
+os.environ.setdefault("UPLOAD_SESSIONS_PATH", os.path.join(TEST_DIR, "upload_sessions"))
+
+import pytest
+from sqlalchemy import BigInteger
+from sqlalchemy.ext.compiler import compiles
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_big_integer(type_, compiler, **kw):
+    # SQLite only autoincrements INTEGER PRIMARY KEY columns
+    return "INTEGER"
+
+
+@pytest.fixture
+def db():
+    from database import Base, SessionLocal, engine
+    import models  # noqa: F401 (registers the tables)
+
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+
+def auth_headers(user) -> dict:
+    from security import create_access_token
+
+    token = create_access_token({"sub": str(user.id), "email": user.email, "role": user.role.value})
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def users(db):
+    """An admin, a project manager and a donor; the manager runs projet_chef, the admin projet_admin"""
+    from models import Project, ProjectDomain, ProjectStatus, User, UserRole
+
+    # bcrypt hash of no password in particular: tests authenticate with tokens
+    password_hash = "$2b$04$abcdefghijklmnopqrstuu5Zx8m3c5U6dQ8p0m6Zb7zT4w1y2r3s."
+    admin, chef, donateur = (
+        User(email=f"{role.value}@example.org", mot_de_passe_hash=password_hash, nom=role.value, prenom="Test",
+             role=role, actif=True)
+        for role in (UserRole.ADMIN, UserRole.CHEF_PROJET, UserRole.DONATEUR)
+    )
+    db.add_all([admin, chef, donateur])
+    db.commit()
+    projet_chef = Project(
+        titre="Forages", description="Forages villageois", domaine=ProjectDomain.EAU, localisation="Thiès",
+        pays="SN", date_debut=date(2024, 1, 1), budget=10000, statut=ProjectStatus.EN_COURS, chef_projet_id=chef.id
+    )
+    projet_admin = Project(
+        titre="Dispensaire", description="Dispensaire rural", domaine=ProjectDomain.SANTE, localisation="Kaolack",
+        pays="SN", date_debut=date(2024, 1, 1), budget=5000, statut=ProjectStatus.PLANIFIE, chef_projet_id=admin.id
+    )
+    db.add_all([projet_chef, projet_admin])
+    db.commit()
+    return SimpleNamespace(admin=admin, chef=chef, donateur=donateur, projet_chef=projet_chef, projet_admin=projet_admin)
+
+
+@pytest.fixture
+def client(db):
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
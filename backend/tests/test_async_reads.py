@@ -0,0 +1,146 @@
+"""The async read routes (ASYNC_DB_ENABLED) answer like their sync twins, role filtering included"""
+import asyncio
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import dependencies
+from conftest import auth_headers
+from config import settings
+from indicator_definitions import get_or_create_definition
+from indicator_latest import refresh_indicator_latest
+from models import Financement, FinancementStatut, Indicator
+from routes import financements, indicators, projects, stats
+
+ROUTE_MODULES = (projects, indicators, financements, stats)
+ROLES = ("admin", "chef", "donateur")
+
+
+def build_app(use_async: bool) -> FastAPI:
+    app = FastAPI()
+    if use_async:
+        for module in ROUTE_MODULES:
+            app.include_router(module.async_router, prefix=settings.api_v1_prefix)
+    for module in ROUTE_MODULES:
+        app.include_router(module.router, prefix=settings.api_v1_prefix)
+    return app
+
+
+sync_client = TestClient(build_app(use_async=False))
+async_client = TestClient(build_app(use_async=True))
+
+
+@pytest.fixture
+def data(db, users):
+    """The donor funds the manager's project; both projects have indicators"""
+    financement = Financement(
+        projet_id=users.projet_chef.id, donateur_id=users.donateur.id, montant=Decimal("1500.00"), devise="EUR",
+        date_financement=date(2024, 3, 1), statut=FinancementStatut.RECU
+    )
+    db.add(financement)
+    definition = get_or_create_definition(db, "Nombre de forages", "forages")
+    measurements = [
+        Indicator(projet_id=projet.id, definition_id=definition.id, valeur=valeur, date_saisie=date_saisie,
+                  saisi_par=users.admin.id)
+        for projet, valeur, date_saisie in (
+            (users.projet_chef, 3, date(2024, 1, 1)),
+            (users.projet_chef, 5, date(2024, 6, 1)),
+            (users.projet_admin, 2, date(2024, 2, 1)),
+        )
+    ]
+    db.add_all(measurements)
+    for projet in (users.projet_chef, users.projet_admin):
+        refresh_indicator_latest(db, projet.id, definition.id)
+    db.commit()
+    return {
+        "users": {"admin": users.admin, "chef": users.chef, "donateur": users.donateur},
+        "projet_chef": users.projet_chef.id,
+        "projet_admin": users.projet_admin.id,
+        "financement": financement.id,
+        "indicator_chef": measurements[0].id,
+        "indicator_admin": measurements[2].id,
+    }
+
+
+def assert_same_answers(data, paths):
+    for role in ROLES:
+        headers = auth_headers(data["users"][role])
+        for path in paths:
+            expected = sync_client.get(settings.api_v1_prefix + path, headers=headers)
+            actual = async_client.get(settings.api_v1_prefix + path, headers=headers)
+            assert (actual.status_code, actual.json()) == (expected.status_code, expected.json()), (role, path)
+
+
+def ids(client, data, role, path):
+    response = client.get(settings.api_v1_prefix + path, headers=auth_headers(data["users"][role]))
+    assert response.status_code == 200
+    return sorted(item.get("id", item.get("projet_id")) for item in response.json())
+
+
+def test_async_routes_take_precedence():
+    route = next(route for route in async_client.app.routes if route.path == f"{settings.api_v1_prefix}/projects")
+    assert asyncio.iscoroutinefunction(route.endpoint)
+
+
+def test_projects(data):
+    assert_same_answers(data, ["/projects", f"/projects/{data['projet_chef']}", f"/projects/{data['projet_admin']}"])
+    assert ids(async_client, data, "admin", "/projects") == sorted([data["projet_chef"], data["projet_admin"]])
+    assert ids(async_client, data, "chef", "/projects") == [data["projet_chef"]]
+    assert ids(async_client, data, "donateur", "/projects") == [data["projet_chef"]]
+
+
+def test_indicators(data):
+    assert_same_answers(data, [
+        "/indicators", f"/indicators?projet_id={data['projet_admin']}", "/indicators/latest", "/indicators/definitions",
+        f"/indicators/{data['indicator_chef']}", f"/indicators/{data['indicator_admin']}"
+    ])
+    assert len(ids(async_client, data, "admin", "/indicators")) == 3
+    assert len(ids(async_client, data, "chef", "/indicators")) == 2
+    assert ids(async_client, data, "donateur", "/indicators/latest") == [data["projet_chef"]]
+
+
+def test_financements(data):
+    assert_same_answers(data, ["/financements", f"/financements/{data['financement']}"])
+    assert ids(async_client, data, "admin", "/financements") == [data["financement"]]
+    assert ids(async_client, data, "donateur", "/financements") == [data["financement"]]
+
+
+def test_stats(data):
+    # Admin only: the other roles get the same 403 from both variants
+    assert_same_answers(data, ["/stats/kpis", "/stats/financements", "/stats/indicators"])
+
+
+def test_kpis_report_unconverted_amounts(db, data):
+    # No XOF rate is loaded: the amount stays out of total_financed but is reported apart
+    db.add(Financement(
+        projet_id=data["projet_admin"], donateur_id=data["users"]["donateur"].id, montant=Decimal("100000"),
+        devise="XOF", date_financement=date(2024, 4, 1), statut=FinancementStatut.UTILISE
+    ))
+    db.commit()
+    assert_same_answers(data, ["/stats/kpis"])
+    kpis = sync_client.get(f"{settings.api_v1_prefix}/stats/kpis", headers=auth_headers(data["users"]["admin"])).json()
+    assert Decimal(kpis["total_financed"]) == Decimal("1500.00")
+    assert {devise: Decimal(montant) for devise, montant in kpis["total_financed_non_converti"].items()} == {
+        "XOF": Decimal("100000")
+    }
+
+
+def test_revocation_epoch_is_read_off_the_event_loop(data, monkeypatch):
+    store = dependencies.get_auth_session_store()
+    get_epoch = store.get_epoch
+    on_loop = []
+
+    def observed_get_epoch(user_id):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        return get_epoch(user_id)
+
+    monkeypatch.setattr(store, "get_epoch", observed_get_epoch)
+    assert async_client.get(f"{settings.api_v1_prefix}/projects", headers=auth_headers(data["users"]["chef"])).status_code == 200
+    assert on_loop == [False]
@@ -0,0 +1,69 @@
+import fakeredis
+import pytest
+
+from cache import TTLCache
+from cache_invalidation import CacheInvalidator
+from config import settings
+
+
+@pytest.fixture
+def workers(monkeypatch):
+    """Two workers' invalidators sharing one Redis server"""
+    monkeypatch.setattr(settings, "web_concurrency", 2)
+    server = fakeredis.FakeServer()
+    invalidators = []
+    for _ in range(2):
+        invalidator = CacheInvalidator()
+        invalidator._client = fakeredis.FakeRedis(server=server, decode_responses=True)
+        cache = TTLCache(60)
+        invalidator.register("portfolio", cache, int)
+        invalidators.append((invalidator, cache))
+    yield invalidators
+
+
+def deliver(pubsub):
+    """Run the listener callback on the pending messages, as the listener thread would"""
+    for _ in range(3):
+        pubsub.get_message(timeout=0.1)
+
+
+def test_invalidation_reaches_the_other_workers(workers):
+    (first, first_cache), (second, second_cache) = workers
+    pubsub = second._redis().pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(**{"cache:invalidations": second._on_invalidation})
+    first_cache.set(7, "first")
+    second_cache.set(7, "second")
+    second_cache.set(8, "other donor")
+
+    first.invalidate("portfolio", 7)
+    deliver(pubsub)
+
+    assert first_cache.get(7) is None
+    assert second_cache.get(7) is None
+    assert second_cache.get(8) == "other donor"
+
+
+def test_single_worker_does_not_need_redis(monkeypatch):
+    monkeypatch.setattr(settings, "web_concurrency", 1)
+    invalidator = CacheInvalidator()
+    cache = TTLCache(60)
+    invalidator.register("portfolio", cache, int)
+    cache.set(7, "cached")
+
+    invalidator.invalidate("portfolio", 7)
+
+    assert cache.get(7) is None
+    assert invalidator._client is None
+
+
+def test_unreachable_redis_still_invalidates_locally(monkeypatch):
+    monkeypatch.setattr(settings, "web_concurrency", 2)
+    monkeypatch.setattr(settings, "redis_url", "redis://127.0.0.1:1/0")
+    invalidator = CacheInvalidator()
+    cache = TTLCache(60)
+    invalidator.register("portfolio", cache, int)
+    cache.set(7, "cached")
+
+    invalidator.invalidate("portfolio", 7)
+
+    assert cache.get(7) is None
@@ -0,0 +1,164 @@
+import socket
+from email import message_from_bytes
+from datetime import datetime, timedelta
+
+import pytest
+from aiosmtpd.controller import Controller
+
+import email_service
+from config import settings
+from database import SessionLocal, engine
+from email_service import SMTPConnectionPool, enqueue_email, queue_password_reset_email, send_pending_emails
+from models import EmailOutbox, EmailStatut
+
+
+class RecordingHandler:
+    """SMTP server that records messages and answers 451 to the first `failures` ones"""
+
+    def __init__(self):
+        self.messages = []
+        self.failures = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.failures:
+            self.failures -= 1
+            return "451 Requested action aborted: try again later"
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    monkeypatch.setattr(settings, "smtp_host", controller.hostname)
+    monkeypatch.setattr(settings, "smtp_port", controller.port)
+    monkeypatch.setattr(settings, "smtp_use_tls", False)
+    monkeypatch.setattr(settings, "smtp_anonymous", True)
+    monkeypatch.setattr(settings, "smtp_user", "")
+    monkeypatch.setattr(settings, "smtp_password", "")
+    # Pooled connections belong to the event loop of the test that opened them
+    monkeypatch.setattr(email_service, "smtp_pool", SMTPConnectionPool(2))
+    yield handler
+    controller.stop()
+
+
+@pytest.fixture
+def outbox():
+    EmailOutbox.__table__.create(bind=engine)
+    db = SessionLocal()
+    yield db
+    db.close()
+    EmailOutbox.__table__.drop(bind=engine)
+
+
+def queue_welcome(db) -> int:
+    email = enqueue_email(db, "awa@example.org", "welcome", {"name": "Awa"})
+    db.commit()
+    return email.id
+
+
+def make_due(db, email_id: int):
+    """Skip the retry delay"""
+    db.query(EmailOutbox).filter(EmailOutbox.id == email_id).update(
+        {EmailOutbox.prochain_essai: datetime.utcnow() - timedelta(seconds=1)}
+    )
+    db.commit()
+
+
+def stored(db, email_id: int) -> EmailOutbox:
+    db.expire_all()
+    return db.get(EmailOutbox, email_id)
+
+
+@pytest.mark.asyncio
+async def test_queued_email_is_sent_and_marked(smtp_server, outbox):
+    email_id = queue_welcome(outbox)
+
+    assert await send_pending_emails() == 1
+
+    assert len(smtp_server.messages) == 1
+    assert smtp_server.messages[0].rcpt_tos == ["awa@example.org"]
+    assert "Bienvenue" in smtp_server.messages[0].content.decode()
+    email = stored(outbox, email_id)
+    assert email.statut == EmailStatut.ENVOYE
+    assert email.date_envoi is not None
+    assert email.contexte is None
+    # Nothing left to send
+    assert await send_pending_emails() == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_email_is_retried_with_backoff(smtp_server, outbox):
+    smtp_server.failures = 1
+    email_id = queue_welcome(outbox)
+
+    await send_pending_emails()
+
+    email = stored(outbox, email_id)
+    assert email.statut == EmailStatut.EN_ATTENTE
+    assert email.tentatives == 1
+    assert "451" in email.derniere_erreur
+    assert email.prochain_essai > datetime.utcnow() + timedelta(seconds=settings.email_retry_base_seconds - 5)
+    # Not due yet
+    assert await send_pending_emails() == 0
+
+    make_due(outbox, email_id)
+    assert await send_pending_emails() == 1
+
+    email = stored(outbox, email_id)
+    assert email.statut == EmailStatut.ENVOYE
+    assert email.derniere_erreur is None
+    assert len(smtp_server.messages) == 1
+
+
+@pytest.mark.asyncio
+async def test_email_fails_after_max_attempts(smtp_server, outbox, monkeypatch):
+    monkeypatch.setattr(settings, "email_max_attempts", 2)
+    smtp_server.failures = 5
+    email_id = queue_welcome(outbox)
+
+    await send_pending_emails()
+    make_due(outbox, email_id)
+    await send_pending_emails()
+
+    email = stored(outbox, email_id)
+    assert email.statut == EmailStatut.ECHEC
+    assert email.tentatives == 2
+    assert email.contexte is None
+    assert smtp_server.messages == []
+
+
+@pytest.mark.asyncio
+async def test_password_reset_email_states_the_token_lifetime(smtp_server, outbox, monkeypatch):
+    monkeypatch.setattr(settings, "password_reset_token_ttl_minutes", 20)
+    email = queue_password_reset_email(outbox, "awa@example.org", "jeton-secret", "https://app.example.org/reset-password")
+    outbox.commit()
+
+    assert await send_pending_emails() == 1
+
+    message = message_from_bytes(smtp_server.messages[0].content)
+    bodies = [part.get_payload(decode=True).decode() for part in message.walk() if not part.is_multipart()]
+    assert all("valide pendant 20 minutes" in body for body in bodies)
+    assert stored(outbox, email.id).contexte is None
+
+
+@pytest.mark.asyncio
+async def test_expired_password_reset_email_is_dropped_with_its_token(smtp_server, outbox):
+    email = queue_password_reset_email(outbox, "awa@example.org", "jeton-secret", "https://app.example.org/reset-password")
+    email.expire_le = datetime.utcnow() - timedelta(seconds=1)
+    outbox.commit()
+
+    assert await send_pending_emails() == 0
+
+    email = stored(outbox, email.id)
+    assert email.statut == EmailStatut.ECHEC
+    assert email.contexte is None
+    assert smtp_server.messages == []
@@ -0,0 +1,126 @@
+import io
+import logging
+
+from fastapi.testclient import TestClient
+from openpyxl import Workbook
+
+import main
+import routes.indicators
+from conftest import auth_headers
+from models import Indicator, IndicatorLatest
+
+PATH = "/api/v1/indicators/import"
+
+
+def csv_file(lines: list) -> bytes:
+    return ("\n".join(lines) + "\n").encode()
+
+
+def xlsx_file(rows: list) -> bytes:
+    workbook = Workbook()
+    for row in rows:
+        workbook.active.append(row)
+    content = io.BytesIO()
+    workbook.save(content)
+    return content.getvalue()
+
+
+def import_file(client, user, filename: str, content: bytes):
+    return client.post(PATH, headers=auth_headers(user), files={"file": (filename, content)})
+
+
+def test_csv_import_reports_rejected_rows_by_line(client, users, db):
+    content = csv_file([
+        "projet_id,nom,valeur,unite,date_saisie",
+        f"{users.projet_chef.id},Puits forés,3,puits,2024-01-15",
+        f"{users.projet_chef.id},Puits forés,pas un nombre,puits,2024-02-15",
+        "",
+        f"{users.projet_chef.id},Puits forés,5,puits,2024-03-15",
+    ])
+
+    response = import_file(client, users.chef, "indicateurs.csv", content)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["inserted"], body["rejected"]) == (2, 1)
+    assert body["errors"][0]["line"] == 3
+    assert body["errors"][0]["errors"][0]["field"] == "valeur"
+    latest = db.query(IndicatorLatest).one()
+    assert latest.valeur == 5
+
+
+def test_xlsx_import(client, users, db):
+    content = xlsx_file([
+        ["projet_id", "nom", "valeur", "valeur_cible", "date_saisie"],
+        [users.projet_chef.id, "Latrines construites", 12, 40, "2024-04-01"],
+        [users.projet_chef.id, None, 4, None, "2024-04-02"],
+    ])
+
+    response = import_file(client, users.chef, "indicateurs.xlsx", content)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["inserted"], body["rejected"]) == (1, 1)
+    assert body["errors"][0]["line"] == 3
+    assert body["errors"][0]["errors"][0]["field"] == "nom"
+    assert db.query(Indicator).one().valeur_cible == 40
+
+
+def test_rows_of_projects_the_user_does_not_own_are_rejected(client, users, db):
+    content = csv_file([
+        "projet_id,nom,valeur,date_saisie",
+        f"{users.projet_admin.id},Consultations,30,2024-01-15",
+        "9999,Consultations,30,2024-01-15",
+        f"{users.projet_chef.id},Consultations,30,2024-01-15",
+    ])
+
+    body = import_file(client, users.chef, "indicateurs.csv", content).json()
+
+    assert (body["inserted"], body["rejected"]) == (1, 2)
+    assert [(error["line"], error["errors"][0]["message"]) for error in body["errors"]] == [
+        (2, "You can only add indicators to your own projects"),
+        (3, "Project not found"),
+    ]
+    assert {indicator.projet_id for indicator in db.query(Indicator)} == {users.projet_chef.id}
+
+
+def test_conflicting_unit_is_rejected(client, users):
+    content = csv_file([
+        "projet_id,nom,valeur,unite,date_saisie",
+        f"{users.projet_chef.id},Eau distribuée,100,litres,2024-01-15",
+        f"{users.projet_chef.id},Eau distribuée,2,m3,2024-02-15",
+    ])
+
+    body = import_file(client, users.chef, "indicateurs.csv", content).json()
+
+    assert (body["inserted"], body["rejected"]) == (1, 1)
+    assert body["errors"][0]["line"] == 3
+    assert body["errors"][0]["errors"][0]["field"] == "unite"
+
+
+def test_unreadable_files_are_bad_requests(client, users, db):
+    header = "projet_id,nom,valeur,date_saisie\n".encode()
+    for filename, content in (
+        ("indicateurs.csv", header + b"1,\xff\xfe invalide,3,2024-01-15\n"),
+        ("indicateurs.xlsx", b"not a zip archive"),
+        ("indicateurs.txt", header),
+    ):
+        assert import_file(client, users.chef, filename, content).status_code == 400, filename
+    assert db.query(Indicator).count() == 0
+
+
+def test_server_faults_are_logged_500s_without_details(users, db, monkeypatch, caplog):
+    def failing_rebuild(db, projet_ids):
+        raise RuntimeError("SELECT secret FROM indicators")
+
+    monkeypatch.setattr(routes.indicators, "rebuild_indicator_latest", failing_rebuild)
+    content = csv_file(["projet_id,nom,valeur,date_saisie", f"{users.projet_chef.id},Puits,3,2024-01-15"])
+    client = TestClient(main.app, raise_server_exceptions=False)
+
+    with caplog.at_level(logging.ERROR, logger="routes.indicators"):
+        response = import_file(client, users.chef, "indicateurs.csv", content)
+
+    assert response.status_code == 500
+    assert "secret" not in response.text
+    assert "Indicator import of indicateurs.csv failed" in caplog.text
+    assert db.query(Indicator).count() == 0
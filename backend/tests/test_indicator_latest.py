@@ -0,0 +1,75 @@
+"""indicator_latest follows the measurements: deletes fall back, a concurrent first insert is retried"""
+from datetime import date
+
+import pytest
+from sqlalchemy import insert
+
+import indicator_latest
+from conftest import auth_headers
+from config import settings
+from indicator_definitions import get_or_create_definition
+from indicator_latest import refresh_indicator_latest
+from models import Indicator, IndicatorLatest
+
+
+@pytest.fixture
+def definition(db):
+    definition = get_or_create_definition(db, "Nombre de forages", "forages")
+    db.commit()
+    return definition
+
+
+def measure(db, users, definition, valeur, date_saisie) -> Indicator:
+    indicator = Indicator(projet_id=users.projet_chef.id, definition_id=definition.id, valeur=valeur,
+                          date_saisie=date_saisie, saisi_par=users.chef.id)
+    db.add(indicator)
+    refresh_indicator_latest(db, users.projet_chef.id, definition.id)
+    db.commit()
+    return indicator
+
+
+def latest(db, users, definition):
+    db.expire_all()
+    return db.get(IndicatorLatest, (users.projet_chef.id, definition.id))
+
+
+def test_delete_falls_back_to_the_previous_measurement(client, db, users, definition):
+    older = measure(db, users, definition, 3, date(2024, 1, 1))
+    newer = measure(db, users, definition, 5, date(2024, 6, 1))
+    assert latest(db, users, definition).indicator_id == newer.id
+
+    headers = auth_headers(users.chef)
+    assert client.delete(f"{settings.api_v1_prefix}/indicators/{newer.id}", headers=headers).status_code == 204
+    row = latest(db, users, definition)
+    assert (row.indicator_id, row.valeur, row.date_saisie) == (older.id, 3, date(2024, 1, 1))
+
+    assert client.delete(f"{settings.api_v1_prefix}/indicators/{older.id}", headers=headers).status_code == 204
+    assert latest(db, users, definition) is None
+
+
+@pytest.mark.parametrize("concurrent_date, kept", [(date(2024, 6, 1), "concurrent"), (date(2024, 1, 1), "ours")])
+def test_concurrent_first_insert_is_retried(db, users, definition, monkeypatch, concurrent_date, kept):
+    locked_latest = indicator_latest._locked_latest
+    concurrent = {}
+
+    def insert_concurrently_then_lock(db, projet_id, definition_id):
+        # The other request inserts its measurement and the latest row after our lookup found none
+        if not concurrent:
+            other = Indicator(projet_id=projet_id, definition_id=definition_id, valeur=7,
+                              date_saisie=concurrent_date, saisi_par=users.admin.id)
+            db.add(other)
+            db.flush()
+            db.execute(insert(IndicatorLatest).values(
+                projet_id=projet_id, definition_id=definition_id, indicator_id=other.id, valeur=other.valeur,
+                date_saisie=other.date_saisie
+            ))
+            concurrent["indicator"] = other
+            return None
+        return locked_latest(db, projet_id, definition_id)
+
+    monkeypatch.setattr(indicator_latest, "_locked_latest", insert_concurrently_then_lock)
+    ours = measure(db, users, definition, 5, date(2024, 3, 1))
+
+    expected = concurrent["indicator"] if kept == "concurrent" else ours
+    row = latest(db, users, definition)
+    assert (row.indicator_id, row.valeur, row.date_saisie) == (expected.id, expected.valeur, expected.date_saisie)
@@ -0,0 +1,106 @@
+"""Project reads run a fixed number of queries, however many rows they return (RAISE_ON_LAZY_LOAD is on)"""
+import logging
+import re
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.exc import InvalidRequestError
+
+from conftest import auth_headers
+from config import settings
+from database import SessionLocal
+from indicator_definitions import get_or_create_definition
+from middleware import QueryStatsMiddleware
+from models import Financement, FinancementStatut, Indicator, Project, ProjectDomain, ProjectStatus
+from routes import projects
+
+
+def build_client(use_async: bool) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(QueryStatsMiddleware)
+    app.include_router(projects.async_router if use_async else projects.router, prefix=settings.api_v1_prefix)
+    return TestClient(app)
+
+
+CLIENTS = {"sync": build_client(use_async=False), "async": build_client(use_async=True)}
+
+
+def query_count(client, path, user) -> int:
+    response = client.get(settings.api_v1_prefix + path, headers=auth_headers(user))
+    assert response.status_code == 200
+    return int(re.search(r'desc="(\d+) queries"', response.headers["Server-Timing"]).group(1))
+
+
+def add_project_rows(db, users, count):
+    """count more projects for the admin, each with a measurement and a financement"""
+    definition = get_or_create_definition(db, "Nombre de forages", "forages")
+    for n in range(count):
+        projet = Project(
+            titre=f"Projet {n}", description="d", domaine=ProjectDomain.EAU, localisation="Thiès", pays="SN",
+            date_debut=date(2024, 1, 1), budget=1000, statut=ProjectStatus.EN_COURS, chef_projet_id=users.admin.id
+        )
+        db.add(projet)
+        db.flush()
+        add_detail_rows(db, users, projet.id, definition.id, 1)
+    db.commit()
+
+
+def add_detail_rows(db, users, projet_id, definition_id, count):
+    for n in range(count):
+        db.add(Indicator(projet_id=projet_id, definition_id=definition_id, valeur=n, date_saisie=date(2024, 1, n + 1),
+                         saisi_par=users.admin.id))
+        db.add(Financement(projet_id=projet_id, donateur_id=users.donateur.id, montant=Decimal("100.00"), devise="EUR",
+                           date_financement=date(2024, 1, n + 1), statut=FinancementStatut.RECU))
+
+
+def test_lazy_loads_raise(db, users):
+    projet = db.scalars(select(Project).filter(Project.id == users.projet_chef.id)).one()
+    db.expire(projet, ["indicators"])
+    with pytest.raises(InvalidRequestError):
+        projet.indicators
+
+
+@pytest.fixture(params=sorted(CLIENTS))
+def client(request):
+    return CLIENTS[request.param]
+
+
+def test_list_projects_query_count_is_constant(client, db, users):
+    query_count(client, "/projects", users.admin)  # Warm up the per-process caches
+    few = query_count(client, "/projects", users.admin)
+    add_project_rows(db, users, 10)
+    assert query_count(client, "/projects", users.admin) == few
+
+
+def test_get_project_query_count_is_constant(client, db, users):
+    path = f"/projects/{users.projet_chef.id}"
+    definition = get_or_create_definition(db, "Nombre de forages", "forages")
+    add_detail_rows(db, users, users.projet_chef.id, definition.id, 1)
+    db.commit()
+    query_count(client, path, users.chef)
+    few = query_count(client, path, users.chef)
+    add_detail_rows(db, users, users.projet_chef.id, definition.id, 10)
+    db.commit()
+    response = client.get(settings.api_v1_prefix + path, headers=auth_headers(users.chef))
+    assert (len(response.json()["indicators"]), len(response.json()["financements"])) == (11, 11)
+    assert query_count(client, path, users.chef) == few
+
+
+def test_repeated_statement_is_reported_as_n_plus_one(db, users, caplog):
+    app = FastAPI()
+    app.add_middleware(QueryStatsMiddleware)
+
+    @app.get("/projects")
+    def one_query_per_project():
+        with SessionLocal() as session:
+            ids = session.scalars(select(Project.id)).all()
+            return [session.get(Project, projet_id, populate_existing=True).titre for projet_id in ids]
+
+    add_project_rows(db, users, settings.n_plus_one_threshold)
+    with caplog.at_level(logging.WARNING, logger="middleware"):
+        assert TestClient(app).get("/projects").status_code == 200
+    assert any("N+1 suspect on GET /projects" in record.getMessage() for record in caplog.records)
@@ -0,0 +1,74 @@
+import io
+import os
+
+import pytest
+from moto import mock_s3
+
+from config import settings
+from storage import S3Storage
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setattr(settings, "s3_access_key_id", "test")
+    monkeypatch.setattr(settings, "s3_secret_access_key", "test")
+    monkeypatch.setattr(settings, "s3_region", "us-east-1")
+    monkeypatch.setattr(settings, "s3_multipart_chunk_mb", 5)
+    monkeypatch.setattr(settings, "s3_upload_concurrency", 2)
+    monkeypatch.setattr(settings, "max_upload_size_mb", 20)
+    with mock_s3():
+        storage = S3Storage()
+        storage.client.create_bucket(Bucket=storage.bucket)
+        yield storage
+
+
+def stored_keys(storage: S3Storage) -> list:
+    return [item["Key"] for item in storage.client.list_objects_v2(Bucket=storage.bucket).get("Contents", [])]
+
+
+def pending_multipart_uploads(storage: S3Storage) -> list:
+    return storage.client.list_multipart_uploads(Bucket=storage.bucket).get("Uploads", [])
+
+
+def test_small_file_is_a_single_put(s3):
+    data = os.urandom(MB)
+
+    assert s3.upload(io.BytesIO(data), "documents/petit.pdf", "application/pdf") == len(data)
+
+    stored = s3.client.get_object(Bucket=s3.bucket, Key="documents/petit.pdf")
+    assert stored["Body"].read() == data
+    assert stored["ContentType"] == "application/pdf"
+    assert "-" not in stored["ETag"]
+
+
+def test_large_file_is_uploaded_in_parts(s3):
+    data = os.urandom(12 * MB)
+
+    assert s3.upload(io.BytesIO(data), "documents/rapport.zip", "application/zip") == len(data)
+
+    stored = s3.client.get_object(Bucket=s3.bucket, Key="documents/rapport.zip")
+    assert stored["Body"].read() == data
+    # Multipart ETags end with the number of parts: 5 MB + 5 MB + 2 MB
+    assert stored["ETag"].strip('"').endswith("-3")
+    assert pending_multipart_uploads(s3) == []
+
+
+def test_multipart_upload_over_the_size_limit_is_aborted(s3, monkeypatch):
+    monkeypatch.setattr(settings, "max_upload_size_mb", 7)
+
+    with pytest.raises(ValueError, match="exceeds maximum allowed size"):
+        s3.upload(io.BytesIO(os.urandom(12 * MB)), "documents/trop-gros.zip", "application/zip")
+
+    assert stored_keys(s3) == []
+    assert pending_multipart_uploads(s3) == []
+
+
+def test_single_put_over_the_size_limit_is_refused(s3, monkeypatch):
+    monkeypatch.setattr(settings, "max_upload_size_mb", 1)
+
+    with pytest.raises(ValueError, match="exceeds maximum allowed size"):
+        s3.upload(io.BytesIO(os.urandom(2 * MB)), "documents/trop-gros.pdf", "application/pdf")
+
+    assert stored_keys(s3) == []
@@ -0,0 +1,108 @@
+import os
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+
+import routes.documents
+import upload_sessions
+from conftest import auth_headers
+from database import engine
+from models import Document, UploadSession
+from upload_sessions import claim_upload_session, record_chunk
+
+PREFIX = "/api/v1/documents/uploads"
+
+
+def start_upload(client, users, data: bytes) -> str:
+    response = client.post(PREFIX, headers=auth_headers(users.chef), json={
+        "projet_id": users.projet_chef.id, "nom_fichier": "rapport.pdf", "taille": len(data)
+    })
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+def put_chunk(client, users, session_id: str, offset: int, chunk: bytes):
+    return client.put(f"{PREFIX}/{session_id}?offset={offset}", headers=auth_headers(users.chef), content=chunk)
+
+
+def test_chunks_are_appended_then_finalized(client, users, db):
+    data = os.urandom(300000)
+    session_id = start_upload(client, users, data)
+
+    assert put_chunk(client, users, session_id, 0, data[:100000]).json()["offset"] == 100000
+    # A retried chunk at an old offset is refused
+    assert put_chunk(client, users, session_id, 0, data[:100000]).status_code == 409
+    assert put_chunk(client, users, session_id, 100000, data[100000:]).json()["offset"] == len(data)
+
+    response = client.post(f"{PREFIX}/{session_id}/complete", headers=auth_headers(users.chef))
+    assert response.status_code == 201
+    assert response.json()["taille"] == len(data)
+    assert db.query(UploadSession).count() == 0
+
+
+def test_no_connection_is_held_while_a_chunk_streams(client, users, db, monkeypatch):
+    session_id = start_upload(client, users, b"x" * 10)
+    headers = auth_headers(users.chef)
+    db.commit()  # The test's own session gives its connection back
+    checked_out = []
+    write_chunk = routes.documents.write_chunk
+
+    async def observed_write_chunk(*args):
+        checked_out.append(engine.pool.checkedout())
+        return await write_chunk(*args)
+
+    monkeypatch.setattr(routes.documents, "write_chunk", observed_write_chunk)
+    assert client.put(f"{PREFIX}/{session_id}?offset=0", headers=headers, content=b"x" * 10).status_code == 200
+    assert checked_out == [0]
+
+
+def test_chunk_is_refused_while_another_holds_the_lease(client, users, db):
+    session_id = start_upload(client, users, b"x" * 10)
+    token = claim_upload_session(db, session_id, UploadSession.recu == 0)
+
+    assert put_chunk(client, users, session_id, 0, b"x" * 10).status_code == 409
+
+    # The first writer's offset is recorded; a writer that lost its lease is not
+    assert record_chunk(db, session_id, token, 0, 4)
+    assert not record_chunk(db, session_id, token, 4, 6)
+    assert put_chunk(client, users, session_id, 4, b"x" * 6).json()["offset"] == 10
+
+
+def test_expired_lease_can_be_taken_over(client, users, db):
+    session_id = start_upload(client, users, b"x" * 10)
+    claim_upload_session(db, session_id, UploadSession.recu == 0)
+    db.query(UploadSession).update({UploadSession.ecriture_jusqu_a: datetime.utcnow() - timedelta(seconds=1)})
+    db.commit()
+
+    assert put_chunk(client, users, session_id, 0, b"x" * 10).json()["offset"] == 10
+
+
+def test_upload_is_finalized_once(client, users, db):
+    session_id = start_upload(client, users, b"x" * 10)
+    put_chunk(client, users, session_id, 0, b"x" * 10)
+    headers = auth_headers(users.chef)
+
+    # Another request is finalizing
+    token = claim_upload_session(db, session_id, UploadSession.recu == UploadSession.taille)
+    assert client.post(f"{PREFIX}/{session_id}/complete", headers=headers).status_code == 409
+    upload_sessions.release_upload_session(db, session_id, token)
+
+    assert client.post(f"{PREFIX}/{session_id}/complete", headers=headers).status_code == 201
+    assert client.post(f"{PREFIX}/{session_id}/complete", headers=headers).status_code == 404
+    assert db.query(Document).count() == 1
+
+
+def test_failed_finalization_releases_the_session(client, users, db, monkeypatch):
+    session_id = start_upload(client, users, b"x" * 10)
+    put_chunk(client, users, session_id, 0, b"x" * 10)
+    headers = auth_headers(users.chef)
+    create_document = routes.documents.create_document
+
+    def failing_create_document(*args):
+        raise HTTPException(status_code=503, detail="Storage unavailable")
+
+    monkeypatch.setattr(routes.documents, "create_document", failing_create_document)
+    assert client.post(f"{PREFIX}/{session_id}/complete", headers=headers).status_code == 503
+
+    monkeypatch.setattr(routes.documents, "create_document", create_document)
+    assert client.post(f"{PREFIX}/{session_id}/complete", headers=headers).status_code == 201
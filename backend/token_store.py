@@ -0,0 +1,116 @@
+from sqlalchemy import delete
+from database import SessionLocal
+from models import AuthToken
+from config import settings
+from abc import ABC, abstractmethod
+from typing import Optional
+from datetime import datetime, timedelta
+import hashlib
+import redis
+
+PASSWORD_RESET = "password_reset"
+
+
+def hash_token(token: str) -> str:
+    """Tokens are random, so a plain SHA-256 is enough to keep them out of storage"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenStore(ABC):
+    """Single-use tokens with a TTL, shared by all workers"""
+
+    @abstractmethod
+    def put(self, usage: str, token: str, user_id: int, ttl_seconds: int):
+        ...
+
+    @abstractmethod
+    def consume(self, usage: str, token: str) -> Optional[int]:
+        """Atomically use a token: returns its user id once, then None"""
+
+    def sweep(self) -> int:
+        """Remove expired tokens (for backends without native expiry)"""
+        return 0
+
+
+class SqlTokenStore(TokenStore):
+    """Tokens in the auth_tokens table; expired rows are removed by the periodic sweep"""
+
+    def put(self, usage: str, token: str, user_id: int, ttl_seconds: int):
+        db = SessionLocal()
+        try:
+            db.add(AuthToken(
+                token_hash=hash_token(token),
+                usage=usage,
+                user_id=user_id,
+                expire_le=datetime.utcnow() + timedelta(seconds=ttl_seconds)
+            ))
+            db.commit()
+        finally:
+            db.close()
+
+    def consume(self, usage: str, token: str) -> Optional[int]:
+        db = SessionLocal()
+        try:
+            token_hash = hash_token(token)
+            user_id = db.query(AuthToken.user_id).filter(
+                AuthToken.token_hash == token_hash,
+                AuthToken.usage == usage
+            ).scalar()
+            if user_id is None:
+                return None
+            # Only one concurrent request can delete the row
+            result = db.execute(delete(AuthToken).where(
+                AuthToken.token_hash == token_hash,
+                AuthToken.expire_le > datetime.utcnow()
+            ))
+            db.commit()
+            return user_id if result.rowcount == 1 else None
+        finally:
+            db.close()
+
+    def sweep(self) -> int:
+        db = SessionLocal()
+        try:
+            result = db.execute(delete(AuthToken).where(AuthToken.expire_le <= datetime.utcnow()))
+            db.commit()
+            return result.rowcount
+        finally:
+            db.close()
+
+
+class RedisTokenStore(TokenStore):
+    """Tokens as Redis keys with native expiry, consumed with GETDEL"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def _key(self, usage: str, token: str) -> str:
+        return f"token:{usage}:{hash_token(token)}"
+
+    def put(self, usage: str, token: str, user_id: int, ttl_seconds: int):
+        self.client.set(self._key(usage, token), user_id, ex=ttl_seconds)
+
+    def consume(self, usage: str, token: str) -> Optional[int]:
+        user_id = self.client.getdel(self._key(usage, token))
+        return int(user_id) if user_id is not None else None
+
+
+_token_store: Optional[TokenStore] = None
+
+
+def get_token_store() -> TokenStore:
+    """Token store selected by TOKEN_STORE_BACKEND"""
+    global _token_store
+    if _token_store is None:
+        if settings.token_store_backend == "redis":
+            _token_store = RedisTokenStore(redis.from_url(settings.redis_url, decode_responses=True))
+        elif settings.token_store_backend == "sql":
+            _token_store = SqlTokenStore()
+        else:
+            raise ValueError(f"Unknown token store backend: {settings.token_store_backend}")
+    return _token_store
+
+
+def sweep_tokens() -> int:
+    """Background job: drop expired tokens"""
+    return get_token_store().sweep()
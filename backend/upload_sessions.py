@@ -0,0 +1,145 @@
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+from database import SessionLocal
+from models import UploadSession
+from config import settings
+from typing import AsyncIterator, Optional
+from datetime import datetime, timedelta
+import os
+import time
+import uuid
+
+# A writer stops this long before its lease ends, in case worker clocks differ
+LEASE_MARGIN_SECONDS = 5
+
+
+def create_upload_session(
+    db: Session,
+    user_id: int,
+    projet_id: int,
+    nom_fichier: str,
+    taille: int,
+    description: str = None
+) -> UploadSession:
+    """Open a resumable upload backed by an empty temporary file"""
+    os.makedirs(settings.upload_sessions_path, exist_ok=True)
+    session_id = str(uuid.uuid4())
+    chemin_temp = os.path.join(os.path.abspath(settings.upload_sessions_path), f"{session_id}.part")
+    open(chemin_temp, "wb").close()
+
+    upload_session = UploadSession(
+        id=session_id,
+        projet_id=projet_id,
+        user_id=user_id,
+        nom_fichier=nom_fichier,
+        description=description,
+        taille=taille,
+        recu=0,
+        chemin_temp=chemin_temp,
+        date_expiration=datetime.utcnow() + timedelta(hours=settings.upload_session_ttl_hours)
+    )
+    db.add(upload_session)
+    db.commit()
+    db.refresh(upload_session)
+    return upload_session
+
+
+def claim_upload_session(db: Session, session_id: str, condition) -> Optional[str]:
+    """Lease a session to one writer in its own short transaction; returns the lease token, or None if taken.
+
+    The lease replaces a row lock held for the whole transfer: the request
+    streams its body without a transaction or a pooled connection.
+    """
+    token = uuid.uuid4().hex
+    now = datetime.utcnow()
+    claimed = db.execute(
+        update(UploadSession).where(
+            UploadSession.id == session_id,
+            condition,
+            or_(UploadSession.ecriture_jusqu_a.is_(None), UploadSession.ecriture_jusqu_a < now)
+        ).values(
+            ecriture_jeton=token,
+            ecriture_jusqu_a=now + timedelta(seconds=settings.upload_chunk_lease_seconds)
+        )
+    ).rowcount
+    db.commit()
+    return token if claimed else None
+
+
+def record_chunk(db: Session, session_id: str, token: str, offset: int, received: int) -> bool:
+    """Advance the offset and end the lease, unless the lease was lost meanwhile"""
+    recorded = db.execute(
+        update(UploadSession).where(
+            UploadSession.id == session_id,
+            UploadSession.recu == offset,
+            UploadSession.ecriture_jeton == token
+        ).values(recu=offset + received, ecriture_jeton=None, ecriture_jusqu_a=None)
+    ).rowcount
+    db.commit()
+    return bool(recorded)
+
+
+def release_upload_session(db: Session, session_id: str, token: str):
+    db.execute(
+        update(UploadSession).where(
+            UploadSession.id == session_id,
+            UploadSession.ecriture_jeton == token
+        ).values(ecriture_jeton=None, ecriture_jusqu_a=None)
+    )
+    db.commit()
+
+
+async def write_chunk(chemin_temp: str, taille: int, offset: int, chunks: AsyncIterator[bytes]) -> int:
+    """Stream a chunk to the temporary file at offset and return the bytes kept.
+
+    If the client disconnects, or the lease is about to end, what arrived is
+    kept so the upload resumes from there.
+    File operations run in the threadpool, off the event loop.
+    """
+    remaining = taille - offset
+    written = 0
+    deadline = time.monotonic() + settings.upload_chunk_lease_seconds - LEASE_MARGIN_SECONDS
+    f = await run_in_threadpool(open, chemin_temp, "r+b")
+    try:
+        # Drop bytes past the recorded offset (a write interrupted before it was recorded)
+        await run_in_threadpool(f.truncate, offset)
+        f.seek(offset)
+        try:
+            async for chunk in chunks:
+                if written + len(chunk) > remaining:
+                    await run_in_threadpool(f.truncate, offset)
+                    raise ValueError("Chunk exceeds the declared file size")
+                await run_in_threadpool(f.write, chunk)
+                written += len(chunk)
+                if time.monotonic() >= deadline:
+                    break
+        except ClientDisconnect:
+            pass
+    finally:
+        await run_in_threadpool(f.close)
+    return written
+
+
+def discard_upload_session(db: Session, upload_session: UploadSession):
+    """Delete an upload session and its temporary file"""
+    if os.path.exists(upload_session.chemin_temp):
+        os.unlink(upload_session.chemin_temp)
+    db.delete(upload_session)
+    db.commit()
+
+
+def expire_upload_sessions() -> int:
+    """Delete expired upload sessions and their temporary files"""
+    db = SessionLocal()
+    try:
+        expired = db.query(UploadSession).filter(UploadSession.date_expiration < datetime.utcnow()).all()
+        for upload_session in expired:
+            if os.path.exists(upload_session.chemin_temp):
+                os.unlink(upload_session.chemin_temp)
+            db.delete(upload_session)
+        db.commit()
+        return len(expired)
+    finally:
+        db.close()
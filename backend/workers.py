@@ -0,0 +1,49 @@
+from config import settings
+from storage_deletions import drain_storage_deletions
+from upload_sessions import expire_upload_sessions
+from email_service import send_pending_emails, smtp_pool
+from token_store import sweep_tokens
+from database import check_replica, replica_engine
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+_tasks = []
+
+
+async def _run_periodically(name: str, job, interval_seconds: int):
+    """Run a job forever, pausing between runs (blocking jobs run in a thread)"""
+    while True:
+        try:
+            if asyncio.iscoroutinefunction(job):
+                await job()
+            else:
+                await asyncio.to_thread(job)
+        except Exception:
+            logger.exception("Background job %s failed", name)
+        await asyncio.sleep(interval_seconds)
+
+
+def start_workers():
+    """Start the background jobs on the running event loop"""
+    if not settings.background_workers_enabled or _tasks:
+        return
+    jobs = [
+        ("storage_deletions", drain_storage_deletions, settings.storage_deletion_interval_seconds),
+        ("upload_sessions", expire_upload_sessions, settings.upload_session_sweep_interval_seconds),
+        ("email_outbox", send_pending_emails, settings.email_outbox_interval_seconds),
+        ("auth_tokens", sweep_tokens, settings.token_sweep_interval_seconds),
+    ]
+    if replica_engine is not None:
+        jobs.append(("replica_check", check_replica, settings.replica_check_interval_seconds))
+    for name, job, interval_seconds in jobs:
+        _tasks.append(asyncio.create_task(_run_periodically(name, job, interval_seconds), name=name))
+
+
+async def stop_workers():
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+    await smtp_pool.close()
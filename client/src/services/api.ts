@@ -5,6 +5,8 @@ const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:4000/api';
 // Create axios instance
 const api = axios.create({
   baseURL: API_URL,
+  // Carries the read-your-writes cookie (reads stick to the primary database after a write)
+  withCredentials: true,
   headers: {
     'Content-Type': 'application/json',
   },
@@ -24,6 +26,27 @@ api.interceptors.request.use(
   }
 );
 
+// One refresh at a time: parallel 401s wait for the same call instead of each
+// presenting the refresh token (a second use would revoke the session)
+let refreshPromise: Promise<string> | null = null;
+
+const refreshAccessToken = (refreshToken: string): Promise<string> => {
+  if (!refreshPromise) {
+    refreshPromise = axios
+      .post(`${API_URL}/auth/refresh`, { refresh_token: refreshToken })
+      .then((response) => {
+        const { access_token, refresh_token } = response.data;
+        localStorage.setItem('access_token', access_token);
+        localStorage.setItem('refresh_token', refresh_token);
+        return access_token as string;
+      })
+      .finally(() => {
+        refreshPromise = null;
+      });
+  }
+  return refreshPromise;
+};
+
 // Response interceptor to handle token refresh
 api.interceptors.response.use(
   (response) => response,
@@ -42,13 +65,7 @@ api.interceptors.response.use(
       try {
         const refreshToken = localStorage.getItem('refresh_token');
         if (refreshToken) {
-          const response = await axios.post(`${API_URL}/auth/refresh`, {
-            refresh_token: refreshToken,
-          });
-
-          const { access_token, refresh_token } = response.data;
-          localStorage.setItem('access_token', access_token);
-          localStorage.setItem('refresh_token', refresh_token);
+          const access_token = await refreshAccessToken(refreshToken);
 
           originalRequest.headers.Authorization = `Bearer ${access_token}`;
           return api(originalRequest);
@@ -225,6 +242,11 @@ export const documentsAPI = {
     return response.data;
   },
 
+  downloadUrls: async (ids: number[]) => {
+    const response = await api.post('/documents/download-urls', { ids });
+    return response.data;
+  },
+
   delete: async (id: number) => {
     await api.delete(`/documents/${id}`);
   },